@@ -0,0 +1,73 @@
+"""add hot path indexes
+
+Revision ID: 4c5d6e7f8a9b
+Revises: 3b4c5d6e7f8a
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c5d6e7f8a9b'
+down_revision: Union[str, None] = '3b4c5d6e7f8a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f('ix_student_school_id'), 'student', ['school_id'],
+            unique=False, postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_invoice_student_id_status_amount_due_date', 'invoice',
+            ['student_id', 'status', sa.text('amount_in_cents DESC'), 'due_date'],
+            unique=False, postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_invoice_unpaid_student_id_amount_due_date', 'invoice',
+            ['student_id', sa.text('amount_in_cents DESC'), 'due_date'],
+            unique=False, postgresql_concurrently=True,
+            postgresql_where=sa.text("status IN ('pending', 'partially_paid', 'overdue')"),
+        )
+        op.create_index(
+            'ix_payment_student_id_created_at', 'payment',
+            ['student_id', sa.text('created_at DESC')],
+            unique=False, postgresql_concurrently=True,
+        )
+        op.create_index(
+            op.f('ix_payment_allocation_payment_id'), 'payment_allocation', ['payment_id'],
+            unique=False, postgresql_concurrently=True,
+        )
+        op.create_index(
+            op.f('ix_payment_allocation_invoice_id'), 'payment_allocation', ['invoice_id'],
+            unique=False, postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            op.f('ix_payment_allocation_invoice_id'), table_name='payment_allocation',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            op.f('ix_payment_allocation_payment_id'), table_name='payment_allocation',
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_payment_student_id_created_at', table_name='payment', postgresql_concurrently=True)
+        op.drop_index(
+            'ix_invoice_unpaid_student_id_amount_due_date', table_name='invoice',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_invoice_student_id_status_amount_due_date', table_name='invoice',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(op.f('ix_student_school_id'), table_name='student', postgresql_concurrently=True)
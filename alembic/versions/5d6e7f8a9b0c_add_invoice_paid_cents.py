@@ -0,0 +1,43 @@
+"""add invoice paid_cents
+
+Revision ID: 5d6e7f8a9b0c
+Revises: 4c5d6e7f8a9b
+Create Date: 2026-10-17 01:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d6e7f8a9b0c'
+down_revision: Union[str, None] = '4c5d6e7f8a9b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'invoice',
+        sa.Column('paid_cents', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.execute(
+        """
+        UPDATE invoice
+        SET paid_cents = paid.total
+        FROM (
+            SELECT payment_allocation.invoice_id, SUM(payment_allocation.amount_in_cents) AS total
+            FROM payment_allocation
+            JOIN payment ON payment.id = payment_allocation.payment_id
+            WHERE payment.status = 'completed'
+            GROUP BY payment_allocation.invoice_id
+        ) AS paid
+        WHERE invoice.id = paid.invoice_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('invoice', 'paid_cents')
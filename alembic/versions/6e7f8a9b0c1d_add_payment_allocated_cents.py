@@ -0,0 +1,41 @@
+"""add payment allocated_cents
+
+Revision ID: 6e7f8a9b0c1d
+Revises: 5d6e7f8a9b0c
+Create Date: 2026-10-17 02:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e7f8a9b0c1d'
+down_revision: Union[str, None] = '5d6e7f8a9b0c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'payment',
+        sa.Column('allocated_cents', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.execute(
+        """
+        UPDATE payment
+        SET allocated_cents = allocated.total
+        FROM (
+            SELECT payment_id, SUM(amount_in_cents) AS total
+            FROM payment_allocation
+            GROUP BY payment_id
+        ) AS allocated
+        WHERE payment.id = allocated.payment_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('payment', 'allocated_cents')
@@ -0,0 +1,33 @@
+"""add invoice pending due_date index
+
+Revision ID: 7f8a9b0c1d2e
+Revises: 6e7f8a9b0c1d
+Create Date: 2026-10-17 03:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f8a9b0c1d2e'
+down_revision: Union[str, None] = '6e7f8a9b0c1d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_invoice_pending_due_date', 'invoice', ['due_date'],
+            unique=False, postgresql_concurrently=True,
+            postgresql_where=sa.text("status = 'pending'"),
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_invoice_pending_due_date', table_name='invoice', postgresql_concurrently=True)
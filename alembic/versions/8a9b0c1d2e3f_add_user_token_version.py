@@ -0,0 +1,29 @@
+"""add user token_version
+
+Revision ID: 8a9b0c1d2e3f
+Revises: 7f8a9b0c1d2e
+Create Date: 2026-10-17 04:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a9b0c1d2e3f'
+down_revision: Union[str, None] = '7f8a9b0c1d2e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'user',
+        sa.Column('token_version', sa.Integer(), nullable=False, server_default='0'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('user', 'token_version')
@@ -0,0 +1,34 @@
+"""add school and student balance_version
+
+Revision ID: 9b0c1d2e3f4a
+Revises: 8a9b0c1d2e3f
+Create Date: 2026-10-17 05:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b0c1d2e3f4a'
+down_revision: Union[str, None] = '8a9b0c1d2e3f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'school',
+        sa.Column('balance_version', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.add_column(
+        'student',
+        sa.Column('balance_version', sa.Integer(), nullable=False, server_default='0'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('student', 'balance_version')
+    op.drop_column('school', 'balance_version')
@@ -1,15 +1,43 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from typing import Any, TypeVar
 
+from fastapi import HTTPException, status
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from app.config import settings
+from app.db.models import User
+from app.metrics import PASSWORD_HASH_QUEUE_WAIT, PASSWORD_HASH_REJECTIONS, TOKEN_VERSION_CACHE_LOOKUPS
 
 ALGORITHM = "HS256"
 
+T = TypeVar("T")
+
+PASSWORD_HASH_NICENESS = 10
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """The authenticated user as described by their access token's claims."""
+
+    id: int
+    email: str
+    school_id: int | None
+    is_admin: bool
+    token_version: int
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -18,6 +46,107 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+class PasswordHasherBusyError(HTTPException):
+    """Raised when no password hashing worker frees up within the queue timeout."""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent logins, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+
+
+def _lower_thread_priority() -> None:
+    # Linux schedules threads individually, so a niceness set on the hashing
+    # threads lets request handling win the CPU when both want it.
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), PASSWORD_HASH_NICENESS)
+    except (AttributeError, OSError):
+        pass
+
+
+class HashingWorker:
+    """A reserved password hashing worker; see PasswordHasher.reserve."""
+
+    def __init__(self, executor: ThreadPoolExecutor):
+        self._executor = executor
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated pool of `workers` threads.
+
+    bcrypt releases the GIL, so the pool uses as many cores as it has
+    threads, while the threadpool that serves sync endpoints and database
+    work stays free during a login burst. Callers wait up to
+    `queue_timeout` seconds for a worker and then get a 503.
+    """
+
+    def __init__(self, workers: int, queue_timeout: float):
+        self.queue_timeout = queue_timeout
+        self._worker = HashingWorker(
+            ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="password-hash", initializer=_lower_thread_priority
+            )
+        )
+        self._slots = asyncio.Semaphore(workers)
+
+    @asynccontextmanager
+    async def reserve(self) -> AsyncIterator[HashingWorker]:
+        """
+        Wait for a free worker and hold it for the block.
+
+        Reserving before loading what is to be verified keeps requests that
+        are only going to queue from doing any other work meanwhile.
+        """
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await self._slots.acquire()
+        except TimeoutError:
+            PASSWORD_HASH_REJECTIONS.inc()
+            raise PasswordHasherBusyError()
+        PASSWORD_HASH_QUEUE_WAIT.observe(time.perf_counter() - start)
+        try:
+            yield self._worker
+        finally:
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        async with self.reserve() as worker:
+            return await worker.hash(password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        async with self.reserve() as worker:
+            return await worker.verify(plain_password, hashed_password)
+
+
+password_hasher = PasswordHasher(
+    settings.password_hash_workers, settings.password_hash_queue_timeout_seconds
+)
+
+
+def user_claims(user: User) -> dict:
+    """Token claims identifying `user`, enough to authorize without loading it."""
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "school_id": user.school_id,
+        "is_admin": user.is_admin,
+        "ver": user.token_version,
+    }
+
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -36,3 +165,68 @@ def decode_token(token: str) -> dict | None:
     except JWTError:
         return None
 
+
+def principal_from_claims(payload: dict) -> Principal | None:
+    """The Principal a decoded token describes, or None if it lacks the identity claims."""
+    try:
+        return Principal(
+            id=int(payload["uid"]),
+            email=payload["sub"],
+            school_id=payload["school_id"],
+            is_admin=bool(payload["is_admin"]),
+            token_version=int(payload["ver"]),
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenVersionCache:
+    """
+    Per-user token versions, kept for `ttl_seconds` after being read.
+
+    A token is only accepted while its version matches the user's current
+    one, so bumping the version revokes every token issued before. Workers
+    drop a user's entry when notified that the user changed (see
+    app.db.notifications); the TTL bounds staleness if a notification is
+    lost. At most `max_entries` users are kept, least recently used first out.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[int, tuple[int, float]] = OrderedDict()
+        # Updated from threadpool workers on the sync stack.
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> int | None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] >= time.monotonic():
+                self._entries.move_to_end(user_id)
+                TOKEN_VERSION_CACHE_LOOKUPS.labels("hit").inc()
+                return entry[0]
+        TOKEN_VERSION_CACHE_LOOKUPS.labels("miss").inc()
+        return None
+
+    def set(self, user_id: int, version: int) -> None:
+        with self._lock:
+            self._entries[user_id] = (version, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+token_versions = TokenVersionCache(
+    settings.token_version_ttl_seconds, settings.token_version_cache_max_entries
+)
@@ -0,0 +1,307 @@
+"""
+Cache for computed responses, with stale-while-revalidate and single-flight.
+
+Entries are serialized response bodies tagged with the version of the data
+they were computed from, such as a school's or student's balance_version.
+The write services bump that version, which invalidates the row's entry in
+every worker at once without the write path touching the cache: a lookup
+for a newer version than the entry's is a miss.
+
+Within a version an entry is served as-is for `ttl_seconds`, then for up to
+`stale_seconds` more while a background task recomputes it; the TTL only
+bounds how long changes made outside the services go unnoticed. Concurrent
+misses for a key in a worker wait for the same computation.
+
+MemoryBackend keeps entries in the worker; RedisBackend shares them between
+workers and speaks RESP to Redis or anything compatible.
+"""
+
+import asyncio
+import struct
+import time
+from collections import OrderedDict, deque
+from collections.abc import Awaitable, Callable, Sequence
+from dataclasses import dataclass
+from typing import Protocol
+from urllib.parse import unquote, urlsplit
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.metrics import RESULT_CACHE_ERRORS, RESULT_CACHE_LOOKUPS
+
+logger = get_logger(__name__)
+
+# Entry version and fresh-until timestamp, stored ahead of the body.
+_HEADER = struct.Struct("!qd")
+
+
+class CacheUnavailableError(Exception):
+    """The cache backend could not be reached or failed a command."""
+
+
+class ReplyError(CacheUnavailableError):
+    """The Redis server answered a command with an error."""
+
+
+class CacheBackend(Protocol):
+    async def get(self, key: str) -> bytes | None: ...
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class MemoryBackend:
+    """
+    Entries in this worker's memory, at most `max_entries` of them, least
+    recently used first out. Only used from the event loop, so unlocked.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        self._entries[key] = (value, time.monotonic() + ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def close(self) -> None:
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def encode_command(args: Sequence[str | bytes]) -> bytes:
+    """A command as a RESP array of bulk strings."""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else arg.encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> str | int | bytes | list | None:
+    """Read one RESP2 reply; error replies raise ReplyError once fully read."""
+    line = await reader.readuntil(b"\r\n")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        raise ReplyError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        return None if length < 0 else (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        length = int(payload)
+        return None if length < 0 else [await read_reply(reader) for _ in range(length)]
+    raise CacheUnavailableError(f"Unexpected reply from cache server: {line!r}")
+
+
+Connection = tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class RedisBackend:
+    """
+    Entries in Redis, shared by every worker.
+
+    Commands run over up to `max_connections` connections opened on demand
+    from `url` (redis://[:password@]host[:port][/db]). A connection that
+    times out or fails mid-command is closed rather than reused.
+    """
+
+    def __init__(self, url: str, max_connections: int = 10, timeout_seconds: float = 1.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.timeout_seconds = timeout_seconds
+        self._idle: deque[Connection] = deque()
+        self._slots = asyncio.Semaphore(max_connections)
+
+    @staticmethod
+    async def _execute(connection: Connection, *args: str | bytes) -> str | int | bytes | list | None:
+        reader, writer = connection
+        writer.write(encode_command(args))
+        await writer.drain()
+        return await read_reply(reader)
+
+    async def _connect(self) -> Connection:
+        connection = await asyncio.open_connection(self.host, self.port)
+        try:
+            if self.password:
+                await self._execute(connection, "AUTH", self.password)
+            if self.db:
+                await self._execute(connection, "SELECT", str(self.db))
+        except BaseException:
+            connection[1].close()
+            raise
+        return connection
+
+    async def command(self, *args: str | bytes) -> str | int | bytes | list | None:
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            try:
+                async with asyncio.timeout(self.timeout_seconds):
+                    if connection is None:
+                        connection = await self._connect()
+                    reply = await self._execute(connection, *args)
+            except ReplyError:
+                if connection is not None:
+                    self._idle.append(connection)
+                raise
+            except BaseException as exc:
+                if connection is not None:
+                    connection[1].close()
+                if isinstance(exc, (OSError, EOFError, TimeoutError)):
+                    raise CacheUnavailableError(f"{type(exc).__name__}: {exc}") from exc
+                raise
+            self._idle.append(connection)
+            return reply
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.command("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        await self.command("SET", key, value, "PX", str(max(1, int(ttl_seconds * 1000))))
+
+    async def close(self) -> None:
+        while self._idle:
+            self._idle.pop()[1].close()
+
+
+def create_backend(url: str, max_entries: int) -> CacheBackend:
+    scheme = urlsplit(url).scheme
+    if scheme == "memory":
+        return MemoryBackend(max_entries)
+    if scheme == "redis":
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported cache URL: {url!r}")
+
+
+@dataclass(frozen=True, slots=True)
+class CachedResult:
+    version: int
+    body: bytes
+    fresh_until: float
+
+    def encode(self) -> bytes:
+        return _HEADER.pack(self.version, self.fresh_until) + self.body
+
+    @classmethod
+    def decode(cls, data: bytes) -> "CachedResult":
+        version, fresh_until = _HEADER.unpack_from(data)
+        return cls(version, data[_HEADER.size:], fresh_until)
+
+
+class ResultCache:
+    """
+    Versioned results under `name`, kept in `backend`.
+
+    Backend failures are logged and counted, and the result is computed as
+    if the cache were empty.
+    """
+
+    def __init__(self, name: str, backend: CacheBackend, ttl_seconds: float, stale_seconds: float):
+        self.name = name
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self._inflight: dict[str, asyncio.Task[CachedResult]] = {}
+
+    async def get_or_compute(
+        self,
+        key: str,
+        version: int,
+        compute: Callable[[], Awaitable[tuple[int, bytes]]],
+    ) -> CachedResult:
+        """
+        The result for `key` at `version` or newer.
+
+        `compute` returns the body and the version it was computed from, read
+        before the data so the body is never older than the version.
+        """
+        key = f"{self.name}:{key}"
+        entry = await self._load(key)
+        if entry is not None and entry.version >= version:
+            if entry.fresh_until > time.time():
+                RESULT_CACHE_LOOKUPS.labels(self.name, "hit").inc()
+                return entry
+            RESULT_CACHE_LOOKUPS.labels(self.name, "stale").inc()
+            self._start(key, compute)
+            return entry
+        RESULT_CACHE_LOOKUPS.labels(self.name, "miss").inc()
+        pending = self._inflight.get(key)
+        if pending is not None:
+            # Shielded: the computation is shared and must outlive any one waiter.
+            result = await asyncio.shield(pending)
+            if result.version >= version:
+                return result
+        return await asyncio.shield(self._start(key, compute))
+
+    def _start(self, key: str, compute: Callable[[], Awaitable[tuple[int, bytes]]]) -> asyncio.Task[CachedResult]:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._compute(key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return task
+
+    def _finished(self, key: str, task: asyncio.Task[CachedResult]) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Computing %s failed: %r", key, task.exception())
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[tuple[int, bytes]]]) -> CachedResult:
+        version, body = await compute()
+        entry = CachedResult(version, body, time.time() + self.ttl_seconds)
+        if self.ttl_seconds + self.stale_seconds > 0:
+            try:
+                await self.backend.set(key, entry.encode(), self.ttl_seconds + self.stale_seconds)
+            except CacheUnavailableError as exc:
+                self._failed(key, exc)
+        return entry
+
+    async def _load(self, key: str) -> CachedResult | None:
+        try:
+            data = await self.backend.get(key)
+        except CacheUnavailableError as exc:
+            self._failed(key, exc)
+            return None
+        return None if data is None else CachedResult.decode(data)
+
+    def _failed(self, key: str, exc: CacheUnavailableError) -> None:
+        RESULT_CACHE_ERRORS.labels(self.name).inc()
+        logger.warning("Cache unavailable for %s: %s", key, exc)
+
+    async def close(self) -> None:
+        for task in list(self._inflight.values()):
+            task.cancel()
+        await self.backend.close()
+
+
+balance_cache = ResultCache(
+    "balance",
+    create_backend(settings.balance_cache_url, settings.balance_cache_max_entries),
+    settings.balance_cache_ttl_seconds,
+    settings.balance_cache_stale_seconds,
+)
@@ -16,6 +16,53 @@ class Settings(BaseSettings):
     environment: str = "dev"
     log_level: str = Field(default="INFO", validation_alias="LOG_LEVEL")
 
+    # Database
+    # Serve requests through AsyncSession + asyncpg instead of the sync
+    # psycopg2 Session in the threadpool. Off by default: the sync stack
+    # served more requests per second in scripts.load_test.
+    db_async: bool = Field(default=False, validation_alias="DB_ASYNC")
+    db_pool_size: int = Field(default=5, validation_alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(default=10, validation_alias="DB_MAX_OVERFLOW")
+    db_pool_timeout: float = Field(default=30.0, validation_alias="DB_POOL_TIMEOUT")
+    # Seconds after which a connection is replaced; -1 keeps connections forever.
+    db_pool_recycle: int = Field(default=1800, validation_alias="DB_POOL_RECYCLE")
+    db_pool_pre_ping: bool = Field(default=False, validation_alias="DB_POOL_PRE_PING")
+    # Connect through PgBouncer in transaction mode: no server-side prepared
+    # statement caching and unique statement names.
+    db_pgbouncer: bool = Field(default=False, validation_alias="DB_PGBOUNCER")
+
+    # Requests report their statement count and database time in a
+    # Server-Timing header, and log a warning when they run one statement
+    # shape more than this many times (an N+1 pattern); 0 disables the warning.
+    query_repeat_warning_threshold: int = Field(default=10, validation_alias="QUERY_REPEAT_WARNING_THRESHOLD")
+    # Statements slower than this are logged with their redacted parameters and
+    # the route that ran them; 0 disables the log.
+    slow_query_threshold_ms: float = Field(default=1000.0, validation_alias="SLOW_QUERY_THRESHOLD_MS")
+    # Also log the EXPLAIN (ANALYZE, BUFFERS) plan of slow SELECTs, captured on a
+    # separate connection at most once per statement shape per interval.
+    slow_query_explain: bool = Field(default=False, validation_alias="SLOW_QUERY_EXPLAIN")
+    slow_query_explain_interval_seconds: float = Field(
+        default=600.0,
+        validation_alias="SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS",
+    )
+
+    # Overdue sweeper: marks late pending invoices overdue in the background.
+    overdue_sweep_enabled: bool = Field(default=True, validation_alias="OVERDUE_SWEEP_ENABLED")
+    overdue_sweep_interval_seconds: float = Field(
+        default=300.0,
+        validation_alias="OVERDUE_SWEEP_INTERVAL_SECONDS",
+    )
+    overdue_sweep_batch_size: int = Field(default=1000, validation_alias="OVERDUE_SWEEP_BATCH_SIZE")
+
+    # Balance responses are cached per school/student and balance_version.
+    # memory:// keeps them in each worker; redis://host:port/db shares them.
+    # Entries are served for the TTL, then for the stale window while one
+    # request recomputes them in the background. Set both to 0 to disable.
+    balance_cache_url: str = Field(default="memory://", validation_alias="BALANCE_CACHE_URL")
+    balance_cache_ttl_seconds: float = Field(default=30.0, validation_alias="BALANCE_CACHE_TTL_SECONDS")
+    balance_cache_stale_seconds: float = Field(default=300.0, validation_alias="BALANCE_CACHE_STALE_SECONDS")
+    balance_cache_max_entries: int = Field(default=10000, validation_alias="BALANCE_CACHE_MAX_ENTRIES")
+
     # Authentication
     secret_key: str = Field(
         default="change-me-in-production",
@@ -25,6 +72,21 @@ class Settings(BaseSettings):
         default=1440,  # 24 hours
         validation_alias="ACCESS_TOKEN_EXPIRE_MINUTES",
     )
+    # How long a worker trusts its cached copy of a user's token version when
+    # it misses the change notification (e.g. while reconnecting).
+    token_version_ttl_seconds: float = Field(default=300.0, validation_alias="TOKEN_VERSION_TTL_SECONDS")
+    token_version_cache_max_entries: int = Field(
+        default=10000,
+        validation_alias="TOKEN_VERSION_CACHE_MAX_ENTRIES",
+    )
+
+    # bcrypt runs on a dedicated pool of this many threads; requests wait up
+    # to the queue timeout for a free one before failing with 503.
+    password_hash_workers: int = Field(default=2, validation_alias="PASSWORD_HASH_WORKERS")
+    password_hash_queue_timeout_seconds: float = Field(
+        default=5.0,
+        validation_alias="PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS",
+    )
 
     # Admin user (created on startup if doesn't exist)
     admin_email: str = Field(
@@ -4,7 +4,7 @@ from enum import Enum
 
 from app.db.database import Base  # noqa: F401
 from datetime import datetime
-from sqlalchemy import String, DateTime, ForeignKey, Integer
+from sqlalchemy import String, DateTime, ForeignKey, Index, Integer
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 
@@ -36,6 +36,8 @@ class School(Base):
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     country: Mapped[str] = mapped_column(String(3), nullable=False)
     tax_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    # Bumped whenever the school's balance changes; the balance endpoint's ETag.
+    balance_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
 
@@ -50,7 +52,9 @@ class Student(Base):
     identifier: Mapped[str] = mapped_column(String(100), nullable=False, unique=True)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     email: Mapped[str] = mapped_column(String(255), nullable=False, unique=True)
-    school_id: Mapped[int] = mapped_column(ForeignKey("school.id"), nullable=False)
+    school_id: Mapped[int] = mapped_column(ForeignKey("school.id"), nullable=False, index=True)
+    # Bumped whenever the student's balance changes; the balance endpoint's ETag.
+    balance_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
 
@@ -70,6 +74,8 @@ class Invoice(Base):
     issue_date: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     due_date: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     description: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    # Sum of allocations from completed payments, maintained by the allocation services.
+    paid_cents: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
     student_id: Mapped[int] = mapped_column(ForeignKey("student.id"), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
@@ -78,6 +84,36 @@ class Invoice(Base):
     allocations: Mapped[list[PaymentAllocation]] = relationship(back_populates="invoice")
 
 
+# Serves per-student totals and the unpaid invoice listing of the balance endpoints.
+Index(
+    "ix_invoice_student_id_status_amount_due_date",
+    Invoice.student_id,
+    Invoice.status,
+    Invoice.amount_in_cents.desc(),
+    Invoice.due_date,
+)
+# Lets the overdue sweeper find late pending invoices without scanning the table.
+Index(
+    "ix_invoice_pending_due_date",
+    Invoice.due_date,
+    postgresql_where=Invoice.status == InvoiceStatus.PENDING.value,
+)
+# Keep in sync with app.constants.UNPAID_INVOICE_STATUSES.
+Index(
+    "ix_invoice_unpaid_student_id_amount_due_date",
+    Invoice.student_id,
+    Invoice.amount_in_cents.desc(),
+    Invoice.due_date,
+    postgresql_where=Invoice.status.in_(
+        [
+            InvoiceStatus.PENDING.value,
+            InvoiceStatus.PARTIALLY_PAID.value,
+            InvoiceStatus.OVERDUE.value,
+        ]
+    ),
+)
+
+
 class Payment(Base):
     __tablename__ = "payment"
 
@@ -86,6 +122,8 @@ class Payment(Base):
     currency: Mapped[str] = mapped_column(String(3), nullable=False)
     status: Mapped[str] = mapped_column(String(20), nullable=False, default=PaymentStatus.PENDING.value)
     payment_method: Mapped[str] = mapped_column(String(20), nullable=False)
+    # Sum of this payment's allocations, maintained by the allocation services.
+    allocated_cents: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
     student_id: Mapped[int] = mapped_column(ForeignKey("student.id"), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
@@ -94,12 +132,15 @@ class Payment(Base):
     allocations: Mapped[list[PaymentAllocation]] = relationship(back_populates="payment")
 
 
+Index("ix_payment_student_id_created_at", Payment.student_id, Payment.created_at.desc())
+
+
 class PaymentAllocation(Base):
     __tablename__ = "payment_allocation"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    payment_id: Mapped[int] = mapped_column(ForeignKey("payment.id"), nullable=False)
-    invoice_id: Mapped[int] = mapped_column(ForeignKey("invoice.id"), nullable=False)
+    payment_id: Mapped[int] = mapped_column(ForeignKey("payment.id"), nullable=False, index=True)
+    invoice_id: Mapped[int] = mapped_column(ForeignKey("invoice.id"), nullable=False, index=True)
     amount_in_cents: Mapped[int] = mapped_column(Integer, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
 
@@ -115,6 +156,8 @@ class User(Base):
     hashed_password: Mapped[str] = mapped_column(String(255), nullable=False)
     school_id: Mapped[int | None] = mapped_column(ForeignKey("school.id"), nullable=True)
     is_admin: Mapped[bool] = mapped_column(default=False, nullable=False)
+    # Bumped whenever the claims in the user's tokens change, revoking older tokens.
+    token_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
 
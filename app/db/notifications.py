@@ -0,0 +1,59 @@
+"""
+Cross-worker cache invalidation over Postgres LISTEN/NOTIFY.
+
+Changes to a user send a notification on USER_CHANGED_CHANNEL inside the
+changing transaction, so it is only delivered if the change commits. Every
+worker listens on a dedicated connection and drops the user's cached token
+version.
+"""
+
+import asyncio
+import os
+
+import asyncpg
+from sqlalchemy import func, make_url, select
+from sqlalchemy.orm import Session
+
+from app.auth import token_versions
+from app.db.database import DATABASE_URL
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+USER_CHANGED_CHANNEL = "user_changed"
+# LISTEN needs a session of its own; behind PgBouncer in transaction mode
+# point this at Postgres directly.
+LISTEN_DATABASE_URL = os.environ.get("LISTEN_DATABASE_URL") or DATABASE_URL
+RECONNECT_SECONDS = 5.0
+
+
+def notify_user_changed(db: Session, user_id: int) -> None:
+    """Queue a user_changed notification, delivered when `db` commits."""
+    db.execute(select(func.pg_notify(USER_CHANGED_CHANNEL, str(user_id))))
+
+
+def _on_user_changed(connection, pid: int, channel: str, payload: str) -> None:
+    token_versions.invalidate(int(payload))
+
+
+async def listen_for_user_changes() -> None:
+    """Invalidate cached token versions as users change, reconnecting until cancelled."""
+    dsn = make_url(LISTEN_DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+    while True:
+        try:
+            connection = await asyncpg.connect(dsn)
+        except (OSError, asyncpg.PostgresError):
+            logger.exception("Could not connect to listen for user changes")
+            await asyncio.sleep(RECONNECT_SECONDS)
+            continue
+        try:
+            closed = asyncio.Event()
+            connection.add_termination_listener(lambda _: closed.set())
+            await connection.add_listener(USER_CHANGED_CHANNEL, _on_user_changed)
+            # Notifications sent while not listening are lost.
+            token_versions.clear()
+            await closed.wait()
+            logger.warning("Connection listening for user changes was closed")
+        finally:
+            await connection.close()
+        await asyncio.sleep(RECONNECT_SECONDS)
@@ -0,0 +1,60 @@
+"""Connection pools that record how long checkouts wait and how many connections are in use."""
+
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, QueuePool
+
+from app.metrics import POOL_CHECKOUT_TIMEOUTS, POOL_CHECKOUT_WAIT, record_pool_usage
+
+
+class _CheckoutTimingMixin:
+    """
+    Times `_do_get`, which blocks until a connection is free or pool_timeout
+    expires, and reports the pool's usage after every checkout and return.
+    """
+
+    metrics_name: str
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_CHECKOUT_TIMEOUTS.labels(self.metrics_name).inc()
+            raise
+        finally:
+            POOL_CHECKOUT_WAIT.labels(self.metrics_name).observe(time.perf_counter() - start)
+            self._record_usage()
+
+    def _do_return_conn(self, record: ConnectionPoolEntry) -> None:
+        try:
+            super()._do_return_conn(record)
+        finally:
+            self._record_usage()
+
+    def _record_usage(self) -> None:
+        # A negative max_overflow means no limit, so there is no saturation to report.
+        capacity = self.size() + self._max_overflow if self._max_overflow >= 0 else 0
+        record_pool_usage(
+            self.metrics_name,
+            checked_out=self.checkedout(),
+            overflow=max(self.overflow(), 0),
+            capacity=capacity,
+        )
+
+
+class InstrumentedQueuePool(_CheckoutTimingMixin, QueuePool):
+    metrics_name = "sync"
+
+
+class InstrumentedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    metrics_name = "async"
+
+
+class InstrumentedReadQueuePool(_CheckoutTimingMixin, QueuePool):
+    metrics_name = "sync_read"
+
+
+class InstrumentedAsyncReadQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    metrics_name = "async_read"
@@ -0,0 +1,126 @@
+"""
+Per-request SQL statement counts and database time.
+
+Cursor events on every engine add each statement to the QueryStats of the
+request being served. The stats live in a context variable, which
+Starlette's threadpool and AsyncSession.run_sync both carry into the code
+that runs the statement. QueryStatsMiddleware reports the totals in a
+Server-Timing header and logs a warning when a request runs the same
+statement shape more times than its threshold, which is how N+1 lazy loads
+show up.
+"""
+
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+SERVER_TIMING_HEADER = "Server-Timing"
+
+# psycopg2 (%(name)s), asyncpg ($1) and qmark placeholders.
+PLACEHOLDER = re.compile(r"%\(\w+\)s|\$\d+|\?")
+PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+
+_current_stats: ContextVar["QueryStats | None"] = ContextVar("query_stats", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    """The statement with each parameter, and each list of them, replaced by a single ?."""
+    shape = PLACEHOLDER.sub("?", " ".join(statement.split()))
+    return PLACEHOLDER_LIST.sub("?", shape)
+
+
+class QueryStats:
+    """Statements run on behalf of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Counter[str] = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement_shape(statement)] += 1
+
+    def most_repeated(self) -> tuple[str, int] | None:
+        """The statement shape run most often, with its count."""
+        if not self.shapes:
+            return None
+        return self.shapes.most_common(1)[0]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration * 1000:.2f};desc="{self.count} statements"'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if _current_stats.get() is not None:
+        conn.info["query_stats_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = _current_stats.get()
+    start = conn.info.pop("query_stats_start", None)
+    if stats is not None and start is not None:
+        stats.record(statement, time.perf_counter() - start)
+
+
+def install_query_stats(engine: Engine) -> None:
+    """Count the statements run on engine (the sync_engine of an AsyncEngine) per request."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryStatsMiddleware:
+    """
+    Collects the statements each request runs.
+
+    The count and total database time go out in the Server-Timing header,
+    so only statements run before the response starts are included. A
+    request that runs one statement shape more than `repeat_threshold` times
+    is logged as a warning; 0 disables the check.
+    """
+
+    def __init__(self, app: ASGIApp, repeat_threshold: int):
+        self.app = app
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (SERVER_TIMING_HEADER.lower().encode(), stats.server_timing().encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_stats.reset(token)
+            self.check_repeats(scope, stats)
+
+    def check_repeats(self, scope: Scope, stats: QueryStats) -> None:
+        repeated = stats.most_repeated()
+        if not self.repeat_threshold or repeated is None or repeated[1] <= self.repeat_threshold:
+            return
+        shape, count = repeated
+        logger.warning(
+            "%s %s ran the same statement %d times (%d statements in total): %s",
+            scope["method"], scope["path"], count, stats.count, shape[:500],
+        )
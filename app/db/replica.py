@@ -0,0 +1,109 @@
+"""
+Read-your-writes routing between the primary and a read replica.
+
+Successful writes return the primary's WAL position in the X-Write-LSN
+header. A read that sends it back is served by the replica only once the
+replica has replayed WAL up to that position, and by the primary otherwise.
+"""
+
+from fastapi import HTTPException, Request
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+WRITE_LSN_HEADER = "X-Write-LSN"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+CURRENT_LSN_SQL = text("SELECT pg_current_wal_lsn()::text")
+# NULL when the server is not replaying WAL, i.e. the "replica" is a primary.
+REPLAY_LSN_SQL = text("SELECT pg_last_wal_replay_lsn()::text")
+
+
+class InvalidLSNError(HTTPException):
+    """Raised when the X-Write-LSN header is not a PostgreSQL LSN."""
+
+    def __init__(self):
+        super().__init__(status_code=400, detail=f"Invalid {WRITE_LSN_HEADER} header")
+
+
+def parse_lsn(value: str) -> int:
+    """Convert an LSN such as '16/B374D848' to a comparable integer."""
+    try:
+        high, low = value.split("/")
+        return (int(high, 16) << 32) | int(low, 16)
+    except ValueError:
+        raise InvalidLSNError()
+
+
+class ReplicaLagTracker:
+    """
+    Remembers the highest WAL position the replica is known to have replayed.
+
+    Replay only moves forward, so a write older than that position can be
+    routed to the replica without asking it again.
+    """
+
+    def __init__(self):
+        self.replayed_lsn = 0
+
+    def caught_up(self, lsn: int) -> bool:
+        return lsn <= self.replayed_lsn
+
+    def observe(self, replay_lsn: str | None) -> None:
+        # A server that is not replaying is a primary and has every write.
+        replayed = (1 << 64) if replay_lsn is None else parse_lsn(replay_lsn)
+        self.replayed_lsn = max(self.replayed_lsn, replayed)
+
+
+replica_lag = ReplicaLagTracker()
+
+
+def required_lsn(request: Request) -> int | None:
+    value = request.headers.get(WRITE_LSN_HEADER)
+    return None if value is None else parse_lsn(value)
+
+
+def replica_has_lsn(replica: Session, lsn: int | None) -> bool:
+    """Whether the replica session can serve a read that must see `lsn`."""
+    if lsn is None or replica_lag.caught_up(lsn):
+        return True
+    replica_lag.observe(replica.execute(REPLAY_LSN_SQL).scalar())
+    return replica_lag.caught_up(lsn)
+
+
+async def replica_has_lsn_async(replica: AsyncSession, lsn: int | None) -> bool:
+    """Async variant of replica_has_lsn."""
+    if lsn is None or replica_lag.caught_up(lsn):
+        return True
+    replica_lag.observe((await replica.execute(REPLAY_LSN_SQL)).scalar())
+    return replica_lag.caught_up(lsn)
+
+
+class WriteLSNMiddleware:
+    """
+    Adds the primary's current WAL position to successful write responses.
+
+    The position is read after the endpoint has committed, so it covers the
+    request's own writes. `current_lsn` is an async callable returning it.
+    """
+
+    def __init__(self, app: ASGIApp, current_lsn):
+        self.app = app
+        self.current_lsn = current_lsn
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_lsn(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                lsn = await self.current_lsn()
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (WRITE_LSN_HEADER.lower().encode(), lsn.encode()),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_lsn)
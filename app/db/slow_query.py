@@ -0,0 +1,182 @@
+"""
+Slow statement log.
+
+A statement that takes longer than the threshold is logged with:
+
+- its shape (see query_stats.statement_shape);
+- its parameters, redacted to their types;
+- how long it took;
+- the route that ran it.
+
+The log record carries a short statement id derived from the shape.
+
+With EXPLAIN enabled, a slow SELECT is also run again under
+EXPLAIN (ANALYZE, BUFFERS). This happens on a connection of its own in a
+background thread, so the request never waits for it, even while its own
+transaction still holds locks the SELECT needs. The plan is logged as a
+second record with the same statement id. ANALYZE executes the statement
+again, so only read-only SELECTs (WITH queries included) are explained,
+and each shape at most once per interval.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from sqlalchemy import URL, create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+
+from app.db.query_stats import statement_shape
+from app.logging_config import get_logger
+from app.serialization import current_route
+
+logger = get_logger(__name__)
+
+# Bounds for the EXPLAIN connection, so a plan capture cannot pile up behind locks.
+EXPLAIN_STATEMENT_TIMEOUT_MS = 30_000
+EXPLAIN_LOCK_TIMEOUT_MS = 1_000
+# Shapes remembered by the rate limit; older ones are forgotten past this.
+MAX_TRACKED_SHAPES = 1_000
+
+ASYNCPG_PLACEHOLDER = re.compile(r"\$(\d+)")
+# Locking reads and advisory locks have side effects EXPLAIN ANALYZE would repeat.
+LOCKING = re.compile(r"\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE|KEY\s+SHARE)\b|advisory", re.IGNORECASE)
+# A WITH query may hide a data-modifying statement in one of its CTEs.
+WRITING = re.compile(r"\b(?:INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+
+
+def statement_id(shape: str) -> str:
+    return hashlib.sha1(shape.encode()).hexdigest()[:12]
+
+
+def redact(parameters: Any, executemany: bool) -> Any:
+    """The parameters with each value replaced by its type name."""
+    if executemany:
+        return f"<{len(parameters)} parameter sets>"
+    if isinstance(parameters, Mapping):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def explainable(statement: str) -> bool:
+    """Whether re-running statement under EXPLAIN ANALYZE only reads."""
+    keyword = statement.lstrip()[:6].upper()
+    if keyword.startswith("WITH") and WRITING.search(statement):
+        return False
+    return keyword.startswith(("SELECT", "WITH")) and not LOCKING.search(statement)
+
+
+def psycopg2_statement(statement: str, parameters: Any) -> tuple[str, dict[str, Any]]:
+    """
+    The statement and parameters in psycopg2's pyformat style.
+
+    psycopg2 statements are returned as they are. asyncpg ones use $n
+    placeholders and positional parameters, which become named, with
+    literal percent signs escaped.
+    """
+    if isinstance(parameters, Mapping):
+        return statement, dict(parameters)
+    if not parameters:
+        return statement, {}
+    named = ASYNCPG_PLACEHOLDER.sub(r"%(p\1)s", statement.replace("%", "%%"))
+    return named, {f"p{position}": value for position, value in enumerate(parameters, start=1)}
+
+
+class SlowQueryLog:
+    """
+    Logs the slow statements of one engine.
+
+    `explain_url` is the database to capture plans on, or None to log
+    without plans.
+    """
+
+    def __init__(self, threshold_seconds: float, explain_url: URL | None, explain_interval_seconds: float):
+        self.threshold_seconds = threshold_seconds
+        self.explain_interval_seconds = explain_interval_seconds
+        self.explain_engine = None
+        self.executor = None
+        if explain_url is not None:
+            self.explain_engine = create_engine(explain_url.set(drivername="postgresql+psycopg2"), poolclass=NullPool)
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+        self._explained: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, statement: str, parameters: Any, executemany: bool, duration: float) -> None:
+        if duration < self.threshold_seconds:
+            return
+        shape = statement_shape(statement)
+        identifier = statement_id(shape)
+        logger.warning(
+            "Slow statement %s took %.1f ms on route %s: %s parameters=%s",
+            identifier, duration * 1000, current_route(), shape, redact(parameters, executemany),
+        )
+        if self.executor is not None and not executemany and explainable(statement) and self._claim(shape):
+            self.executor.submit(self._log_plan, identifier, statement, parameters)
+
+    def _claim(self, shape: str) -> bool:
+        """Whether shape is due for a plan capture, recording the capture if so."""
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained.get(shape)
+            if last is not None and now - last < self.explain_interval_seconds:
+                return False
+            if len(self._explained) >= MAX_TRACKED_SHAPES:
+                self._explained = {
+                    tracked: at for tracked, at in self._explained.items()
+                    if now - at < self.explain_interval_seconds
+                }
+            self._explained[shape] = now
+            return True
+
+    def explain(self, statement: str, parameters: Any) -> str:
+        sql, named_parameters = psycopg2_statement(statement, parameters)
+        with self.explain_engine.connect() as conn:
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {EXPLAIN_STATEMENT_TIMEOUT_MS}")
+            conn.exec_driver_sql(f"SET LOCAL lock_timeout = {EXPLAIN_LOCK_TIMEOUT_MS}")
+            explain = f"EXPLAIN (ANALYZE, BUFFERS) {sql}"
+            if named_parameters:
+                lines = conn.exec_driver_sql(explain, named_parameters).scalars().all()
+            else:
+                lines = conn.exec_driver_sql(explain).scalars().all()
+            conn.rollback()
+        return "\n".join(lines)
+
+    def _log_plan(self, identifier: str, statement: str, parameters: Any) -> None:
+        try:
+            plan = self.explain(statement, parameters)
+        except Exception as exc:
+            logger.warning("Could not explain slow statement %s: %s", identifier, exc)
+            return
+        logger.warning("Plan of slow statement %s:\n%s", identifier, plan)
+
+    def close(self) -> None:
+        """Drop pending plan captures; one already running finishes within its statement timeout."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.explain_engine.dispose()
+
+
+def install_slow_query_log(
+    engine: Engine, threshold_seconds: float, explain: bool, explain_interval_seconds: float
+) -> SlowQueryLog:
+    """Log the statements on engine (the sync_engine of an AsyncEngine) slower than the threshold."""
+    slow_query_log = SlowQueryLog(threshold_seconds, engine.url if explain else None, explain_interval_seconds)
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info["slow_query_start"] = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        start = conn.info.pop("slow_query_start", None)
+        if start is not None:
+            slow_query_log.observe(statement, parameters, executemany, time.perf_counter() - start)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    return slow_query_log
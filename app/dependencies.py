@@ -1,13 +1,30 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 from typing import Annotated
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.auth import decode_token
-from app.db.database import SessionLocal
-from app.db.models import User
+from app.auth import Principal, decode_token, principal_from_claims, token_versions
+from app.config import settings
+from app.db.database import (
+    READ_DATABASE_URL,
+    AsyncDatabase,
+    AsyncDetachedDatabase,
+    AsyncReadSessionLocal,
+    AsyncRowStream,
+    AsyncSessionLocal,
+    Database,
+    ReadSessionLocal,
+    RowStream,
+    SessionLocal,
+    SyncDatabase,
+    SyncDetachedDatabase,
+    SyncRowStream,
+)
+from app.db.replica import replica_has_lsn, replica_has_lsn_async, required_lsn
+from app.services import user as user_service
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -20,10 +37,107 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
-def get_current_user(
+def get_sync_database(db: Session = Depends(get_db)) -> Database:
+    return SyncDatabase(db)
+
+
+async def get_async_database() -> AsyncGenerator[Database, None]:
+    async with AsyncSessionLocal() as session:
+        yield AsyncDatabase(session)
+
+
+def open_read_session(lsn: int | None) -> Session:
+    """
+    Session for reads: the replica, unless it has not yet replayed the
+    write position `lsn` the client needs to see.
+    """
+    db = ReadSessionLocal()
+    try:
+        if READ_DATABASE_URL and not replica_has_lsn(db, lsn):
+            db.close()
+            db = SessionLocal()
+    except Exception:
+        db.close()
+        raise
+    return db
+
+
+async def open_async_read_session(lsn: int | None) -> AsyncSession:
+    """Async variant of open_read_session."""
+    session = AsyncReadSessionLocal()
+    try:
+        if READ_DATABASE_URL and not await replica_has_lsn_async(session, lsn):
+            await session.close()
+            session = AsyncSessionLocal()
+    except Exception:
+        await session.close()
+        raise
+    return session
+
+
+def get_read_db(request: Request) -> Generator[Session, None, None]:
+    """Session for read-only endpoints, honouring the client's X-Write-LSN."""
+    db = open_read_session(required_lsn(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_sync_read_database(db: Session = Depends(get_read_db)) -> Database:
+    return SyncDatabase(db)
+
+
+async def get_async_read_database(request: Request) -> AsyncGenerator[Database, None]:
+    """Async variant of get_read_db."""
+    session = await open_async_read_session(required_lsn(request))
+    try:
+        yield AsyncDatabase(session)
+    finally:
+        await session.close()
+
+
+def get_sync_read_stream(request: Request) -> RowStream:
+    lsn = required_lsn(request)
+    return SyncRowStream(lambda: open_read_session(lsn))
+
+
+def get_async_read_stream(request: Request) -> RowStream:
+    lsn = required_lsn(request)
+    return AsyncRowStream(lambda: open_async_read_session(lsn))
+
+
+def get_sync_detached_read_database(request: Request) -> Database:
+    lsn = required_lsn(request)
+    return SyncDetachedDatabase(lambda: open_read_session(lsn))
+
+
+def get_async_detached_read_database(request: Request) -> Database:
+    lsn = required_lsn(request)
+    return AsyncDetachedDatabase(lambda: open_async_read_session(lsn))
+
+
+# Selected once at import so both stacks can be A/B tested per deployment.
+get_database = get_async_database if settings.db_async else get_sync_database
+get_read_database = get_async_read_database if settings.db_async else get_sync_read_database
+get_read_stream = get_async_read_stream if settings.db_async else get_sync_read_stream
+get_detached_read_database = (
+    get_async_detached_read_database if settings.db_async else get_sync_detached_read_database
+)
+
+
+async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
-    db: Session = Depends(get_db),
-) -> User:
+    db: Database = Depends(get_database),
+) -> Principal:
+    """
+    The principal named by the token's claims.
+
+    The user table is only consulted when this worker has no fresh copy of
+    the user's token version, to reject revoked tokens and deleted users.
+    It is read on the primary: a lagging replica could return the version
+    from before a revocation, which would then be cached.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -32,24 +146,29 @@ def get_current_user(
     payload = decode_token(token)
     if payload is None:
         raise credentials_exception
-    email: str = payload.get("sub")
-    if email is None:
+    principal = principal_from_claims(payload)
+    if principal is None:
         raise credentials_exception
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    version = token_versions.get(principal.id)
+    if version is None:
+        version = await db.run(user_service.get_token_version, principal.id)
+        if version is None:
+            raise credentials_exception
+        token_versions.set(principal.id, version)
+    if version != principal.token_version:
         raise credentials_exception
-    return user
+    return principal
 
 
-def get_current_active_user(
-    current_user: Annotated[User, Depends(get_current_user)],
-) -> User:
+async def get_current_active_user(
+    current_user: Annotated[Principal, Depends(get_current_user)],
+) -> Principal:
     return current_user
 
 
-def require_admin(
-    current_user: Annotated[User, Depends(get_current_active_user)],
-) -> User:
+async def require_admin(
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
+) -> Principal:
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -58,7 +177,7 @@ def require_admin(
     return current_user
 
 
-def check_school_access(current_user: User, school_id: int) -> None:
+def check_school_access(current_user: Principal, school_id: int) -> None:
     """Check if user has access to the specified school."""
     if current_user.is_admin:
         return
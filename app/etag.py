@@ -0,0 +1,49 @@
+"""
+Entity tags for conditional GETs.
+
+Balance tags are built from the school or student ``balance_version``
+counter, which the write services bump whenever an invoice, payment or
+allocation changes; detail tags are built from the row's ``updated_at``.
+A client that sends a matching ``If-None-Match`` gets an empty ``304``
+without the handler computing the body.
+"""
+
+from datetime import datetime
+
+from fastapi import Request, Response
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def balance_etag(kind: str, entity_id: int, version: int) -> str:
+    return f'"{kind}-{entity_id}-balance-{version}"'
+
+
+def updated_at_etag(kind: str, entity_id: int, updated_at: datetime) -> str:
+    return f'"{kind}-{entity_id}-{updated_at:%Y%m%d%H%M%S%f}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against etag, as RFC 9110 requires."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def etag_headers(etag: str) -> dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Response | None:
+    """
+    Return a 304 response if the request already holds etag.
+
+    Otherwise set the ETag and Cache-Control headers on response and
+    return None so the handler goes on to build the body.
+    """
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=etag_headers(etag))
+    response.headers.update(etag_headers(etag))
+    return None
@@ -0,0 +1,60 @@
+"""
+Request latency and concurrency metrics.
+
+Latency is labelled with the route template FastAPI matched (so /school/1 and
+/school/2 share a series), the method and the response status. Requests no
+route matched are labelled "unmatched" to keep the label set bounded.
+"""
+
+import time
+
+from anyio.to_thread import current_default_thread_limiter
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, THREADPOOL_CAPACITY, THREADPOOL_IN_USE
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+def route_template(scope: Scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path_format", None) or UNMATCHED_ROUTE
+
+
+def record_threadpool_usage() -> None:
+    """Sample the threadpool that run_in_threadpool and sync endpoints share."""
+    limiter = current_default_thread_limiter()
+    THREADPOOL_IN_USE.set(limiter.borrowed_tokens)
+    THREADPOOL_CAPACITY.set(limiter.total_tokens)
+
+
+class RequestMetricsMiddleware:
+    """Records the duration, status and route of each HTTP request and the number in flight."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # An exception escaping the app is turned into a 500 further out.
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            HTTP_REQUEST_DURATION.labels(scope["method"], route_template(scope), str(status)).observe(
+                time.perf_counter() - start
+            )
+            record_threadpool_usage()
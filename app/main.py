@@ -1,13 +1,33 @@
+import asyncio
 import os
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.auth import get_password_hash
+from app.cache import balance_cache
 from app.config import settings
-from app.db.database import engine, Base, SessionLocal
+from app.db.database import (
+    READ_DATABASE_URL,
+    Base,
+    SessionLocal,
+    async_engine,
+    async_read_engine,
+    current_write_lsn,
+    engine,
+    read_engine,
+    slow_query_logs,
+)
+from app.db.notifications import listen_for_user_changes
+from app.db.query_stats import QueryStatsMiddleware
+from app.db.replica import WRITE_LSN_HEADER, WriteLSNMiddleware
+from app.http_metrics import RequestMetricsMiddleware
 from app.logging_config import setup_logging, get_logger
-from app.routers import health, school, student, invoice, payment, payment_allocation, auth, user
+from app.metrics import mark_worker_stopped
+from app.scheduler import run_overdue_sweeper
+from app.serialization import FastJSONResponse
+from app.routers import health, metrics, school, student, invoice, payment, payment_allocation, auth, user
 from app.schemas import UserCreate
 from app.services import user as user_service
 
@@ -30,7 +50,7 @@ def create_admin_user_if_not_exists():
                 school_id=None,
                 is_admin=True,
             )
-            user_service.create_user(db, admin_data)
+            user_service.create_user(db, admin_data, get_password_hash(admin_data.password))
             logger.info("Admin user created: %s", settings.admin_email)
         else:
             logger.info("Admin user already exists: %s", settings.admin_email)
@@ -43,8 +63,23 @@ async def lifespan(app: FastAPI):
     setup_logging()
     Base.metadata.create_all(bind=engine)
     create_admin_user_if_not_exists()
+    tasks = [asyncio.create_task(listen_for_user_changes())]
+    if settings.overdue_sweep_enabled:
+        tasks.append(asyncio.create_task(run_overdue_sweeper(settings.overdue_sweep_interval_seconds)))
     yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await balance_cache.close()
     engine.dispose()
+    await async_engine.dispose()
+    if READ_DATABASE_URL:
+        read_engine.dispose()
+        await async_read_engine.dispose()
+    for slow_query_log in slow_query_logs:
+        slow_query_log.close()
+    mark_worker_stopped()
 
 
 app = FastAPI(
@@ -52,6 +87,7 @@ app = FastAPI(
     description="API for managing schools, students, invoices, and payments",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # CORS middleware to allow frontend requests
@@ -63,10 +99,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[WRITE_LSN_HEADER],
 )
 
+app.add_middleware(QueryStatsMiddleware, repeat_threshold=settings.query_repeat_warning_threshold)
+
+# Read-your-writes tokens are only needed when reads can go to a replica.
+if READ_DATABASE_URL:
+    app.add_middleware(WriteLSNMiddleware, current_lsn=current_write_lsn)
+
+# Outermost, so the measured latency includes the other middlewares.
+app.add_middleware(RequestMetricsMiddleware)
+
 app.include_router(auth.router)
 app.include_router(health.router)
+app.include_router(metrics.router)
 app.include_router(school.router)
 app.include_router(student.router)
 app.include_router(invoice.router)
@@ -0,0 +1,153 @@
+"""
+Prometheus metrics.
+
+Metrics are defined here so every module records into the same registry;
+they are exposed by the /metrics route.
+
+With PROMETHEUS_MULTIPROC_DIR set, every worker writes its samples to files
+in that directory and /metrics aggregates them, so any worker can answer a
+scrape. Gauges are therefore set when their value changes rather than read
+at scrape time, and each declares how worker values combine.
+"""
+
+import os
+
+from prometheus_client import Counter, Gauge, Histogram, multiprocess
+
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending its last body chunk, by method, route template and status.",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being served.",
+    multiprocess_mode="livesum",
+)
+THREADPOOL_IN_USE = Gauge(
+    "threadpool_threads_in_use",
+    "Threads of the request threadpool running sync code, sampled as each request finishes.",
+    multiprocess_mode="livesum",
+)
+THREADPOOL_CAPACITY = Gauge(
+    "threadpool_capacity",
+    "Threads the request threadpool may run at once.",
+    multiprocess_mode="livesum",
+)
+
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting to check out a database connection from the pool.",
+    ["pool"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Checkouts that gave up after pool_timeout because the pool was exhausted.",
+    ["pool"],
+)
+POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Connections currently checked out of the pool.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Connections open beyond pool_size.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+POOL_CAPACITY = Gauge(
+    "db_pool_capacity",
+    "Maximum connections the pool may hand out (pool_size + max_overflow).",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+POOL_SATURATION = Gauge(
+    "db_pool_saturation_ratio",
+    "Checked out connections divided by pool capacity; the busiest worker's across workers.",
+    ["pool"],
+    multiprocess_mode="livemax",
+)
+
+
+TOKEN_VERSION_CACHE_LOOKUPS = Counter(
+    "token_version_cache_lookups_total",
+    "Token version cache lookups made while authenticating, by result: hit or miss.",
+    ["result"],
+)
+PASSWORD_HASH_QUEUE_WAIT = Histogram(
+    "password_hash_queue_wait_seconds",
+    "Time spent waiting for a free password hashing worker.",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+PASSWORD_HASH_REJECTIONS = Counter(
+    "password_hash_rejections_total",
+    "Password hashing requests rejected with 503 after waiting the full queue timeout.",
+)
+RESULT_CACHE_LOOKUPS = Counter(
+    "result_cache_lookups_total",
+    "Result cache lookups by cache and result: hit, stale (served while refreshing) or miss.",
+    ["cache", "result"],
+)
+RESULT_CACHE_ERRORS = Counter(
+    "result_cache_errors_total",
+    "Cache backend operations that failed and fell back to computing the result.",
+    ["cache"],
+)
+RESPONSE_SERIALIZATION_SECONDS = Histogram(
+    "http_response_serialization_seconds",
+    "Time spent encoding JSON response bodies, by route template.",
+    ["route"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+OVERDUE_SWEEP_DURATION = Histogram(
+    "overdue_sweep_duration_seconds",
+    "Time taken by a run of the overdue invoice sweeper.",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+OVERDUE_SWEEP_INVOICES = Counter(
+    "overdue_sweep_invoices_total",
+    "Invoices marked overdue by the sweeper.",
+)
+ALLOCATION_VALIDATION_FAILURES = Counter(
+    "allocation_validation_failures_total",
+    "Payment allocations rejected by a validation rule, by reason.",
+    ["reason"],
+)
+OVERDUE_SWEEP_RUNS = Counter(
+    "overdue_sweep_runs_total",
+    "Sweeper runs by outcome: completed, skipped (another worker held the lock) or failed.",
+    ["outcome"],
+)
+
+
+def register_pool(name: str, capacity: int) -> None:
+    """
+    Report a pool's capacity, and its usage as empty until its first checkout.
+
+    The instrumented pools update the usage gauges on every checkout and return.
+    """
+    POOL_CAPACITY.labels(name).set(capacity)
+    record_pool_usage(name, checked_out=0, overflow=0, capacity=capacity)
+
+
+def record_pool_usage(name: str, checked_out: int, overflow: int, capacity: int) -> None:
+    POOL_CHECKED_OUT.labels(name).set(checked_out)
+    POOL_OVERFLOW.labels(name).set(overflow)
+    if capacity > 0:
+        POOL_SATURATION.labels(name).set(checked_out / capacity)
+
+
+def multiprocess_enabled() -> bool:
+    return MULTIPROC_DIR_ENV in os.environ
+
+
+def mark_worker_stopped() -> None:
+    """Drop this worker's live gauges from the aggregate; call when it shuts down."""
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,185 @@
+"""
+Pagination helpers shared by the list endpoints.
+
+Listings support two modes: the original `offset`/`limit` and keyset
+pagination through an opaque `cursor`. The cursor encodes the id of the last
+row of the previous page, so the next page is an index range scan
+(`WHERE id > :last_id ORDER BY id LIMIT :limit`) instead of scanning and
+discarding every skipped row.
+
+Services may page a query of ORM entities or, for the list endpoints, a
+query of the response columns only (each service's *_COLUMNS, built by
+serialization.response_columns); the latter is rendered to JSON by
+build_paginated_json without building ORM objects or response models.
+
+The total is controlled by CountMode:
+- EXACT: total and page come from one statement using COUNT(*) OVER ().
+  The window counts the whole filtered set, so it costs as much on a deep
+  cursor page as on the first one.
+- ESTIMATED: planner statistics (pg_class.reltuples for unfiltered tables,
+  EXPLAIN row estimates otherwise) plus the page query.
+- NONE: no total at all.
+"""
+
+import base64
+import binascii
+import json
+import math
+
+from collections.abc import Sequence
+from typing import Annotated
+
+from fastapi import HTTPException, Query as QueryParameter, Response
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import InstrumentedAttribute, Query, Session, aliased
+
+from app.schemas import CountMode
+from app.serialization import dumps, json_response, row_dicts
+
+
+# Query parameters of the list endpoints.
+PageLimit = Annotated[int, QueryParameter(ge=1)]
+PageCount = Annotated[
+    CountMode,
+    QueryParameter(
+        description="How `total` is computed. `exact` counts every matching row on each page, cursor "
+        "pages included; when paging deep with a cursor, keep the first page's total and pass `none`.",
+    ),
+]
+
+
+class InvalidCursorError(HTTPException):
+    """Raised when a pagination cursor cannot be decoded."""
+
+    def __init__(self):
+        super().__init__(status_code=400, detail="Invalid cursor")
+
+
+def encode_cursor(last_id: int) -> str:
+    payload = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError):
+        raise InvalidCursorError()
+    if not isinstance(last_id, int):
+        raise InvalidCursorError()
+    return last_id
+
+
+def paginate(
+    query: Query,
+    key_column: InstrumentedAttribute,
+    offset: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+) -> Query:
+    """Order the query by its key column and apply either the cursor or the offset."""
+    query = query.order_by(key_column)
+    if cursor is not None:
+        return query.filter(key_column > decode_cursor(cursor)).limit(limit)
+    return query.offset(offset).limit(limit)
+
+
+def _fetch_with_window_count(
+    query: Query, model: type, offset: int, limit: int, cursor: str | None
+) -> tuple[list, int]:
+    """
+    Fetch the page and the exact total in one statement.
+
+    Entity queries return the entities; column queries return their rows,
+    which carry the total as a trailing total_count column.
+    """
+    counted = query.add_columns(func.count().over().label("total_count")).subquery()
+    selects_entity = query.column_descriptions[0]["type"] is model
+    if selects_entity:
+        stmt = select(aliased(model, counted), counted.c.total_count)
+    else:
+        stmt = select(*counted.c)
+    stmt = stmt.order_by(counted.c.id)
+    if cursor is not None:
+        stmt = stmt.where(counted.c.id > decode_cursor(cursor))
+    else:
+        stmt = stmt.offset(offset)
+    rows = query.session.execute(stmt.limit(limit)).all()
+    if rows:
+        return [row[0] for row in rows] if selects_entity else rows, rows[0].total_count
+    if offset == 0 and cursor is None:
+        return [], 0
+    # Past the last row the window has nothing to count over.
+    return [], query.order_by(None).count()
+
+
+def estimate_count(db: Session, query: Query, model: type) -> int:
+    """Estimate the number of rows the query returns from planner statistics."""
+    if query.whereclause is None:
+        table = db.get_bind().dialect.identifier_preparer.quote(model.__tablename__)
+        reltuples = db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+            {"table": table},
+        ).scalar()
+        # reltuples is -1 until the table has been vacuumed or analyzed.
+        if reltuples is not None and reltuples >= 0:
+            return int(reltuples)
+
+    statement = query.order_by(None).statement.compile(
+        dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True}
+    )
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}").scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def fetch_page(
+    query: Query,
+    model: type,
+    offset: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count: CountMode = CountMode.EXACT,
+) -> tuple[list, int | None]:
+    """
+    Fetch one page of `query` and its total according to `count`.
+
+    `query` selects either `model` entities or columns of `model` including id.
+    """
+    if count == CountMode.EXACT:
+        return _fetch_with_window_count(query, model, offset, limit, cursor)
+
+    items = paginate(query, model.id, offset, limit, cursor).all()
+    if count == CountMode.ESTIMATED:
+        return items, estimate_count(query.session, query, model)
+    return items, None
+
+
+def build_paginated_json(
+    rows: Sequence, fields: list[str], total: int | None, limit: int, offset: int
+) -> Response:
+    """
+    Render a PaginatedResponse body for a page of column-query rows fetched
+    with `limit + 1` rows.
+
+    Each row's leading values are the response `fields`, in order. The extra
+    row is only used to tell whether another page exists and is dropped.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    body = dumps({
+        "items": row_dicts(rows, fields),
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "pages": _pages(total, limit),
+        "has_more": has_more,
+        "next_cursor": encode_cursor(rows[-1].id) if has_more and rows else None,
+    })
+    return json_response(body)
+
+
+def _pages(total: int | None, limit: int) -> int | None:
+    if total is None:
+        return None
+    return math.ceil(total / limit) if limit > 0 else 0
@@ -4,27 +4,36 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
-from app.auth import create_access_token
-from app.dependencies import get_db
+from app.auth import create_access_token, password_hasher, user_claims
+from app.db.database import Database
+from app.dependencies import get_database
 from app.schemas import Token
+from app.serialization import TimedRoute
 from app.services import user as user_service
 
-router = APIRouter(tags=["auth"])
+router = APIRouter(tags=["auth"], route_class=TimedRoute)
 
 
 @router.post("/token", response_model=Token)
-def login(
+async def login(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_database),
 ):
     """Authenticate user and return access token."""
-    user = user_service.authenticate_user(db, form_data.username, form_data.password)
-    if not user:
+    # Queue for a bcrypt worker before touching the database, so a login
+    # burst waits here instead of in the connection pool.
+    async with password_hasher.reserve() as hasher:
+        user = await db.run(user_service.get_user_by_email, form_data.username)
+        claims = user_claims(user) if user else None
+        hashed_password = user.hashed_password if user else None
+        # Return the connection to the pool while bcrypt runs.
+        await db.run(Session.rollback)
+        valid = user is not None and await hasher.verify(form_data.password, hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_access_token(data=claims)
     return {"access_token": access_token, "token_type": "bearer"}
-
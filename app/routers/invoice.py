@@ -1,106 +1,225 @@
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 
-from app.db.models import Invoice, User
-from app.dependencies import get_db, get_current_active_user
-from app.schemas import InvoiceCreate, InvoiceUpdate, InvoiceResponse, PaginatedResponse
+from app.auth import Principal
+from app.db.database import Database, RowStream
+from app.dependencies import get_database, get_read_database, get_read_stream, get_current_active_user
+from app.etag import not_modified, updated_at_etag
+from app.export import export_response
+from app.pagination import PageCount, PageLimit, build_paginated_json
+from app.schemas import (
+    BulkInvoiceResponse,
+    BulkInvoiceResult,
+    BulkMode,
+    CountMode,
+    ExportFormat,
+    InvoiceCreate,
+    InvoiceResponse,
+    InvoiceUpdate,
+    PaginatedResponse,
+)
+from app.serialization import TimedRoute, loads, response_fields
 from app.services import invoice as invoice_service
-from app.services import student as student_service
+from app.validators.invoice import BulkInvoiceError
 
 router = APIRouter(
     prefix="/invoice",
     tags=["invoice"],
+    route_class=TimedRoute,
 )
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+MAX_BULK_INVOICES = 50_000
+
+BULK_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        media_type: {"schema": {"type": "array", "items": {"$ref": "#/components/schemas/InvoiceCreate"}}}
+        for media_type in ("application/json", NDJSON_MEDIA_TYPE)
+    },
+}
+
+
+def parse_invoice_row(row: object) -> InvoiceCreate | str:
+    """Validate one bulk row, returning the error message if it is invalid."""
+    try:
+        if isinstance(row, bytes):
+            return InvoiceCreate.model_validate_json(row)
+        return InvoiceCreate.model_validate(row)
+    except ValidationError as exc:
+        return "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}"
+            for error in exc.errors()
+        )
+
+
+def too_many_invoices() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"At most {MAX_BULK_INVOICES} invoices per request")
+
+
+async def read_bulk_rows(request: Request) -> list[InvoiceCreate | str]:
+    """
+    Read a JSON array, or one JSON object per line for NDJSON, from the body.
+
+    Raises 413 as soon as the body holds more than MAX_BULK_INVOICES rows,
+    before validating any of them; an NDJSON stream is not read further.
+    """
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        lines = []
+        buffer = b""
+        async for chunk in request.stream():
+            *complete, buffer = (buffer + chunk).split(b"\n")
+            lines.extend(line for line in complete if line.strip())
+            if len(lines) > MAX_BULK_INVOICES:
+                raise too_many_invoices()
+        if buffer.strip():
+            lines.append(buffer)
+        if len(lines) > MAX_BULK_INVOICES:
+            raise too_many_invoices()
+        return [parse_invoice_row(line) for line in lines]
+
+    try:
+        body = loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body is not valid JSON")
+    if not isinstance(body, list):
+        raise HTTPException(status_code=400, detail="Request body must be a list of invoices")
+    if len(body) > MAX_BULK_INVOICES:
+        raise too_many_invoices()
+    return [parse_invoice_row(row) for row in body]
+
 
 @router.get("/", response_model=PaginatedResponse[InvoiceResponse])
-def list_invoices(
-    limit: int = 100,
+async def list_invoices(
+    limit: PageLimit = 100,
     offset: int = 0,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    cursor: str | None = None,
+    count: PageCount = CountMode.EXACT,
+    db: Database = Depends(get_read_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """Returns a paginated list of invoices."""
     if current_user.is_admin:
-        items, total = invoice_service.get_invoices_with_count(db, offset=offset, limit=limit)
+        items, total = await db.run(
+            invoice_service.get_invoices_with_count,
+            offset=offset, limit=limit + 1, cursor=cursor, count=count,
+        )
     else:
-        items, total = invoice_service.get_invoices_by_school_with_count(
-            db, current_user.school_id, offset=offset, limit=limit
+        items, total = await db.run(
+            invoice_service.get_invoices_by_school_with_count,
+            current_user.school_id,
+            offset=offset, limit=limit + 1, cursor=cursor, count=count,
         )
-    pages = (total + limit - 1) // limit if limit > 0 else 0
-    return PaginatedResponse(items=items, total=total, limit=limit, offset=offset, pages=pages)
+    return build_paginated_json(items, response_fields(InvoiceResponse), total, limit, offset)
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_invoices(
+    export_format: ExportFormat = Query(ExportFormat.CSV, alias="format"),
+    stream: RowStream = Depends(get_read_stream),
+    current_user: Principal = Depends(get_current_active_user),
+):
+    """Streams every invoice visible to the user as CSV or NDJSON."""
+    school_id = None if current_user.is_admin else current_user.school_id
+    statement = invoice_service.get_invoice_export_statement(school_id)
+    return export_response(stream, statement, export_format, "invoices")
 
 
 @router.get("/{invoice_id}", response_model=InvoiceResponse)
-def get_invoice(
+async def get_invoice(
     invoice_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    request: Request,
+    response: Response,
+    db: Database = Depends(get_read_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
-    """Returns the invoice details."""
-    invoice = invoice_service.get_invoice_by_id_for_user(db, invoice_id, current_user)
+    """Returns the invoice details, or 304 if the client's ETag is current."""
+    invoice = await db.run(invoice_service.get_invoice_by_id_for_user, invoice_id, current_user)
     if invoice is None:
         raise HTTPException(status_code=404, detail="Invoice not found")
+    cached = not_modified(request, response, updated_at_etag("invoice", invoice.id, invoice.updated_at))
+    if cached is not None:
+        return cached
     return invoice
 
 
 @router.post("/", response_model=InvoiceResponse, status_code=201)
-def create_invoice(
+async def create_invoice(
     invoice_data: InvoiceCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: Database = Depends(get_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """Creates a new invoice."""
-    student = student_service.get_student_by_id_for_user(db, invoice_data.student_id, current_user)
-    if student is None:
+    invoice = await db.run(invoice_service.create_invoice, invoice_data, current_user)
+    if invoice is None:
         raise HTTPException(status_code=404, detail="Student not found")
+    return invoice
+
+
+@router.post(
+    "/bulk",
+    response_model=BulkInvoiceResponse,
+    status_code=201,
+    openapi_extra={"requestBody": BULK_REQUEST_BODY},
+)
+async def bulk_create_invoices(
+    request: Request,
+    mode: BulkMode = BulkMode.ATOMIC,
+    db: Database = Depends(get_database),
+    current_user: Principal = Depends(get_current_active_user),
+):
+    """
+    Creates many invoices from a JSON array or an NDJSON stream.
 
-    now = datetime.now()
-    invoice = Invoice(
-        invoice_number=invoice_data.invoice_number,
-        amount_in_cents=invoice_data.amount_in_cents,
-        currency=invoice_data.currency,
-        status=invoice_data.status.value,
-        issue_date=invoice_data.issue_date,
-        due_date=invoice_data.due_date,
-        description=invoice_data.description,
-        student_id=invoice_data.student_id,
-        created_at=now,
-        updated_at=now,
-    )
-    return invoice_service.create_invoice(db, invoice)
+    In `atomic` mode any invalid row fails the request with 422 and nothing is
+    created; in `best_effort` mode the valid rows are created. Either way the
+    results report the outcome of every row by its position in the input.
+    """
+    rows = await read_bulk_rows(request)
+
+    invalid = [
+        BulkInvoiceResult(index=index, error=row) for index, row in enumerate(rows) if isinstance(row, str)
+    ]
+    if invalid and mode == BulkMode.ATOMIC:
+        raise BulkInvoiceError([result.model_dump() for result in invalid])
+
+    positions = [index for index, row in enumerate(rows) if not isinstance(row, str)]
+    invoices = [rows[index] for index in positions]
+    results = []
+    if invoices:
+        results = await db.run(invoice_service.bulk_create_invoices, invoices, current_user, mode)
+    for result in results:
+        result.index = positions[result.index]
+
+    results = sorted(results + invalid, key=lambda result: result.index)
+    created = sum(1 for result in results if result.error is None)
+    return BulkInvoiceResponse(created=created, failed=len(results) - created, results=results)
 
 
 @router.put("/{invoice_id}", response_model=InvoiceResponse)
-def update_invoice(
+async def update_invoice(
     invoice_id: int,
     invoice_data: InvoiceUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: Database = Depends(get_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """Updates an existing invoice."""
-    invoice = invoice_service.get_invoice_by_id_for_user(db, invoice_id, current_user)
-    if invoice is None:
+    invoice = await db.run(invoice_service.update_invoice, invoice_id, invoice_data, current_user)
+    if invoice is not None:
+        return invoice
+    # Nothing was updated: either the invoice or the student it moves to is not visible.
+    if await db.run(invoice_service.get_invoice_by_id_for_user, invoice_id, current_user) is None:
         raise HTTPException(status_code=404, detail="Invoice not found")
-
-    if invoice_data.student_id is not None:
-        student = student_service.get_student_by_id_for_user(db, invoice_data.student_id, current_user)
-        if student is None:
-            raise HTTPException(status_code=404, detail="Student not found")
-
-    invoice.updated_at = datetime.now()
-    return invoice_service.update_invoice(db, invoice, invoice_data)
+    raise HTTPException(status_code=404, detail="Student not found")
 
 
 @router.delete("/{invoice_id}", status_code=204)
-def delete_invoice(
+async def delete_invoice(
     invoice_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: Database = Depends(get_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """Deletes an invoice."""
-    invoice = invoice_service.get_invoice_by_id_for_user(db, invoice_id, current_user)
-    if invoice is None:
+    if not await db.run(invoice_service.delete_invoice, invoice_id, current_user):
         raise HTTPException(status_code=404, detail="Invoice not found")
-    invoice_service.delete_invoice(db, invoice)
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+from app.http_metrics import record_threadpool_usage
+from app.metrics import multiprocess_enabled
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+
+def render_metrics() -> bytes:
+    """
+    The exposition of this process's metrics, or, in multiprocess mode, of
+    the samples every worker has written to PROMETHEUS_MULTIPROC_DIR.
+    """
+    if not multiprocess_enabled():
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+@router.get("", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    record_threadpool_usage()
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
@@ -1,116 +1,166 @@
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-
-from app.db.models import Payment, User
-from app.dependencies import get_db, get_current_active_user
-from app.schemas import PaymentCreate, PaymentUpdate, PaymentResponse, PaginatedResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+
+from app.auth import Principal
+from app.db.database import Database, RowStream
+from app.dependencies import get_database, get_read_database, get_read_stream, get_current_active_user
+from app.etag import not_modified, updated_at_etag
+from app.export import export_response
+from app.pagination import PageCount, PageLimit, build_paginated_json
+from app.schemas import (
+    AllocationStrategy,
+    CountMode,
+    ExportFormat,
+    PaginatedResponse,
+    PaymentAllocationResponse,
+    PaymentCreate,
+    PaymentResponse,
+    PaymentUpdate,
+)
+from app.serialization import TimedRoute, response_fields
 from app.services import payment as payment_service
+from app.services import payment_allocation as allocation_service
 from app.services import student as student_service
-from app.validators.payment import validate_payment_update, validate_payment_delete
+from app.validators.payment import validate_payment_update
 
 router = APIRouter(
     prefix="/payment",
     tags=["payment"],
+    route_class=TimedRoute,
 )
 
 
 @router.get("/", response_model=PaginatedResponse[PaymentResponse])
-def list_payments(
-    limit: int = 100,
+async def list_payments(
+    limit: PageLimit = 100,
     offset: int = 0,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    cursor: str | None = None,
+    count: PageCount = CountMode.EXACT,
+    db: Database = Depends(get_read_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """Returns a paginated list of payments."""
     if current_user.is_admin:
-        items, total = payment_service.get_payments_with_count(db, offset=offset, limit=limit)
+        items, total = await db.run(
+            payment_service.get_payments_with_count,
+            offset=offset, limit=limit + 1, cursor=cursor, count=count,
+        )
     else:
-        items, total = payment_service.get_payments_by_school_with_count(
-            db, current_user.school_id, offset=offset, limit=limit
+        items, total = await db.run(
+            payment_service.get_payments_by_school_with_count,
+            current_user.school_id,
+            offset=offset, limit=limit + 1, cursor=cursor, count=count,
         )
-    pages = (total + limit - 1) // limit if limit > 0 else 0
-    return PaginatedResponse(items=items, total=total, limit=limit, offset=offset, pages=pages)
+    return build_paginated_json(items, response_fields(PaymentResponse), total, limit, offset)
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_payments(
+    export_format: ExportFormat = Query(ExportFormat.CSV, alias="format"),
+    stream: RowStream = Depends(get_read_stream),
+    current_user: Principal = Depends(get_current_active_user),
+):
+    """Streams every payment visible to the user as CSV or NDJSON."""
+    school_id = None if current_user.is_admin else current_user.school_id
+    statement = payment_service.get_payment_export_statement(school_id)
+    return export_response(stream, statement, export_format, "payments")
 
 
 @router.get("/{payment_id}", response_model=PaymentResponse)
-def get_payment(
+async def get_payment(
     payment_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    request: Request,
+    response: Response,
+    db: Database = Depends(get_read_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
-    """Returns the payment details."""
-    payment = payment_service.get_payment_by_id_for_user(db, payment_id, current_user)
+    """Returns the payment details, or 304 if the client's ETag is current."""
+    payment = await db.run(payment_service.get_payment_by_id_for_user, payment_id, current_user)
     if payment is None:
         raise HTTPException(status_code=404, detail="Payment not found")
+    cached = not_modified(request, response, updated_at_etag("payment", payment.id, payment.updated_at))
+    if cached is not None:
+        return cached
     return payment
 
 
 @router.post("/", response_model=PaymentResponse, status_code=201)
-def create_payment(
+async def create_payment(
     payment_data: PaymentCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: Database = Depends(get_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """Creates a new payment."""
-    student = student_service.get_student_by_id_for_user(db, payment_data.student_id, current_user)
-    if student is None:
+    payment = await db.run(payment_service.create_payment, payment_data, current_user)
+    if payment is None:
         raise HTTPException(status_code=404, detail="Student not found")
+    return payment
 
-    now = datetime.now()
-    payment = Payment(
-        amount_in_cents=payment_data.amount_in_cents,
-        currency=payment_data.currency,
-        status=payment_data.status.value,
-        payment_method=payment_data.payment_method.value,
-        student_id=payment_data.student_id,
-        created_at=now,
-        updated_at=now,
-    )
-    return payment_service.create_payment(db, payment)
+
+@router.post(
+    "/{payment_id}/auto-allocate",
+    response_model=list[PaymentAllocationResponse],
+    status_code=201,
+)
+async def auto_allocate_payment(
+    payment_id: int,
+    strategy: AllocationStrategy = AllocationStrategy.FIFO,
+    db: Database = Depends(get_database),
+    current_user: Principal = Depends(get_current_active_user),
+):
+    """
+    Allocates the payment's unallocated balance to the student's open invoices.
+
+    `fifo` pays the invoices due earliest first, `largest_first` the largest
+    outstanding amounts first. Returns the allocations created.
+    """
+    payment = await db.run(payment_service.get_payment_by_id_for_user, payment_id, current_user)
+    if payment is None:
+        raise HTTPException(status_code=404, detail="Payment not found")
+    return await db.run(allocation_service.auto_allocate_payment, payment, strategy)
 
 
 @router.put("/{payment_id}", response_model=PaymentResponse)
-def update_payment(
+async def update_payment(
     payment_id: int,
     payment_data: PaymentUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: Database = Depends(get_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """Updates an existing payment."""
-    payment = payment_service.get_payment_by_id_for_user(db, payment_id, current_user)
+    updated = await db.run(payment_service.update_payment, payment_id, payment_data, current_user)
+    if updated is not None:
+        return updated
+
+    # Nothing was updated; find out which check failed.
+    payment = await db.run(payment_service.get_payment_by_id_for_user, payment_id, current_user)
     if payment is None:
         raise HTTPException(status_code=404, detail="Payment not found")
 
     if payment_data.student_id is not None:
-        student = student_service.get_student_by_id_for_user(db, payment_data.student_id, current_user)
+        student = await db.run(
+            student_service.get_student_by_id_for_user, payment_data.student_id, current_user
+        )
         if student is None:
             raise HTTPException(status_code=404, detail="Student not found")
 
     # Validate payment update rules (cannot modify allocated payments, etc.)
-    validate_payment_update(
-        db,
+    await db.run(
+        validate_payment_update,
         payment,
         new_status=payment_data.status.value if payment_data.status else None,
         new_amount=payment_data.amount_in_cents,
     )
-
-    payment.updated_at = datetime.now()
-    return payment_service.update_payment(db, payment, payment_data)
+    # Every check passes now, so the payment or its allocations changed in between.
+    raise HTTPException(status_code=409, detail="Payment changed during the update, retry")
 
 
 @router.delete("/{payment_id}", status_code=204)
-def delete_payment(
+async def delete_payment(
     payment_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: Database = Depends(get_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
-    """Deletes a payment."""
-    payment = payment_service.get_payment_by_id_for_user(db, payment_id, current_user)
-    if payment is None:
+    """Deletes a payment; payments with allocations are rejected with 400."""
+    if not await db.run(payment_service.delete_payment, payment_id, current_user):
         raise HTTPException(status_code=404, detail="Payment not found")
-
-    # Validate payment can be deleted (no allocations)
-    validate_payment_delete(db, payment)
-
-    payment_service.delete_payment(db, payment)
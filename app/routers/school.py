@@ -1,98 +1,127 @@
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 
-from app.db.models import School, User
-from app.dependencies import get_db, get_current_active_user, require_admin
-from app.schemas import SchoolCreate, SchoolUpdate, SchoolResponse, PaginatedResponse, BalanceResponse
+from app.auth import Principal
+from app.cache import balance_cache
+from app.db.database import Database
+from app.dependencies import (
+    get_current_active_user,
+    get_database,
+    get_detached_read_database,
+    get_read_database,
+    require_admin,
+)
+from app.etag import balance_etag, etag_headers, not_modified
+from app.pagination import PageCount, PageLimit, build_paginated_json
+from app.schemas import (
+    SchoolCreate,
+    SchoolUpdate,
+    SchoolResponse,
+    PaginatedResponse,
+    CountMode,
+    BalanceResponse,
+)
+from app.serialization import TimedRoute, json_response, response_fields
 from app.services import school as school_service
 
 router = APIRouter(
     prefix="/school",
     tags=["school"],
+    route_class=TimedRoute,
 )
 
 
 @router.get("/", response_model=PaginatedResponse[SchoolResponse])
-def list_schools(
-    limit: int = 100,
+async def list_schools(
+    limit: PageLimit = 100,
     offset: int = 0,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    cursor: str | None = None,
+    count: PageCount = CountMode.EXACT,
+    db: Database = Depends(get_read_database),
+    current_user: Principal = Depends(require_admin),
 ):
     """Returns a paginated list of schools (admin only)."""
-    items, total = school_service.get_schools_with_count(db, offset=offset, limit=limit)
-    pages = (total + limit - 1) // limit if limit > 0 else 0
-    return PaginatedResponse(items=items, total=total, limit=limit, offset=offset, pages=pages)
+    items, total = await db.run(
+        school_service.get_schools_with_count,
+        offset=offset, limit=limit + 1, cursor=cursor, count=count,
+    )
+    return build_paginated_json(items, response_fields(SchoolResponse), total, limit, offset)
 
 
 @router.get("/{school_id}", response_model=SchoolResponse)
-def get_school(
+async def get_school(
     school_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: Database = Depends(get_read_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """Returns the school details."""
-    school = school_service.get_school_by_id_for_user(db, school_id, current_user)
+    school = await db.run(school_service.get_school_by_id_for_user, school_id, current_user)
     if school is None:
         raise HTTPException(status_code=404, detail="School not found")
     return school
 
 
 @router.get("/{school_id}/balance", response_model=BalanceResponse)
-def get_school_balance(
+async def get_school_balance(
     school_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    request: Request,
+    response: Response,
+    db: Database = Depends(get_read_database),
+    detached_db: Database = Depends(get_detached_read_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
-    """Returns the balance summary for a school."""
-    school = school_service.get_school_by_id_for_user(db, school_id, current_user)
-    if school is None:
+    """
+    Returns the balance summary for a school, or 304 if the client's ETag is current.
+
+    The body comes from the balance cache; it is computed on a session of its
+    own so concurrent requests for the school can share the computation.
+    """
+    version = await db.run(school_service.get_school_balance_version, school_id, current_user)
+    if version is None:
         raise HTTPException(status_code=404, detail="School not found")
-    return school_service.get_school_balance(db, school_id)
+    cached = not_modified(request, response, balance_etag("school", school_id, version))
+    if cached is not None:
+        return cached
+
+    async def compute() -> tuple[int, bytes]:
+        snapshot = await detached_db.run(school_service.get_versioned_school_balance, school_id)
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail="School not found")
+        return snapshot
+
+    result = await balance_cache.get_or_compute(f"school:{school_id}", version, compute)
+    return json_response(result.body, etag_headers(balance_etag("school", school_id, result.version)))
 
 
 @router.post("/", response_model=SchoolResponse, status_code=201)
-def create_school(
+async def create_school(
     school_data: SchoolCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    db: Database = Depends(get_database),
+    current_user: Principal = Depends(require_admin),
 ):
     """Creates a new school (admin only)."""
-    now = datetime.now()
-    school = School(
-        name=school_data.name,
-        country=school_data.country,
-        tax_id=school_data.tax_id,
-        created_at=now,
-        updated_at=now,
-    )
-    return school_service.create_school(db, school)
+    return await db.run(school_service.create_school, school_data)
 
 
 @router.put("/{school_id}", response_model=SchoolResponse)
-def update_school(
+async def update_school(
     school_id: int,
     school_data: SchoolUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    db: Database = Depends(get_database),
+    current_user: Principal = Depends(require_admin),
 ):
     """Updates an existing school (admin only)."""
-    school = school_service.get_school_by_id(db, school_id)
+    school = await db.run(school_service.update_school, school_id, school_data)
     if school is None:
         raise HTTPException(status_code=404, detail="School not found")
-    school.updated_at = datetime.now()
-    return school_service.update_school(db, school, school_data)
+    return school
 
 
 @router.delete("/{school_id}", status_code=204)
-def delete_school(
+async def delete_school(
     school_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    db: Database = Depends(get_database),
+    current_user: Principal = Depends(require_admin),
 ):
     """Deletes a school (admin only)."""
-    school = school_service.get_school_by_id(db, school_id)
-    if school is None:
+    if not await db.run(school_service.delete_school, school_id):
         raise HTTPException(status_code=404, detail="School not found")
-    school_service.delete_school(db, school)
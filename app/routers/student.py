@@ -1,115 +1,134 @@
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-
-from app.db.models import Student, User
-from app.dependencies import get_db, get_current_active_user
-from app.schemas import StudentCreate, StudentUpdate, StudentResponse, PaginatedResponse, BalanceResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+
+from app.auth import Principal
+from app.cache import balance_cache
+from app.db.database import Database
+from app.dependencies import get_database, get_read_database, get_detached_read_database, get_current_active_user
+from app.etag import balance_etag, etag_headers, not_modified
+from app.pagination import PageCount, PageLimit, build_paginated_json
+from app.schemas import (
+    StudentCreate,
+    StudentUpdate,
+    StudentResponse,
+    PaginatedResponse,
+    CountMode,
+    BalanceResponse,
+)
+from app.serialization import TimedRoute, json_response, response_fields
 from app.services import student as student_service
-from app.services import school as school_service
 
 router = APIRouter(
     prefix="/student",
     tags=["student"],
+    route_class=TimedRoute,
 )
 
 
 @router.get("/", response_model=PaginatedResponse[StudentResponse])
-def list_students(
-    limit: int = 100,
+async def list_students(
+    limit: PageLimit = 100,
     offset: int = 0,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    cursor: str | None = None,
+    count: PageCount = CountMode.EXACT,
+    db: Database = Depends(get_read_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """Returns a paginated list of students."""
     if current_user.is_admin:
-        items, total = student_service.get_students_with_count(db, offset=offset, limit=limit)
+        items, total = await db.run(
+            student_service.get_students_with_count,
+            offset=offset, limit=limit + 1, cursor=cursor, count=count,
+        )
     else:
-        items, total = student_service.get_students_by_school_with_count(
-            db, current_user.school_id, offset=offset, limit=limit
+        items, total = await db.run(
+            student_service.get_students_by_school_with_count,
+            current_user.school_id,
+            offset=offset, limit=limit + 1, cursor=cursor, count=count,
         )
-    pages = (total + limit - 1) // limit if limit > 0 else 0
-    return PaginatedResponse(items=items, total=total, limit=limit, offset=offset, pages=pages)
+    return build_paginated_json(items, response_fields(StudentResponse), total, limit, offset)
 
 
 @router.get("/{student_id}", response_model=StudentResponse)
-def get_student(
+async def get_student(
     student_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: Database = Depends(get_read_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """Returns the student details."""
-    student = student_service.get_student_by_id_for_user(db, student_id, current_user)
+    student = await db.run(student_service.get_student_by_id_for_user, student_id, current_user)
     if student is None:
         raise HTTPException(status_code=404, detail="Student not found")
     return student
 
 
 @router.get("/{student_id}/balance", response_model=BalanceResponse)
-def get_student_balance(
+async def get_student_balance(
     student_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    request: Request,
+    response: Response,
+    db: Database = Depends(get_read_database),
+    detached_db: Database = Depends(get_detached_read_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
-    """Returns the balance summary for a student."""
-    student = student_service.get_student_by_id_for_user(db, student_id, current_user)
-    if student is None:
+    """
+    Returns the balance summary for a student, or 304 if the client's ETag is current.
+
+    The body comes from the balance cache; it is computed on a session of its
+    own so concurrent requests for the student can share the computation.
+    """
+    version = await db.run(student_service.get_student_balance_version, student_id, current_user)
+    if version is None:
         raise HTTPException(status_code=404, detail="Student not found")
-    return student_service.get_student_balance(db, student_id)
+    cached = not_modified(request, response, balance_etag("student", student_id, version))
+    if cached is not None:
+        return cached
+
+    async def compute() -> tuple[int, bytes]:
+        snapshot = await detached_db.run(student_service.get_versioned_student_balance, student_id)
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail="Student not found")
+        return snapshot
+
+    result = await balance_cache.get_or_compute(f"student:{student_id}", version, compute)
+    return json_response(result.body, etag_headers(balance_etag("student", student_id, result.version)))
 
 
 @router.post("/", response_model=StudentResponse, status_code=201)
-def create_student(
+async def create_student(
     student_data: StudentCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: Database = Depends(get_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """Creates a new student."""
-    school = school_service.get_school_by_id_for_user(db, student_data.school_id, current_user)
-    if school is None:
+    student = await db.run(student_service.create_student, student_data, current_user)
+    if student is None:
         raise HTTPException(status_code=404, detail="School not found")
-
-    now = datetime.now()
-    student = Student(
-        identifier=student_data.identifier,
-        name=student_data.name,
-        email=student_data.email,
-        school_id=student_data.school_id,
-        created_at=now,
-        updated_at=now,
-    )
-    return student_service.create_student(db, student)
+    return student
 
 
 @router.put("/{student_id}", response_model=StudentResponse)
-def update_student(
+async def update_student(
     student_id: int,
     student_data: StudentUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: Database = Depends(get_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """Updates an existing student."""
-    student = student_service.get_student_by_id_for_user(db, student_id, current_user)
-    if student is None:
+    student = await db.run(student_service.update_student, student_id, student_data, current_user)
+    if student is not None:
+        return student
+    # Nothing was updated: either the student or the school it moves to is not visible.
+    if await db.run(student_service.get_student_by_id_for_user, student_id, current_user) is None:
         raise HTTPException(status_code=404, detail="Student not found")
-
-    if student_data.school_id is not None:
-        school = school_service.get_school_by_id_for_user(db, student_data.school_id, current_user)
-        if school is None:
-            raise HTTPException(status_code=404, detail="School not found")
-
-    student.updated_at = datetime.now()
-    return student_service.update_student(db, student, student_data)
+    raise HTTPException(status_code=404, detail="School not found")
 
 
 @router.delete("/{student_id}", status_code=204)
-def delete_student(
+async def delete_student(
     student_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: Database = Depends(get_database),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """Deletes a student."""
-    student = student_service.get_student_by_id_for_user(db, student_id, current_user)
-    if student is None:
+    if not await db.run(student_service.delete_student, student_id, current_user):
         raise HTTPException(status_code=404, detail="Student not found")
-    student_service.delete_student(db, student)
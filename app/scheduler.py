@@ -0,0 +1,57 @@
+"""
+Background jobs started from the application lifespan.
+
+Every worker process runs the loop; the jobs themselves take a Postgres
+advisory lock so only one of them does the work at a time.
+"""
+
+import asyncio
+import time
+
+from app.config import settings
+from app.db.database import AsyncDatabase, AsyncSessionLocal, SessionLocal, SyncDatabase
+from app.logging_config import get_logger
+from app.metrics import OVERDUE_SWEEP_DURATION, OVERDUE_SWEEP_INVOICES, OVERDUE_SWEEP_RUNS
+from app.services import invoice as invoice_service
+
+logger = get_logger(__name__)
+
+
+async def sweep_overdue_invoices() -> int | None:
+    """Run one overdue sweep through the configured stack and record its metrics."""
+    start = time.perf_counter()
+    try:
+        if settings.db_async:
+            async with AsyncSessionLocal() as session:
+                marked = await AsyncDatabase(session).run(
+                    invoice_service.mark_overdue_invoices, settings.overdue_sweep_batch_size
+                )
+        else:
+            with SessionLocal() as db:
+                marked = await SyncDatabase(db).run(
+                    invoice_service.mark_overdue_invoices, settings.overdue_sweep_batch_size
+                )
+    except Exception:
+        OVERDUE_SWEEP_RUNS.labels("failed").inc()
+        raise
+    finally:
+        OVERDUE_SWEEP_DURATION.observe(time.perf_counter() - start)
+
+    if marked is None:
+        OVERDUE_SWEEP_RUNS.labels("skipped").inc()
+    else:
+        OVERDUE_SWEEP_RUNS.labels("completed").inc()
+        OVERDUE_SWEEP_INVOICES.inc(marked)
+        if marked:
+            logger.info("Marked %d invoices overdue", marked)
+    return marked
+
+
+async def run_overdue_sweeper(interval_seconds: float) -> None:
+    """Sweep every `interval_seconds` until cancelled; a failed run is logged and retried."""
+    while True:
+        try:
+            await sweep_overdue_invoices()
+        except Exception:
+            logger.exception("Overdue sweep failed")
+        await asyncio.sleep(interval_seconds)
@@ -31,15 +31,38 @@ class PaymentMethod(str, Enum):
     CARD = "card"
     BANK_TRANSFER = "bank_transfer"
 
+
+class CountMode(str, Enum):
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    NONE = "none"
+
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+class AllocationStrategy(str, Enum):
+    FIFO = "fifo"
+    LARGEST_FIRST = "largest_first"
+
+
+class BulkMode(str, Enum):
+    ATOMIC = "atomic"
+    BEST_EFFORT = "best_effort"
+
 T = TypeVar("T")
 
 
 class PaginatedResponse(BaseModel, Generic[T]):
     items: list[T]
-    total: int
+    total: int | None
     limit: int
     offset: int
-    pages: int
+    pages: int | None
+    has_more: bool = False
+    next_cursor: str | None = None
 
 
 class SchoolCreate(BaseModel):
@@ -129,6 +152,19 @@ class InvoiceResponse(BaseModel):
     updated_at: datetime
 
 
+class BulkInvoiceResult(BaseModel):
+    index: int
+    invoice_number: str | None = None
+    id: int | None = None
+    error: str | None = None
+
+
+class BulkInvoiceResponse(BaseModel):
+    created: int
+    failed: int
+    results: list[BulkInvoiceResult]
+
+
 class PaymentCreate(BaseModel):
     amount_in_cents: int
     currency: str
@@ -0,0 +1,99 @@
+"""
+JSON responses built straight from projected rows.
+
+Read endpoints select exactly the columns of their response schema and get
+plain Row tuples back, which are encoded here without going through ORM
+instances (identity map, attribute instrumentation) or pydantic validation.
+The column list is taken from the schema, so the output has the same fields
+and formats the schema would produce.
+
+Every JSON body, these and the response_model ones FastAPI renders through
+FastJSONResponse, is encoded by orjson. Its output is byte for byte what
+JSONResponse's json.dumps produced for the values this API returns (naive
+datetimes in isoformat, str enums as their value, integer amounts), and the
+time spent encoding is recorded per route template by TimedRoute.
+"""
+
+import time
+from collections.abc import Callable, Coroutine, Iterable, Sequence
+from contextvars import ContextVar
+from typing import Any
+
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from sqlalchemy.orm import InstrumentedAttribute
+
+from app.metrics import RESPONSE_SERIALIZATION_SECONDS
+
+JSON_MEDIA_TYPE = "application/json"
+
+_current_route: ContextVar[str] = ContextVar("serialization_route", default="unknown")
+
+
+def response_fields(schema: type[BaseModel]) -> list[str]:
+    return list(schema.model_fields)
+
+
+def response_columns(model: type, schema: type[BaseModel]) -> list[InstrumentedAttribute]:
+    """The columns of `model` that `schema` is built from, in field order."""
+    return [getattr(model, field) for field in schema.model_fields]
+
+
+def current_route() -> str:
+    """The template of the TimedRoute serving the current request, or "unknown"."""
+    return _current_route.get()
+
+
+def dumps(content: Any) -> bytes:
+    start = time.perf_counter()
+    body = orjson.dumps(content)
+    RESPONSE_SERIALIZATION_SECONDS.labels(_current_route.get()).observe(time.perf_counter() - start)
+    return body
+
+
+def loads(body: bytes | str) -> Any:
+    """Decode a JSON document with orjson; invalid JSON raises a ValueError."""
+    return orjson.loads(body)
+
+
+def row_dicts(rows: Iterable[Sequence], fields: list[str]) -> list[dict[str, Any]]:
+    """
+    Map each row's leading values to `fields`; trailing columns, such as a
+    window count, are ignored.
+    """
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def json_response(body: bytes, headers: dict[str, str] | None = None) -> Response:
+    """A response for an already encoded JSON body."""
+    return Response(body, media_type=JSON_MEDIA_TYPE, headers=headers)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps; the application's default response class."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class TimedRoute(APIRoute):
+    """
+    An APIRoute that labels the serialization time of its responses, and the
+    slow statements it runs, with its path template.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+        route = self.path_format
+
+        async def timed_handler(request: Request) -> Response:
+            token = _current_route.set(route)
+            try:
+                return await handler(request)
+            finally:
+                _current_route.reset(token)
+
+        return timed_handler
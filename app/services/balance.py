@@ -0,0 +1,170 @@
+"""
+Balance summaries computed in a single statement.
+
+The school and student balance endpoints need the invoiced/paid totals, the
+currency and two top-10 lists. Instead of issuing one query per piece, the
+scoped invoices are put in a CTE and every piece is a scalar subquery of one
+SELECT, with the lists aggregated to JSON. The paid total is read from the
+denormalized invoice.paid_cents instead of joining the allocations.
+Timestamps in the lists are formatted by Postgres the way isoformat() does,
+so get_balance_json can re-encode the lists with dumps into the exact body
+BalanceResponse renders to, without validating them into response models.
+
+Every write that changes what a balance shows bumps the balance_version of
+the students and schools involved, which the endpoints expose as ETags.
+"""
+
+from collections.abc import Iterable
+from itertools import chain
+
+from sqlalchemy import DateTime, Select, Text, case, cast, func, literal, literal_column, select, update
+from sqlalchemy.dialects.postgresql import JSON, aggregate_order_by
+from sqlalchemy.orm import Session
+
+from app.constants import UNPAID_INVOICE_STATUSES
+from app.db.models import School, Student
+from app.schemas import BalanceResponse, InvoiceResponse, PaymentResponse
+from app.serialization import dumps, loads
+
+BALANCE_LIST_LIMIT = 10
+ISO_SECONDS = 'YYYY-MM-DD"T"HH24:MI:SS'
+
+
+def _isoformat(column):
+    """A naive timestamp column as datetime.isoformat() renders it: microseconds only when non-zero."""
+    return case(
+        (func.date_trunc("second", column) == column, func.to_char(column, ISO_SECONDS)),
+        else_=func.to_char(column, ISO_SECONDS + ".US"),
+    )
+
+
+def _json_value(column):
+    return _isoformat(column) if isinstance(column.type, DateTime) else column
+
+
+def _json_rows(subquery, fields: list[str], order_by: list) -> Select:
+    """Aggregate the rows of `subquery` into a JSON array of objects keeping `order_by`."""
+    row = func.json_build_object(
+        *chain.from_iterable((literal(f), _json_value(subquery.c[f])) for f in fields)
+    )
+    return select(
+        func.coalesce(
+            func.json_agg(aggregate_order_by(row, *order_by)),
+            literal_column("'[]'::json"),
+            type_=JSON,
+        )
+    )
+
+
+def build_balance_statement(
+    scoped_invoices: Select, scoped_payments: Select, lists_as_text: bool = False
+) -> Select:
+    """
+    Build the single balance statement for the given invoice and payment scopes.
+
+    `scoped_invoices` and `scoped_payments` must select full Invoice / Payment rows.
+    With `lists_as_text` the invoice and payment lists come back as JSON text
+    instead of being decoded by the driver.
+    """
+    invoices = scoped_invoices.cte("scoped_invoice")
+    payments = scoped_payments.subquery("scoped_payment")
+
+    total_invoiced = select(func.coalesce(func.sum(invoices.c.amount_in_cents), 0))
+    total_paid = select(func.coalesce(func.sum(invoices.c.paid_cents), 0))
+    currency = select(invoices.c.currency).limit(1)
+
+    unpaid = (
+        select(invoices)
+        .where(invoices.c.status.in_(UNPAID_INVOICE_STATUSES))
+        .order_by(invoices.c.amount_in_cents.desc(), invoices.c.due_date.asc())
+        .limit(BALANCE_LIST_LIMIT)
+        .subquery("unpaid_invoice")
+    )
+    recent = (
+        select(payments)
+        .order_by(payments.c.created_at.desc())
+        .limit(BALANCE_LIST_LIMIT)
+        .subquery("recent_payment")
+    )
+
+    invoice_list = _json_rows(
+        unpaid,
+        list(InvoiceResponse.model_fields),
+        [unpaid.c.amount_in_cents.desc(), unpaid.c.due_date.asc()],
+    ).scalar_subquery()
+    payment_list = _json_rows(
+        recent,
+        list(PaymentResponse.model_fields),
+        [recent.c.created_at.desc()],
+    ).scalar_subquery()
+    if lists_as_text:
+        invoice_list, payment_list = cast(invoice_list, Text), cast(payment_list, Text)
+
+    return select(
+        total_invoiced.scalar_subquery().label("total_invoiced"),
+        total_paid.scalar_subquery().label("total_paid"),
+        currency.scalar_subquery().label("currency"),
+        invoice_list.label("invoices"),
+        payment_list.label("payments"),
+    )
+
+
+def get_balance(db: Session, scoped_invoices: Select, scoped_payments: Select) -> BalanceResponse:
+    """Compute a balance summary in one round trip."""
+    row = db.execute(build_balance_statement(scoped_invoices, scoped_payments)).one()
+    total_invoiced = int(row.total_invoiced)
+    total_paid = int(row.total_paid)
+
+    return BalanceResponse(
+        total_invoiced_cents=total_invoiced,
+        total_paid_cents=total_paid,
+        total_pending_cents=total_invoiced - total_paid,
+        currency=row.currency,
+        invoices=[InvoiceResponse.model_validate(inv) for inv in row.invoices],
+        payments=[PaymentResponse.model_validate(pay) for pay in row.payments],
+    )
+
+
+def get_balance_json(db: Session, scoped_invoices: Select, scoped_payments: Select) -> bytes:
+    """get_balance rendered as a BalanceResponse JSON body."""
+    row = db.execute(build_balance_statement(scoped_invoices, scoped_payments, lists_as_text=True)).one()
+    total_invoiced = int(row.total_invoiced)
+    total_paid = int(row.total_paid)
+    # Postgres spaces its JSON differently, so the lists are decoded and encoded again.
+    return dumps({
+        "total_invoiced_cents": total_invoiced,
+        "total_paid_cents": total_paid,
+        "total_pending_cents": total_invoiced - total_paid,
+        "currency": row.currency,
+        "invoices": loads(row.invoices),
+        "payments": loads(row.payments),
+    })
+
+
+def bump_balance_versions(
+    db: Session, student_ids: Iterable[int], school_ids: Iterable[int] = ()
+) -> None:
+    """
+    Record that the balances of these students, of their schools and of
+    `school_ids` changed. Does not commit; call it last before committing,
+    since it holds the school rows locked until then.
+    """
+    student_ids = sorted(set(student_ids))
+    school_ids = set(school_ids)
+    if student_ids:
+        school_ids.update(
+            db.scalars(
+                update(Student)
+                .where(Student.id.in_(student_ids))
+                .values(balance_version=Student.balance_version + 1)
+                .returning(Student.school_id),
+                execution_options={"synchronize_session": False},
+            )
+        )
+    if school_ids:
+        db.execute(
+            update(School)
+            .where(School.id.in_(sorted(school_ids)))
+            .values(balance_version=School.balance_version + 1),
+            execution_options={"synchronize_session": False},
+        )
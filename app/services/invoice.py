@@ -1,20 +1,169 @@
+from datetime import datetime
+
+from sqlalchemy import Row, Select, delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
-from app.db.models import Invoice, Student, User
-from app.schemas import InvoiceUpdate
+from app.auth import Principal
+from app.db.models import Invoice, InvoiceStatus, Student
+from app.schemas import BulkInvoiceResult, BulkMode, InvoiceCreate, InvoiceResponse, InvoiceUpdate, CountMode
+from app.pagination import fetch_page
+from app.serialization import response_columns
+from app.services.balance import bump_balance_versions
+from app.services.student import student_visible_to
+from app.services.writes import insert_returning
+from app.validators.invoice import BulkInvoiceError, invoice_row_error
+
+INVOICE_COLUMNS = response_columns(Invoice, InvoiceResponse)
 
 
-def create_invoice(db: Session, invoice: Invoice) -> Invoice:
-    db.add(invoice)
+def create_invoice(db: Session, invoice_data: InvoiceCreate, user: Principal) -> Row | None:
+    """Insert the invoice in one statement; None if its student is not visible to the user."""
+    now = datetime.now()
+    values = {
+        **invoice_data.model_dump(),
+        "status": invoice_data.status.value,
+        "created_at": now,
+        "updated_at": now,
+    }
+    guard = student_visible_to(invoice_data.student_id, user)
+    invoice = db.execute(insert_returning(Invoice, values, INVOICE_COLUMNS, guard)).one_or_none()
+    if invoice is None:
+        return None
+    bump_balance_versions(db, [invoice.student_id])
     db.commit()
-    db.refresh(invoice)
     return invoice
 
 
+def bulk_create_invoices(
+    db: Session,
+    invoices: list[InvoiceCreate],
+    user: Principal,
+    mode: BulkMode = BulkMode.ATOMIC,
+) -> list[BulkInvoiceResult]:
+    """
+    Create a batch of invoices with one access query and multi-row INSERTs.
+
+    Rows are rejected when the student is not accessible to the user, the
+    invoice number repeats an earlier row or already exists, or a value does
+    not fit its column. In atomic mode any rejection rolls back the batch.
+    """
+    student_ids = {invoice.student_id for invoice in invoices}
+    query = db.query(Student.id).filter(Student.id.in_(student_ids))
+    if not user.is_admin:
+        query = query.filter(Student.school_id == user.school_id)
+    accessible = {student_id for (student_id,) in query}
+
+    now = datetime.now()
+    errors: list[str | None] = []
+    rows = []
+    batch_numbers = set()
+    for invoice in invoices:
+        row = {
+            **invoice.model_dump(),
+            "status": invoice.status.value,
+            "created_at": now,
+            "updated_at": now,
+        }
+        if invoice.student_id not in accessible:
+            error = "Student not found"
+        elif invoice.invoice_number in batch_numbers:
+            error = "Duplicate invoice number in batch"
+        else:
+            error = invoice_row_error(row)
+        if error is None:
+            batch_numbers.add(invoice.invoice_number)
+            rows.append(row)
+        errors.append(error)
+
+    if mode == BulkMode.ATOMIC and any(errors):
+        raise BulkInvoiceError(_failures(invoices, errors))
+
+    created = {}
+    if rows:
+        statement = (
+            insert(Invoice)
+            .on_conflict_do_nothing(index_elements=[Invoice.invoice_number])
+            .returning(Invoice.invoice_number, Invoice.id)
+        )
+        created = dict(db.execute(statement, rows).all())
+
+    if len(created) < len(rows):
+        errors = [
+            "Invoice number already exists"
+            if error is None and invoice.invoice_number not in created
+            else error
+            for invoice, error in zip(invoices, errors)
+        ]
+        if mode == BulkMode.ATOMIC:
+            db.rollback()
+            raise BulkInvoiceError(_failures(invoices, errors))
+    bump_balance_versions(db, {row["student_id"] for row in rows if row["invoice_number"] in created})
+    db.commit()
+    return [
+        BulkInvoiceResult(
+            index=index,
+            invoice_number=invoice.invoice_number,
+            id=None if error else created[invoice.invoice_number],
+            error=error,
+        )
+        for index, (invoice, error) in enumerate(zip(invoices, errors))
+    ]
+
+
+def _failures(invoices: list[InvoiceCreate], errors: list[str | None]) -> list[dict]:
+    return [
+        BulkInvoiceResult(index=index, invoice_number=invoice.invoice_number, error=error).model_dump()
+        for index, (invoice, error) in enumerate(zip(invoices, errors))
+        if error is not None
+    ]
+
+
+# Advisory lock key held by whichever worker is sweeping overdue invoices.
+OVERDUE_SWEEP_LOCK_ID = 0x6F766572  # "over"
+
+
+def mark_overdue_invoices(db: Session, batch_size: int = 1000) -> int | None:
+    """
+    Mark pending invoices past their due date as overdue, in chunks.
+
+    Each chunk is its own short transaction that updates at most `batch_size`
+    rows and skips rows other transactions have locked; skipped rows are
+    picked up by the next sweep. Each chunk also takes a transaction-level
+    advisory lock (safe behind PgBouncer), so only one worker sweeps at a time.
+    Returns the number of invoices marked, or None if another worker holds the lock.
+    """
+    now = datetime.now()
+    late = (
+        select(Invoice.id)
+        .where(Invoice.status == InvoiceStatus.PENDING.value, Invoice.due_date < now)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    marked = 0
+    while True:
+        if not db.execute(select(func.pg_try_advisory_xact_lock(OVERDUE_SWEEP_LOCK_ID))).scalar():
+            db.rollback()
+            return marked if marked else None
+        student_ids = db.scalars(
+            update(Invoice)
+            .where(Invoice.id.in_(late.scalar_subquery()))
+            .values(status=InvoiceStatus.OVERDUE.value, updated_at=now)
+            .returning(Invoice.student_id),
+            execution_options={"synchronize_session": False},
+        ).all()
+        bump_balance_versions(db, student_ids)
+        db.commit()
+        updated = len(student_ids)
+        marked += updated
+        if updated < batch_size:
+            return marked
+
+
 def get_invoice_by_id(db: Session, invoice_id: int) -> Invoice | None:
     return db.query(Invoice).filter(Invoice.id == invoice_id).first()
 
 
-def get_invoice_by_id_for_user(db: Session, invoice_id: int, user: User) -> Invoice | None:
+def get_invoice_by_id_for_user(db: Session, invoice_id: int, user: Principal) -> Invoice | None:
     """Get invoice by ID, filtered by user's school access."""
     query = db.query(Invoice).filter(Invoice.id == invoice_id)
     if not user.is_admin:
@@ -27,35 +176,87 @@ def get_invoices(db: Session, offset: int = 0, limit: int = 100) -> list[Invoice
 
 
 def get_invoices_with_count(
-    db: Session, offset: int = 0, limit: int = 100
-) -> tuple[list[Invoice], int]:
-    total = db.query(Invoice).count()
-    items = db.query(Invoice).offset(offset).limit(limit).all()
-    return items, total
+    db: Session,
+    offset: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count: CountMode = CountMode.EXACT,
+) -> tuple[list[Row], int | None]:
+    return fetch_page(db.query(*INVOICE_COLUMNS), Invoice, offset, limit, cursor, count)
 
 
 def get_invoices_by_school_with_count(
-    db: Session, school_id: int, offset: int = 0, limit: int = 100
-) -> tuple[list[Invoice], int]:
+    db: Session,
+    school_id: int,
+    offset: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count: CountMode = CountMode.EXACT,
+) -> tuple[list[Row], int | None]:
     query = (
-        db.query(Invoice)
+        db.query(*INVOICE_COLUMNS)
         .join(Student, Invoice.student_id == Student.id)
         .filter(Student.school_id == school_id)
     )
-    total = query.count()
-    items = query.offset(offset).limit(limit).all()
-    return items, total
+    return fetch_page(query, Invoice, offset, limit, cursor, count)
 
 
-def update_invoice(db: Session, invoice: Invoice, invoice_data: InvoiceUpdate) -> Invoice:
-    update_data = invoice_data.model_dump(exclude_unset=True, mode="json")
-    for field, value in update_data.items():
-        setattr(invoice, field, value)
+def get_invoice_export_statement(school_id: int | None = None) -> Select:
+    """The InvoiceResponse columns of every invoice, or of one school's, in id order."""
+    statement = select(*INVOICE_COLUMNS).order_by(Invoice.id)
+    if school_id is not None:
+        statement = (
+            statement
+            .join(Student, Invoice.student_id == Student.id)
+            .where(Student.school_id == school_id)
+        )
+    return statement
+
+
+def update_invoice(
+    db: Session, invoice_id: int, invoice_data: InvoiceUpdate, user: Principal
+) -> Row | None:
+    """
+    Apply `invoice_data` in one UPDATE ... RETURNING.
+
+    Returns None, without writing, if the invoice or the student it moves to
+    is missing or not visible to the user.
+    """
+    previous = Invoice.__table__.alias("previous_invoice")
+    # Python mode keeps the dates as datetimes, which asyncpg requires for timestamp columns.
+    values = invoice_data.model_dump(exclude_unset=True)
+    if invoice_data.status is not None:
+        values["status"] = invoice_data.status.value
+    statement = (
+        update(Invoice)
+        .where(Invoice.id == invoice_id, previous.c.id == Invoice.id)
+        .values(**values, updated_at=datetime.now())
+        .returning(*INVOICE_COLUMNS, previous.c.student_id.label("previous_student_id"))
+    )
+    if not user.is_admin:
+        statement = statement.where(
+            Invoice.student_id.in_(select(Student.id).where(Student.school_id == user.school_id))
+        )
+    if invoice_data.student_id is not None:
+        statement = statement.where(student_visible_to(invoice_data.student_id, user))
+    invoice = db.execute(statement, execution_options={"synchronize_session": False}).one_or_none()
+    if invoice is None:
+        return None
+    bump_balance_versions(db, {invoice.previous_student_id, invoice.student_id})
     db.commit()
-    db.refresh(invoice)
     return invoice
 
 
-def delete_invoice(db: Session, invoice: Invoice) -> None:
-    db.delete(invoice)
+def delete_invoice(db: Session, invoice_id: int, user: Principal) -> bool:
+    """Delete the invoice in one DELETE ... RETURNING; False if it is missing or not visible to the user."""
+    statement = delete(Invoice).where(Invoice.id == invoice_id).returning(Invoice.student_id)
+    if not user.is_admin:
+        statement = statement.where(
+            Invoice.student_id.in_(select(Student.id).where(Student.school_id == user.school_id))
+        )
+    student_id = db.scalar(statement, execution_options={"synchronize_session": False})
+    if student_id is None:
+        return False
+    bump_balance_versions(db, [student_id])
     db.commit()
+    return True
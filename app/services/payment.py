@@ -1,12 +1,36 @@
-from sqlalchemy.orm import Session
-from app.db.models import Payment, Student, User
-from app.schemas import PaymentUpdate
-
+from datetime import datetime
 
-def create_payment(db: Session, payment: Payment) -> Payment:
-    db.add(payment)
+from sqlalchemy import Row, Select, delete, select, update
+from sqlalchemy.orm import Session
+from app.auth import Principal
+from app.db.models import Payment, Student
+from app.schemas import PaymentCreate, PaymentResponse, PaymentUpdate, CountMode
+from app.pagination import fetch_page
+from app.serialization import response_columns
+from app.services.balance import bump_balance_versions
+from app.services.student import student_visible_to
+from app.services.writes import insert_returning
+from app.validators.payment import check_payment_delete, payment_has_allocations, payment_update_allowed
+
+PAYMENT_COLUMNS = response_columns(Payment, PaymentResponse)
+
+
+def create_payment(db: Session, payment_data: PaymentCreate, user: Principal) -> Row | None:
+    """Insert the payment in one statement; None if its student is not visible to the user."""
+    now = datetime.now()
+    values = {
+        **payment_data.model_dump(),
+        "status": payment_data.status.value,
+        "payment_method": payment_data.payment_method.value,
+        "created_at": now,
+        "updated_at": now,
+    }
+    guard = student_visible_to(payment_data.student_id, user)
+    payment = db.execute(insert_returning(Payment, values, PAYMENT_COLUMNS, guard)).one_or_none()
+    if payment is None:
+        return None
+    bump_balance_versions(db, [payment.student_id])
     db.commit()
-    db.refresh(payment)
     return payment
 
 
@@ -14,7 +38,7 @@ def get_payment_by_id(db: Session, payment_id: int) -> Payment | None:
     return db.query(Payment).filter(Payment.id == payment_id).first()
 
 
-def get_payment_by_id_for_user(db: Session, payment_id: int, user: User) -> Payment | None:
+def get_payment_by_id_for_user(db: Session, payment_id: int, user: Principal) -> Payment | None:
     """Get payment by ID, filtered by user's school access."""
     query = db.query(Payment).filter(Payment.id == payment_id)
     if not user.is_admin:
@@ -27,35 +51,108 @@ def get_payments(db: Session, offset: int = 0, limit: int = 100) -> list[Payment
 
 
 def get_payments_with_count(
-    db: Session, offset: int = 0, limit: int = 100
-) -> tuple[list[Payment], int]:
-    total = db.query(Payment).count()
-    items = db.query(Payment).offset(offset).limit(limit).all()
-    return items, total
+    db: Session,
+    offset: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count: CountMode = CountMode.EXACT,
+) -> tuple[list[Row], int | None]:
+    return fetch_page(db.query(*PAYMENT_COLUMNS), Payment, offset, limit, cursor, count)
 
 
 def get_payments_by_school_with_count(
-    db: Session, school_id: int, offset: int = 0, limit: int = 100
-) -> tuple[list[Payment], int]:
+    db: Session,
+    school_id: int,
+    offset: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count: CountMode = CountMode.EXACT,
+) -> tuple[list[Row], int | None]:
     query = (
-        db.query(Payment)
+        db.query(*PAYMENT_COLUMNS)
         .join(Student, Payment.student_id == Student.id)
         .filter(Student.school_id == school_id)
     )
-    total = query.count()
-    items = query.offset(offset).limit(limit).all()
-    return items, total
-
-
-def update_payment(db: Session, payment: Payment, payment_data: PaymentUpdate) -> Payment:
-    update_data = payment_data.model_dump(exclude_unset=True, mode="json")
-    for field, value in update_data.items():
-        setattr(payment, field, value)
+    return fetch_page(query, Payment, offset, limit, cursor, count)
+
+
+def get_payment_export_statement(school_id: int | None = None) -> Select:
+    """The PaymentResponse columns of every payment, or of one school's, in id order."""
+    statement = select(*PAYMENT_COLUMNS).order_by(Payment.id)
+    if school_id is not None:
+        statement = (
+            statement
+            .join(Student, Payment.student_id == Student.id)
+            .where(Student.school_id == school_id)
+        )
+    return statement
+
+
+def update_payment(
+    db: Session, payment_id: int, payment_data: PaymentUpdate, user: Principal
+) -> Row | None:
+    """
+    Apply `payment_data` in one UPDATE ... RETURNING.
+
+    Returns None, without writing, if the payment or the student it moves to
+    is missing or not visible to the user, or the update breaks a rule of
+    validate_payment_update.
+    """
+    previous = Payment.__table__.alias("previous_payment")
+    statement = (
+        update(Payment)
+        .where(Payment.id == payment_id, previous.c.id == Payment.id)
+        .where(*payment_update_allowed(
+            new_status=payment_data.status.value if payment_data.status else None,
+            new_amount=payment_data.amount_in_cents,
+        ))
+        .values(**payment_data.model_dump(exclude_unset=True, mode="json"), updated_at=datetime.now())
+        .returning(*PAYMENT_COLUMNS, previous.c.student_id.label("previous_student_id"))
+    )
+    if not user.is_admin:
+        statement = statement.where(
+            Payment.student_id.in_(select(Student.id).where(Student.school_id == user.school_id))
+        )
+    if payment_data.student_id is not None:
+        statement = statement.where(student_visible_to(payment_data.student_id, user))
+    payment = db.execute(statement, execution_options={"synchronize_session": False}).one_or_none()
+    if payment is None:
+        return None
+    bump_balance_versions(db, {payment.previous_student_id, payment.student_id})
     db.commit()
-    db.refresh(payment)
     return payment
 
 
-def delete_payment(db: Session, payment: Payment) -> None:
-    db.delete(payment)
+def delete_payment(db: Session, payment_id: int, user: Principal) -> bool:
+    """
+    Delete the payment in one statement, unless it has allocations.
+
+    The payment is looked up in a CTE that also records whether it has
+    allocations, and a DELETE in a second CTE removes it only if it has none,
+    so a single result tells the outcomes apart. Returns False if the payment
+    is missing or not visible to the user; raises PaymentValidationError,
+    without deleting, if it has allocations.
+    """
+    target = select(Payment.id, Payment.student_id, payment_has_allocations().label("has_allocations"))
+    target = target.where(Payment.id == payment_id)
+    if not user.is_admin:
+        target = target.where(
+            Payment.student_id.in_(select(Student.id).where(Student.school_id == user.school_id))
+        )
+    target = target.cte("target_payment")
+    deleted = (
+        delete(Payment)
+        .where(Payment.id.in_(select(target.c.id).where(~target.c.has_allocations)))
+        .returning(Payment.id)
+        .cte("deleted_payment")
+    )
+    statement = select(target.c.student_id, target.c.has_allocations).select_from(
+        target.outerjoin(deleted, deleted.c.id == target.c.id)
+    )
+    row = db.execute(statement).one_or_none()
+    if row is None:
+        return False
+    check_payment_delete(row.has_allocations)
+    bump_balance_versions(db, [row.student_id])
     db.commit()
+    return True
@@ -1,13 +1,23 @@
 from datetime import datetime
 
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.db.models import PaymentAllocation, Payment, Invoice, Student, PaymentStatus, InvoiceStatus, User
-from app.schemas import PaymentAllocationUpdate
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import Integer, Row, Select, case, column, func, insert, select, update, values
+from app.auth import Principal
+from app.db.models import PaymentAllocation, Payment, Invoice, Student, PaymentStatus, InvoiceStatus
+from app.schemas import AllocationStrategy, PaymentAllocationResponse, PaymentAllocationUpdate, CountMode
+from app.pagination import fetch_page
+from app.serialization import response_columns
+from app.services.balance import bump_balance_versions
+from app.validators.allocation import AllocationValidationError
+
+ALLOCATION_COLUMNS = response_columns(PaymentAllocation, PaymentAllocationResponse)
 
 
 def create_allocation(db: Session, allocation: PaymentAllocation) -> PaymentAllocation:
-    """Create allocation without updating invoice status. Use create_allocation_with_status_update instead."""
+    """
+    Create allocation without updating invoice status or paid_cents.
+    Use create_allocation_with_status_update instead.
+    """
     db.add(allocation)
     db.commit()
     db.refresh(allocation)
@@ -23,8 +33,11 @@ def create_allocation_with_status_update(
     """
     Create allocation and update invoice status in a single transaction.
     Rolls back both if either fails.
+    Raises AllocationValidationError if the payment does not have enough
+    unallocated balance once its row is locked.
     """
     try:
+        _reserve_payment_amount(db, payment.id, amount_in_cents)
         now = datetime.now()
         allocation = PaymentAllocation(
             payment_id=payment.id,
@@ -35,8 +48,8 @@ def create_allocation_with_status_update(
         db.add(allocation)
         db.flush()  # Get the ID without committing
 
-        # Update invoice status
-        _update_invoice_status_internal(db, invoice)
+        # Update invoice paid amount and status
+        _apply_paid_delta(db, invoice.id, payment.id, amount_in_cents)
 
         db.commit()
         db.refresh(allocation)
@@ -46,13 +59,113 @@ def create_allocation_with_status_update(
         raise
 
 
+def auto_allocate_payment(
+    db: Session,
+    payment: Payment,
+    strategy: AllocationStrategy = AllocationStrategy.FIFO,
+) -> list[PaymentAllocation]:
+    """
+    Spread the payment's unallocated balance over the student's open invoices
+    in a single transaction: one bulk INSERT of allocations and one set-based
+    UPDATE of the invoices' paid_cents and status.
+
+    Open invoices share the payment's currency, are neither draft nor
+    cancelled, and are not fully paid. FIFO pays the earliest due first;
+    largest_first pays the largest outstanding amount first.
+    Raises AllocationValidationError if the payment is not completed or has
+    nothing left to allocate.
+    """
+    try:
+        # Lock the payment first, like the single-allocation flows, and check
+        # the status read under that lock: `payment` may predate an update that failed it.
+        status, available = db.execute(
+            select(Payment.status, Payment.amount_in_cents - Payment.allocated_cents)
+            .where(Payment.id == payment.id)
+            .with_for_update()
+        ).one()
+        if status != PaymentStatus.COMPLETED.value:
+            raise AllocationValidationError(
+                f"Cannot allocate from payment with status '{status}'. "
+                "Payment must be completed.",
+                "payment_not_completed",
+            )
+        if available <= 0:
+            raise AllocationValidationError("Payment has no unallocated balance", "insufficient_payment_balance")
+
+        # Locked in id order so concurrent auto-allocations cannot deadlock.
+        outstanding = Invoice.amount_in_cents - Invoice.paid_cents
+        open_invoices = db.execute(
+            select(Invoice.id, Invoice.due_date, outstanding.label("outstanding"))
+            .where(
+                Invoice.student_id == payment.student_id,
+                Invoice.currency == payment.currency,
+                Invoice.status.notin_([InvoiceStatus.DRAFT.value, InvoiceStatus.CANCELLED.value]),
+                outstanding > 0,
+            )
+            .order_by(Invoice.id)
+            .with_for_update()
+        ).all()
+        if strategy == AllocationStrategy.LARGEST_FIRST:
+            open_invoices.sort(key=lambda invoice: (-invoice.outstanding, invoice.due_date, invoice.id))
+        else:
+            open_invoices.sort(key=lambda invoice: (invoice.due_date, invoice.id))
+
+        now = datetime.now()
+        rows = []
+        for invoice in open_invoices:
+            if available == 0:
+                break
+            amount_in_cents = min(available, invoice.outstanding)
+            available -= amount_in_cents
+            rows.append({
+                "payment_id": payment.id,
+                "invoice_id": invoice.id,
+                "amount_in_cents": amount_in_cents,
+                "created_at": now,
+            })
+        if not rows:
+            db.rollback()
+            return []
+
+        _reserve_payment_amount(db, payment.id, sum(row["amount_in_cents"] for row in rows))
+        allocations = db.scalars(insert(PaymentAllocation).returning(PaymentAllocation), rows).all()
+
+        deltas = values(
+            column("invoice_id", Integer), column("amount_in_cents", Integer), name="deltas"
+        ).data([(row["invoice_id"], row["amount_in_cents"]) for row in rows])
+        paid_cents = Invoice.paid_cents + deltas.c.amount_in_cents
+        db.execute(
+            update(Invoice)
+            .where(Invoice.id == deltas.c.invoice_id)
+            .values(paid_cents=paid_cents, status=_paid_status(paid_cents), updated_at=datetime.now()),
+            execution_options={"synchronize_session": False},
+        )
+        bump_balance_versions(db, [payment.student_id])
+
+        allocation_ids = [allocation.id for allocation in allocations]
+        db.commit()
+        # Reload the expired allocations in one query instead of one refresh each.
+        db.scalars(select(PaymentAllocation).where(PaymentAllocation.id.in_(allocation_ids))).all()
+        return allocations
+    except Exception:
+        db.rollback()
+        raise
+
+
 def get_allocation_by_id(db: Session, allocation_id: int) -> PaymentAllocation | None:
     return db.query(PaymentAllocation).filter(PaymentAllocation.id == allocation_id).first()
 
 
-def get_allocation_by_id_for_user(db: Session, allocation_id: int, user: User) -> PaymentAllocation | None:
-    """Get payment allocation by ID, filtered by user's school access."""
+def get_allocation_by_id_for_user(
+    db: Session, allocation_id: int, user: Principal, with_payment: bool = False
+) -> PaymentAllocation | None:
+    """
+    Get payment allocation by ID, filtered by user's school access.
+    with_payment loads allocation.payment in the same query.
+    """
     query = db.query(PaymentAllocation).filter(PaymentAllocation.id == allocation_id)
+    if with_payment:
+        query = query.options(joinedload(PaymentAllocation.payment))
     if not user.is_admin:
         query = (
             query
@@ -68,31 +181,52 @@ def get_allocations(db: Session, offset: int = 0, limit: int = 100) -> list[Paym
 
 
 def get_allocations_with_count(
-    db: Session, offset: int = 0, limit: int = 100
-) -> tuple[list[PaymentAllocation], int]:
-    total = db.query(PaymentAllocation).count()
-    items = db.query(PaymentAllocation).offset(offset).limit(limit).all()
-    return items, total
+    db: Session,
+    offset: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count: CountMode = CountMode.EXACT,
+) -> tuple[list[Row], int | None]:
+    return fetch_page(db.query(*ALLOCATION_COLUMNS), PaymentAllocation, offset, limit, cursor, count)
 
 
 def get_allocations_by_school_with_count(
-    db: Session, school_id: int, offset: int = 0, limit: int = 100
-) -> tuple[list[PaymentAllocation], int]:
+    db: Session,
+    school_id: int,
+    offset: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count: CountMode = CountMode.EXACT,
+) -> tuple[list[Row], int | None]:
     query = (
-        db.query(PaymentAllocation)
+        db.query(*ALLOCATION_COLUMNS)
         .join(Invoice, PaymentAllocation.invoice_id == Invoice.id)
         .join(Student, Invoice.student_id == Student.id)
         .filter(Student.school_id == school_id)
     )
-    total = query.count()
-    items = query.offset(offset).limit(limit).all()
-    return items, total
+    return fetch_page(query, PaymentAllocation, offset, limit, cursor, count)
+
+
+def get_allocation_export_statement(school_id: int | None = None) -> Select:
+    """The PaymentAllocationResponse columns of every allocation, or of one school's, in id order."""
+    statement = select(*ALLOCATION_COLUMNS).order_by(PaymentAllocation.id)
+    if school_id is not None:
+        statement = (
+            statement
+            .join(Invoice, PaymentAllocation.invoice_id == Invoice.id)
+            .join(Student, Invoice.student_id == Student.id)
+            .where(Student.school_id == school_id)
+        )
+    return statement
 
 
 def update_allocation(
     db: Session, allocation: PaymentAllocation, allocation_data: PaymentAllocationUpdate
 ) -> PaymentAllocation:
-    """Update allocation without updating invoice status. Use update_allocation_with_status_update instead."""
+    """
+    Update allocation without updating invoice status or paid_cents.
+    Use update_allocation_with_status_update instead.
+    """
     update_data = allocation_data.model_dump(exclude_unset=True, mode="json")
     for field, value in update_data.items():
         setattr(allocation, field, value)
@@ -109,16 +243,27 @@ def update_allocation_with_status_update(
     """
     Update allocation and update invoice status in a single transaction.
     Rolls back both if either fails.
+    Raises AllocationValidationError if the payment does not have enough
+    unallocated balance once its row is locked.
     """
     try:
+        previous_amount = allocation.amount_in_cents
         update_data = allocation_data.model_dump(exclude_unset=True, mode="json")
+        new_amount = update_data.get("amount_in_cents")
+        if new_amount is not None:
+            # Lock the payment before touching the allocation row, like create and delete.
+            _reserve_payment_amount(db, allocation.payment_id, new_amount - previous_amount)
         for field, value in update_data.items():
             setattr(allocation, field, value)
         db.flush()
 
-        # Update invoice status
-        invoice = allocation.invoice
-        _update_invoice_status_internal(db, invoice)
+        # Update invoice paid amount and status
+        _apply_paid_delta(
+            db,
+            allocation.invoice_id,
+            allocation.payment_id,
+            allocation.amount_in_cents - previous_amount,
+        )
 
         db.commit()
         db.refresh(allocation)
@@ -129,7 +274,10 @@ def update_allocation_with_status_update(
 
 
 def delete_allocation(db: Session, allocation: PaymentAllocation) -> None:
-    """Delete allocation without updating invoice status. Use delete_allocation_with_status_update instead."""
+    """
+    Delete allocation without updating invoice status or paid_cents.
+    Use delete_allocation_with_status_update instead.
+    """
     db.delete(allocation)
     db.commit()
 
@@ -143,12 +291,14 @@ def delete_allocation_with_status_update(
     Rolls back both if either fails.
     """
     try:
-        invoice = allocation.invoice
+        _reserve_payment_amount(db, allocation.payment_id, -allocation.amount_in_cents)
         db.delete(allocation)
         db.flush()
 
-        # Update invoice status
-        _update_invoice_status_internal(db, invoice)
+        # Update invoice paid amount and status
+        _apply_paid_delta(
+            db, allocation.invoice_id, allocation.payment_id, -allocation.amount_in_cents
+        )
 
         db.commit()
     except Exception:
@@ -170,27 +320,166 @@ def get_invoice_paid_amount(db: Session, invoice_id: int) -> int:
     return int(result)
 
 
-def _update_invoice_status_internal(db: Session, invoice: Invoice) -> None:
+def _reserve_payment_amount(db: Session, payment_id: int, delta: int) -> None:
+    """
+    Adjust payment.allocated_cents by `delta` with a conditional UPDATE.
+    The row lock taken by the UPDATE serializes concurrent allocations against
+    the same payment, and the WHERE clause re-checks the balance under that lock.
+    Internal function - does NOT commit. Use within a transaction.
     """
-    Update invoice status based on total paid amount from completed payments.
+    if delta == 0:
+        return
+    allocated_cents = Payment.allocated_cents + delta
+    reserved = db.execute(
+        update(Payment)
+        .where(Payment.id == payment_id, allocated_cents <= Payment.amount_in_cents)
+        .values(allocated_cents=allocated_cents)
+        .returning(Payment.allocated_cents)
+        .execution_options(synchronize_session="fetch")
+    ).scalar()
+    if reserved is None:
+        amount_in_cents, already_allocated = (
+            db.query(Payment.amount_in_cents, Payment.allocated_cents)
+            .filter(Payment.id == payment_id)
+            .one()
+        )
+        raise AllocationValidationError(
+            f"Allocation exceeds available payment balance "
+            f"({amount_in_cents - already_allocated}). Payment total: {amount_in_cents}, "
+            f"already allocated: {already_allocated}",
+            "insufficient_payment_balance",
+        )
+
+
+def _paid_status(paid_cents):
+    """SQL expression deriving the invoice status from its paid amount."""
+    return case(
+        (paid_cents >= Invoice.amount_in_cents, InvoiceStatus.PAID.value),
+        (paid_cents > 0, InvoiceStatus.PARTIALLY_PAID.value),
+        # If nothing is paid, we don't change the status (could be PENDING, OVERDUE, etc.)
+        else_=Invoice.status,
+    )
+
+
+def _apply_paid_delta(db: Session, invoice_id: int, payment_id: int, delta: int) -> None:
+    """
+    Adjust invoice.paid_cents by `delta` and re-derive its status in a single UPDATE.
+    Only allocations from completed payments count as paid.
     Internal function - does NOT commit. Use within a transaction.
     """
-    paid_amount = get_invoice_paid_amount(db, invoice.id)
+    if delta == 0:
+        return
+    completed_payment = (
+        select(Payment.id)
+        .where(Payment.id == payment_id, Payment.status == PaymentStatus.COMPLETED.value)
+        .exists()
+    )
+    paid_cents = Invoice.paid_cents + delta
+    student_ids = db.scalars(
+        update(Invoice)
+        .where(Invoice.id == invoice_id, completed_payment)
+        .values(paid_cents=paid_cents, status=_paid_status(paid_cents), updated_at=datetime.now())
+        .returning(Invoice.student_id)
+    ).all()
+    bump_balance_versions(db, student_ids)
+
 
-    if paid_amount >= invoice.amount_in_cents:
+def _update_invoice_status_internal(db: Session, invoice: Invoice) -> None:
+    """
+    Update invoice status based on its stored paid amount.
+    Internal function - does NOT commit. Use within a transaction.
+    """
+    if invoice.paid_cents >= invoice.amount_in_cents:
         invoice.status = InvoiceStatus.PAID.value
-    elif paid_amount > 0:
+    elif invoice.paid_cents > 0:
         invoice.status = InvoiceStatus.PARTIALLY_PAID.value
-    # If paid_amount == 0, we don't change the status (could be PENDING, OVERDUE, etc.)
+    # If paid_cents == 0, we don't change the status (could be PENDING, OVERDUE, etc.)
 
 
 def update_invoice_status_from_payments(db: Session, invoice: Invoice) -> Invoice:
     """
-    Update invoice status based on total paid amount from completed payments.
+    Recompute paid_cents from the allocations of completed payments and update the status.
     This is a standalone operation that commits immediately.
     Prefer using the transactional functions (create/update/delete_allocation_with_status_update).
     """
+    invoice.paid_cents = get_invoice_paid_amount(db, invoice.id)
     _update_invoice_status_internal(db, invoice)
+    invoice.updated_at = datetime.now()
+    bump_balance_versions(db, [invoice.student_id])
     db.commit()
     db.refresh(invoice)
     return invoice
+
+
+def repair_invoice_paid_cents(db: Session, dry_run: bool = False) -> list[tuple[int, int, int]]:
+    """
+    Recompute paid_cents for every invoice set-based and fix the ones that drifted.
+    Returns (invoice_id, stored_cents, actual_cents) for each drifted invoice.
+    """
+    paid = (
+        select(
+            PaymentAllocation.invoice_id,
+            func.sum(PaymentAllocation.amount_in_cents).label("paid_cents"),
+        )
+        .join(Payment, PaymentAllocation.payment_id == Payment.id)
+        .where(Payment.status == PaymentStatus.COMPLETED.value)
+        .group_by(PaymentAllocation.invoice_id)
+        .subquery()
+    )
+    actual_cents = func.coalesce(paid.c.paid_cents, 0)
+    drifted = (
+        select(Invoice.id, Invoice.paid_cents, actual_cents.label("actual_cents"))
+        .outerjoin(paid, paid.c.invoice_id == Invoice.id)
+        .where(Invoice.paid_cents != actual_cents)
+    )
+    drift = [tuple(row) for row in db.execute(drifted.order_by(Invoice.id)).all()]
+
+    if drift and not dry_run:
+        fixes = drifted.subquery()
+        student_ids = db.scalars(
+            update(Invoice)
+            .where(Invoice.id == fixes.c.id)
+            .values(
+                paid_cents=fixes.c.actual_cents,
+                status=_paid_status(fixes.c.actual_cents),
+                updated_at=datetime.now(),
+            )
+            .returning(Invoice.student_id),
+            execution_options={"synchronize_session": False},
+        ).all()
+        bump_balance_versions(db, student_ids)
+    db.commit()
+    return drift
+
+
+def repair_payment_allocated_cents(db: Session, dry_run: bool = False) -> list[tuple[int, int, int]]:
+    """
+    Recompute allocated_cents for every payment set-based and fix the ones that drifted.
+    Returns (payment_id, stored_cents, actual_cents) for each drifted payment.
+    """
+    allocated = (
+        select(
+            PaymentAllocation.payment_id,
+            func.sum(PaymentAllocation.amount_in_cents).label("allocated_cents"),
+        )
+        .group_by(PaymentAllocation.payment_id)
+        .subquery()
+    )
+    actual_cents = func.coalesce(allocated.c.allocated_cents, 0)
+    drifted = (
+        select(Payment.id, Payment.allocated_cents, actual_cents.label("actual_cents"))
+        .outerjoin(allocated, allocated.c.payment_id == Payment.id)
+        .where(Payment.allocated_cents != actual_cents)
+    )
+    drift = [tuple(row) for row in db.execute(drifted.order_by(Payment.id)).all()]
+
+    if drift and not dry_run:
+        fixes = drifted.subquery()
+        db.execute(
+            update(Payment)
+            .where(Payment.id == fixes.c.id)
+            .values(allocated_cents=fixes.c.actual_cents),
+            execution_options={"synchronize_session": False},
+        )
+    db.commit()
+    return drift
@@ -1,14 +1,24 @@
+from datetime import datetime
+
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.db.models import School, Student, Invoice, Payment, PaymentAllocation, PaymentStatus, User
-from app.schemas import SchoolUpdate, BalanceResponse, InvoiceResponse, PaymentResponse
+from sqlalchemy import Exists, Row, Select, delete, func, select, update
+from app.auth import Principal
+from app.db.models import School, Student, Invoice, Payment
+from app.schemas import SchoolCreate, SchoolResponse, SchoolUpdate, BalanceResponse, CountMode
+from app.services.balance import get_balance, get_balance_json
+from app.services.writes import insert_returning
 from app.constants import UNPAID_INVOICE_STATUSES
+from app.pagination import fetch_page
+from app.serialization import response_columns
+
+SCHOOL_COLUMNS = response_columns(School, SchoolResponse)
 
 
-def create_school(db: Session, school: School) -> School:
-    db.add(school)
+def create_school(db: Session, school_data: SchoolCreate) -> Row:
+    now = datetime.now()
+    values = {**school_data.model_dump(), "created_at": now, "updated_at": now}
+    school = db.execute(insert_returning(School, values, SCHOOL_COLUMNS)).one()
     db.commit()
-    db.refresh(school)
     return school
 
 
@@ -16,7 +26,7 @@ def get_school_by_id(db: Session, school_id: int) -> School | None:
     return db.query(School).filter(School.id == school_id).first()
 
 
-def get_school_by_id_for_user(db: Session, school_id: int, user: User) -> School | None:
+def get_school_by_id_for_user(db: Session, school_id: int, user: Principal) -> School | None:
     """Get school by ID, filtered by user's school access."""
     query = db.query(School).filter(School.id == school_id)
     if not user.is_admin:
@@ -24,30 +34,57 @@ def get_school_by_id_for_user(db: Session, school_id: int, user: User) -> School
     return query.first()
 
 
+def school_visible_to(school_id: int, user: Principal) -> Exists:
+    """Whether the school exists and the user may access it, as a condition for writes."""
+    query = select(School.id).where(School.id == school_id)
+    if not user.is_admin:
+        query = query.where(School.id == user.school_id)
+    return query.exists()
+
+
+def get_school_balance_version(db: Session, school_id: int, user: Principal) -> int | None:
+    """Return the school's balance version, or None if it is missing or not visible to the user."""
+    query = select(School.balance_version).where(School.id == school_id)
+    if not user.is_admin:
+        query = query.where(School.id == user.school_id)
+    return db.scalar(query)
+
+
 def get_schools(db: Session, offset: int = 0, limit: int = 100) -> list[School]:
     return db.query(School).offset(offset).limit(limit).all()
 
 
 def get_schools_with_count(
-    db: Session, offset: int = 0, limit: int = 100
-) -> tuple[list[School], int]:
-    total = db.query(School).count()
-    items = db.query(School).offset(offset).limit(limit).all()
-    return items, total
-
-
-def update_school(db: Session, school: School, school_data: SchoolUpdate) -> School:
-    update_data = school_data.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(school, field, value)
-    db.commit()
-    db.refresh(school)
+    db: Session,
+    offset: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count: CountMode = CountMode.EXACT,
+) -> tuple[list[Row], int | None]:
+    return fetch_page(db.query(*SCHOOL_COLUMNS), School, offset, limit, cursor, count)
+
+
+def update_school(db: Session, school_id: int, school_data: SchoolUpdate) -> Row | None:
+    """Apply `school_data` in one UPDATE ... RETURNING; None if the school does not exist."""
+    statement = (
+        update(School)
+        .where(School.id == school_id)
+        .values(**school_data.model_dump(exclude_unset=True), updated_at=datetime.now())
+        .returning(*SCHOOL_COLUMNS)
+    )
+    school = db.execute(statement, execution_options={"synchronize_session": False}).one_or_none()
+    if school is not None:
+        db.commit()
     return school
 
 
-def delete_school(db: Session, school: School) -> None:
-    db.delete(school)
+def delete_school(db: Session, school_id: int) -> bool:
+    """Delete the school in one DELETE ... RETURNING; False if it does not exist."""
+    statement = delete(School).where(School.id == school_id).returning(School.id)
+    if db.scalar(statement, execution_options={"synchronize_session": False}) is None:
+        return False
     db.commit()
+    return True
 
 
 def get_total_invoiced_for_school(db: Session, school_id: int) -> int:
@@ -62,14 +99,9 @@ def get_total_invoiced_for_school(db: Session, school_id: int) -> int:
 
 def get_total_paid_for_school(db: Session, school_id: int) -> int:
     result = (
-        db.query(func.coalesce(func.sum(PaymentAllocation.amount_in_cents), 0))
-        .join(Payment, PaymentAllocation.payment_id == Payment.id)
-        .join(Invoice, PaymentAllocation.invoice_id == Invoice.id)
+        db.query(func.coalesce(func.sum(Invoice.paid_cents), 0))
         .join(Student, Invoice.student_id == Student.id)
-        .filter(
-            Student.school_id == school_id,
-            Payment.status == PaymentStatus.COMPLETED.value,
-        )
+        .filter(Student.school_id == school_id)
         .scalar()
     )
     return int(result)
@@ -110,18 +142,32 @@ def get_recent_payments_for_school(db: Session, school_id: int, limit: int = 10)
     )
 
 
-def get_school_balance(db: Session, school_id: int) -> BalanceResponse:
-    total_invoiced = get_total_invoiced_for_school(db, school_id)
-    total_paid = get_total_paid_for_school(db, school_id)
-    currency = get_currency_for_school(db, school_id)
-    invoices = get_unpaid_invoices_for_school(db, school_id)
-    payments = get_recent_payments_for_school(db, school_id)
-
-    return BalanceResponse(
-        total_invoiced_cents=total_invoiced,
-        total_paid_cents=total_paid,
-        total_pending_cents=total_invoiced - total_paid,
-        currency=currency,
-        invoices=[InvoiceResponse.model_validate(inv) for inv in invoices],
-        payments=[PaymentResponse.model_validate(pay) for pay in payments],
+def _school_balance_scopes(school_id: int) -> tuple[Select, Select]:
+    scoped_invoices = (
+        select(Invoice)
+        .join(Student, Invoice.student_id == Student.id)
+        .where(Student.school_id == school_id)
+    )
+    scoped_payments = (
+        select(Payment)
+        .join(Student, Payment.student_id == Student.id)
+        .where(Student.school_id == school_id)
     )
+    return scoped_invoices, scoped_payments
+
+
+def get_school_balance(db: Session, school_id: int) -> BalanceResponse:
+    """Compute the school balance summary in a single round trip."""
+    return get_balance(db, *_school_balance_scopes(school_id))
+
+
+def get_versioned_school_balance(db: Session, school_id: int) -> tuple[int, bytes] | None:
+    """
+    The school's balance_version and balance JSON, or None if the school is gone.
+
+    The version is read first, so the balance is at least as new as it.
+    """
+    version = db.scalar(select(School.balance_version).where(School.id == school_id))
+    if version is None:
+        return None
+    return version, get_balance_json(db, *_school_balance_scopes(school_id))
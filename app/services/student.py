@@ -1,14 +1,28 @@
+from datetime import datetime
+
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.db.models import Student, Invoice, Payment, PaymentAllocation, PaymentStatus, User
-from app.schemas import StudentUpdate, BalanceResponse, InvoiceResponse, PaymentResponse
+from sqlalchemy import Exists, Row, Select, delete, func, select, update
+from app.auth import Principal
+from app.db.models import Student, Invoice, Payment
+from app.schemas import StudentCreate, StudentResponse, StudentUpdate, BalanceResponse, CountMode
+from app.services.balance import bump_balance_versions, get_balance, get_balance_json
+from app.services.school import school_visible_to
+from app.services.writes import insert_returning
 from app.constants import UNPAID_INVOICE_STATUSES
+from app.pagination import fetch_page
+from app.serialization import response_columns
 
+STUDENT_COLUMNS = response_columns(Student, StudentResponse)
 
-def create_student(db: Session, student: Student) -> Student:
-    db.add(student)
-    db.commit()
-    db.refresh(student)
+
+def create_student(db: Session, student_data: StudentCreate, user: Principal) -> Row | None:
+    """Insert the student in one statement; None if its school is not visible to the user."""
+    now = datetime.now()
+    values = {**student_data.model_dump(), "created_at": now, "updated_at": now}
+    guard = school_visible_to(student_data.school_id, user)
+    student = db.execute(insert_returning(Student, values, STUDENT_COLUMNS, guard)).one_or_none()
+    if student is not None:
+        db.commit()
     return student
 
 
@@ -16,7 +30,7 @@ def get_student_by_id(db: Session, student_id: int) -> Student | None:
     return db.query(Student).filter(Student.id == student_id).first()
 
 
-def get_student_by_id_for_user(db: Session, student_id: int, user: User) -> Student | None:
+def get_student_by_id_for_user(db: Session, student_id: int, user: Principal) -> Student | None:
     """Get student by ID, filtered by user's school access."""
     query = db.query(Student).filter(Student.id == student_id)
     if not user.is_admin:
@@ -24,39 +38,87 @@ def get_student_by_id_for_user(db: Session, student_id: int, user: User) -> Stud
     return query.first()
 
 
+def student_visible_to(student_id: int, user: Principal) -> Exists:
+    """Whether the student exists and the user may access it, as a condition for writes."""
+    query = select(Student.id).where(Student.id == student_id)
+    if not user.is_admin:
+        query = query.where(Student.school_id == user.school_id)
+    return query.exists()
+
+
+def get_student_balance_version(db: Session, student_id: int, user: Principal) -> int | None:
+    """Return the student's balance version, or None if it is missing or not visible to the user."""
+    query = select(Student.balance_version).where(Student.id == student_id)
+    if not user.is_admin:
+        query = query.where(Student.school_id == user.school_id)
+    return db.scalar(query)
+
+
 def get_students(db: Session, offset: int = 0, limit: int = 100) -> list[Student]:
     return db.query(Student).offset(offset).limit(limit).all()
 
 
 def get_students_with_count(
-    db: Session, offset: int = 0, limit: int = 100
-) -> tuple[list[Student], int]:
-    total = db.query(Student).count()
-    items = db.query(Student).offset(offset).limit(limit).all()
-    return items, total
+    db: Session,
+    offset: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count: CountMode = CountMode.EXACT,
+) -> tuple[list[Row], int | None]:
+    return fetch_page(db.query(*STUDENT_COLUMNS), Student, offset, limit, cursor, count)
 
 
 def get_students_by_school_with_count(
-    db: Session, school_id: int, offset: int = 0, limit: int = 100
-) -> tuple[list[Student], int]:
-    query = db.query(Student).filter(Student.school_id == school_id)
-    total = query.count()
-    items = query.offset(offset).limit(limit).all()
-    return items, total
-
-
-def update_student(db: Session, student: Student, student_data: StudentUpdate) -> Student:
-    update_data = student_data.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(student, field, value)
+    db: Session,
+    school_id: int,
+    offset: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count: CountMode = CountMode.EXACT,
+) -> tuple[list[Row], int | None]:
+    query = db.query(*STUDENT_COLUMNS).filter(Student.school_id == school_id)
+    return fetch_page(query, Student, offset, limit, cursor, count)
+
+
+def update_student(
+    db: Session, student_id: int, student_data: StudentUpdate, user: Principal
+) -> Row | None:
+    """
+    Apply `student_data` in one UPDATE ... RETURNING.
+
+    Returns None, without writing, if the student or the school it moves to
+    is missing or not visible to the user.
+    """
+    previous = Student.__table__.alias("previous_student")
+    statement = (
+        update(Student)
+        .where(Student.id == student_id, previous.c.id == Student.id)
+        .values(**student_data.model_dump(exclude_unset=True), updated_at=datetime.now())
+        .returning(*STUDENT_COLUMNS, previous.c.school_id.label("previous_school_id"))
+    )
+    if not user.is_admin:
+        statement = statement.where(Student.school_id == user.school_id)
+    if student_data.school_id is not None:
+        statement = statement.where(school_visible_to(student_data.school_id, user))
+    student = db.execute(statement, execution_options={"synchronize_session": False}).one_or_none()
+    if student is None:
+        return None
+    if student.school_id != student.previous_school_id:
+        # The student's invoices and payments move between the schools' balances.
+        bump_balance_versions(db, [student.id], [student.previous_school_id])
     db.commit()
-    db.refresh(student)
     return student
 
 
-def delete_student(db: Session, student: Student) -> None:
-    db.delete(student)
+def delete_student(db: Session, student_id: int, user: Principal) -> bool:
+    """Delete the student in one DELETE ... RETURNING; False if it is missing or not visible to the user."""
+    statement = delete(Student).where(Student.id == student_id).returning(Student.id)
+    if not user.is_admin:
+        statement = statement.where(Student.school_id == user.school_id)
+    if db.scalar(statement, execution_options={"synchronize_session": False}) is None:
+        return False
     db.commit()
+    return True
 
 
 def get_total_invoiced_for_student(db: Session, student_id: int) -> int:
@@ -70,13 +132,8 @@ def get_total_invoiced_for_student(db: Session, student_id: int) -> int:
 
 def get_total_paid_for_student(db: Session, student_id: int) -> int:
     result = (
-        db.query(func.coalesce(func.sum(PaymentAllocation.amount_in_cents), 0))
-        .join(Payment, PaymentAllocation.payment_id == Payment.id)
-        .join(Invoice, PaymentAllocation.invoice_id == Invoice.id)
-        .filter(
-            Invoice.student_id == student_id,
-            Payment.status == PaymentStatus.COMPLETED.value,
-        )
+        db.query(func.coalesce(func.sum(Invoice.paid_cents), 0))
+        .filter(Invoice.student_id == student_id)
         .scalar()
     )
     return int(result)
@@ -114,18 +171,24 @@ def get_recent_payments_for_student(db: Session, student_id: int, limit: int = 1
     )
 
 
+def _student_balance_scopes(student_id: int) -> tuple[Select, Select]:
+    scoped_invoices = select(Invoice).where(Invoice.student_id == student_id)
+    scoped_payments = select(Payment).where(Payment.student_id == student_id)
+    return scoped_invoices, scoped_payments
+
+
 def get_student_balance(db: Session, student_id: int) -> BalanceResponse:
-    total_invoiced = get_total_invoiced_for_student(db, student_id)
-    total_paid = get_total_paid_for_student(db, student_id)
-    currency = get_currency_for_student(db, student_id)
-    invoices = get_unpaid_invoices_for_student(db, student_id)
-    payments = get_recent_payments_for_student(db, student_id)
-
-    return BalanceResponse(
-        total_invoiced_cents=total_invoiced,
-        total_paid_cents=total_paid,
-        total_pending_cents=total_invoiced - total_paid,
-        currency=currency,
-        invoices=[InvoiceResponse.model_validate(inv) for inv in invoices],
-        payments=[PaymentResponse.model_validate(pay) for pay in payments],
-    )
+    """Compute the student balance summary in a single round trip."""
+    return get_balance(db, *_student_balance_scopes(student_id))
+
+
+def get_versioned_student_balance(db: Session, student_id: int) -> tuple[int, bytes] | None:
+    """
+    The student's balance_version and balance JSON, or None if the student is gone.
+
+    The version is read first, so the balance is at least as new as it.
+    """
+    version = db.scalar(select(Student.balance_version).where(Student.id == student_id))
+    if version is None:
+        return None
+    return version, get_balance_json(db, *_student_balance_scopes(student_id))
@@ -1,25 +1,42 @@
 from datetime import datetime
 
-from sqlalchemy.orm import Session
+from sqlalchemy import Row, and_, delete, select, update
+from sqlalchemy.orm import Session, aliased
 
-from app.auth import get_password_hash, verify_password
-from app.db.models import User
-from app.schemas import UserCreate, UserUpdate
+from app.auth import token_versions
+from app.db.models import School, User
+from app.db.notifications import notify_user_changed
+from app.schemas import UserResponse, UserCreate, UserUpdate, CountMode
+from app.pagination import fetch_page
+from app.serialization import response_columns
+from app.services.writes import insert_returning
 
+USER_COLUMNS = response_columns(User, UserResponse)
 
-def create_user(db: Session, user_data: UserCreate) -> User:
+
+def create_user(db: Session, user_data: UserCreate, hashed_password: str) -> Row | None:
+    """
+    Create a user with a password already hashed by the caller, normally on
+    app.auth.password_hasher so bcrypt stays off the request threads.
+
+    The user is inserted in one statement; returns None, without writing, if
+    the email is taken or the school does not exist.
+    """
     now = datetime.now()
-    user = User(
-        email=user_data.email,
-        hashed_password=get_password_hash(user_data.password),
-        school_id=user_data.school_id,
-        is_admin=user_data.is_admin,
-        created_at=now,
-        updated_at=now,
-    )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    values = {
+        "email": user_data.email,
+        "hashed_password": hashed_password,
+        "school_id": user_data.school_id,
+        "is_admin": user_data.is_admin,
+        "created_at": now,
+        "updated_at": now,
+    }
+    guard = ~select(User.id).where(User.email == user_data.email).exists()
+    if user_data.school_id:
+        guard = and_(guard, select(School.id).where(School.id == user_data.school_id).exists())
+    user = db.execute(insert_returning(User, values, USER_COLUMNS, guard)).one_or_none()
+    if user is not None:
+        db.commit()
     return user
 
 
@@ -31,41 +48,73 @@ def get_user_by_email(db: Session, email: str) -> User | None:
     return db.query(User).filter(User.email == email).first()
 
 
+def get_token_version(db: Session, user_id: int) -> int | None:
+    """The user's current token version, or None if the user no longer exists."""
+    return db.scalar(select(User.token_version).where(User.id == user_id))
+
+
 def get_users(db: Session, offset: int = 0, limit: int = 100) -> list[User]:
     return db.query(User).offset(offset).limit(limit).all()
 
 
 def get_users_with_count(
-    db: Session, offset: int = 0, limit: int = 100
-) -> tuple[list[User], int]:
-    total = db.query(User).count()
-    items = db.query(User).offset(offset).limit(limit).all()
-    return items, total
-
-
-def update_user(db: Session, user: User, user_data: UserUpdate) -> User:
-    update_data = user_data.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        if field == "password":
-            setattr(user, "hashed_password", get_password_hash(value))
-        else:
-            setattr(user, field, value)
-    user.updated_at = datetime.now()
+    db: Session,
+    offset: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count: CountMode = CountMode.EXACT,
+) -> tuple[list[Row], int | None]:
+    return fetch_page(db.query(*USER_COLUMNS), User, offset, limit, cursor, count)
+
+
+def update_user(
+    db: Session, user_id: int, user_data: UserUpdate, hashed_password: str | None = None
+) -> Row | None:
+    """
+    Apply `user_data` in one UPDATE ... RETURNING; a new password must come
+    already hashed as `hashed_password`.
+
+    Returns None, without writing, if the user does not exist, the new email
+    belongs to another user or the new school does not exist.
+    """
+    values = user_data.model_dump(exclude_unset=True)
+    if "password" in values:
+        del values["password"]
+        values["hashed_password"] = hashed_password
+    if values:
+        # Every updatable field is either a token claim or the password, so
+        # tokens issued before the change are revoked.
+        values["token_version"] = User.token_version + 1
+    values["updated_at"] = datetime.now()
+    statement = (
+        update(User)
+        .where(User.id == user_id)
+        .values(values)
+        .returning(*USER_COLUMNS, User.token_version)
+    )
+    if user_data.email:
+        other = aliased(User, name="other_user")
+        statement = statement.where(
+            ~select(other.id).where(other.email == user_data.email, other.id != user_id).exists()
+        )
+    if user_data.school_id:
+        statement = statement.where(select(School.id).where(School.id == user_data.school_id).exists())
+    user = db.execute(statement, execution_options={"synchronize_session": False}).one_or_none()
+    if user is None:
+        return None
+    notify_user_changed(db, user.id)
     db.commit()
-    db.refresh(user)
+    token_versions.set(user.id, user.token_version)
     return user
 
 
-def delete_user(db: Session, user: User) -> None:
-    db.delete(user)
+def delete_user(db: Session, user_id: int) -> bool:
+    """Delete the user in one DELETE ... RETURNING; False if it does not exist."""
+    statement = delete(User).where(User.id == user_id).returning(User.id)
+    if db.scalar(statement, execution_options={"synchronize_session": False}) is None:
+        return False
+    notify_user_changed(db, user_id)
     db.commit()
-
-
-def authenticate_user(db: Session, email: str, password: str) -> User | None:
-    user = get_user_by_email(db, email)
-    if not user:
-        return None
-    if not verify_password(password, user.hashed_password):
-        return None
-    return user
+    token_versions.invalidate(user_id)
+    return True
 
@@ -0,0 +1,37 @@
+"""
+Single-statement writes.
+
+Creates and updates are issued as one INSERT or UPDATE that returns the
+response columns, instead of loading the row, mutating the ORM instance,
+committing and refreshing it. The access check the routers used to run as
+a separate lookup is folded into the statement: an UPDATE only matches rows
+the user can see, and an INSERT selects its values only when the referenced
+row is visible. A write that matches nothing returns no row; the routers
+then look up why, so error responses stay the same while the common path
+costs one round trip plus the commit.
+
+An update that also needs a value from before it, such as the previous
+student or school whose balance changes too, joins the table to an alias
+of itself. The alias reads the row as it was before the update, so
+RETURNING gives the old and new values in the same statement.
+"""
+
+from typing import Any
+
+from sqlalchemy import ColumnElement, Insert, insert, literal, select
+
+
+def insert_returning(
+    model: type, values: dict[str, Any], returning: list, guard: ColumnElement[bool] | None = None
+) -> Insert:
+    """
+    INSERT `values` into `model`'s table, RETURNING `returning`.
+
+    With a `guard` the row is inserted with INSERT ... SELECT ... WHERE guard,
+    so nothing is inserted (or returned) unless the guard holds.
+    """
+    if guard is None:
+        return insert(model).values(values).returning(*returning)
+    table = model.__table__
+    row = select(*(literal(value, table.c[name].type) for name, value in values.items())).where(guard)
+    return insert(model).from_select(list(values), row).returning(*returning)
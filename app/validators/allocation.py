@@ -5,17 +5,28 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 
 from app.db.models import Payment, Invoice, PaymentAllocation, PaymentStatus, InvoiceStatus
+from app.metrics import ALLOCATION_VALIDATION_FAILURES
 
 
 class AllocationValidationError(HTTPException):
-    """Raised when allocation validation fails."""
+    """
+    Raised when allocation validation fails.
+
+    `reason` is a short fixed name for the rule that failed, used as the
+    metric label; `detail` carries the amounts for the client.
+    """
 
-    def __init__(self, detail: str):
+    def __init__(self, detail: str, reason: str):
         super().__init__(status_code=400, detail=detail)
+        self.reason = reason
+        ALLOCATION_VALIDATION_FAILURES.labels(reason).inc()
 
 
 def get_payment_allocated_amount(db: Session, payment_id: int) -> int:
-    """Get total amount already allocated from this payment."""
+    """
+    Sum the allocations of this payment.
+    The validators read the denormalized payment.allocated_cents instead.
+    """
     result = (
         db.query(func.coalesce(func.sum(PaymentAllocation.amount_in_cents), 0))
         .filter(PaymentAllocation.payment_id == payment_id)
@@ -38,34 +49,38 @@ def validate_allocation_create(
     """
     # Rule 1: Amount must be positive
     if amount_in_cents <= 0:
-        raise AllocationValidationError("Allocation amount must be positive")
+        raise AllocationValidationError("Allocation amount must be positive", "non_positive_amount")
 
     # Rule 2: Cannot allocate from non-completed payment
     if payment.status != PaymentStatus.COMPLETED.value:
         raise AllocationValidationError(
             f"Cannot allocate from payment with status '{payment.status}'. "
-            "Payment must be completed."
+            "Payment must be completed.",
+            "payment_not_completed",
         )
 
     # Rule 3: Cannot allocate to cancelled invoice
     if invoice.status == InvoiceStatus.CANCELLED.value:
-        raise AllocationValidationError("Cannot allocate to a cancelled invoice")
+        raise AllocationValidationError("Cannot allocate to a cancelled invoice", "invoice_cancelled")
 
     # Rule 4: Currency must match
     if payment.currency != invoice.currency:
         raise AllocationValidationError(
             f"Currency mismatch: payment is {payment.currency}, "
-            f"invoice is {invoice.currency}"
+            f"invoice is {invoice.currency}",
+            "currency_mismatch",
         )
 
-    # Rule 5: Cannot allocate more than payment's available amount
-    already_allocated = get_payment_allocated_amount(db, payment.id)
+    # Rule 5: Cannot allocate more than payment's available amount.
+    # allocated_cents is re-checked under a row lock when the allocation is written.
+    already_allocated = payment.allocated_cents
     available = payment.amount_in_cents - already_allocated
     if amount_in_cents > available:
         raise AllocationValidationError(
             f"Allocation amount ({amount_in_cents}) exceeds available payment "
             f"balance ({available}). Payment total: {payment.amount_in_cents}, "
-            f"already allocated: {already_allocated}"
+            f"already allocated: {already_allocated}",
+            "insufficient_payment_balance",
         )
 
     # NOTE: We intentionally DO NOT validate against invoice remaining balance.
@@ -87,18 +102,19 @@ def validate_allocation_update(
         return
 
     if new_amount_in_cents <= 0:
-        raise AllocationValidationError("Allocation amount must be positive")
+        raise AllocationValidationError("Allocation amount must be positive", "non_positive_amount")
 
     payment = allocation.payment
 
     # Check payment available (excluding current allocation)
-    already_allocated = get_payment_allocated_amount(db, payment.id)
+    already_allocated = payment.allocated_cents
     current_allocation = allocation.amount_in_cents
     available = payment.amount_in_cents - already_allocated + current_allocation
 
     if new_amount_in_cents > available:
         raise AllocationValidationError(
-            f"New amount ({new_amount_in_cents}) exceeds available payment balance ({available})"
+            f"New amount ({new_amount_in_cents}) exceeds available payment balance ({available})",
+            "insufficient_payment_balance",
         )
 
     # NOTE: We intentionally DO NOT validate against invoice remaining balance.
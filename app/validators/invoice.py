@@ -0,0 +1,42 @@
+"""Validation rules for bulk invoice creation."""
+
+from typing import Any
+
+from fastapi import HTTPException
+from sqlalchemy import Integer, String
+
+from app.db.models import Invoice
+
+INT4_MAX = 2**31 - 1
+
+STRING_LIMITS = [
+    (column.name, column.type.length)
+    for column in Invoice.__table__.columns
+    if isinstance(column.type, String) and column.type.length
+]
+INTEGER_COLUMNS = [column.name for column in Invoice.__table__.columns if isinstance(column.type, Integer)]
+
+
+class BulkInvoiceError(HTTPException):
+    """Raised when an all-or-nothing bulk creation has failing rows."""
+
+    def __init__(self, errors: list[dict[str, Any]]):
+        super().__init__(status_code=422, detail=errors)
+
+
+def invoice_row_error(row: dict[str, Any]) -> str | None:
+    """
+    Check a row against the column limits the database would enforce.
+
+    A single out-of-range value aborts a multi-row INSERT, so rows are
+    rejected individually before they reach it.
+    """
+    for name, length in STRING_LIMITS:
+        value = row.get(name)
+        if value is not None and len(value) > length:
+            return f"{name} exceeds {length} characters"
+    for name in INTEGER_COLUMNS:
+        value = row.get(name)
+        if value is not None and not -INT4_MAX - 1 <= value <= INT4_MAX:
+            return f"{name} is out of range"
+    return None
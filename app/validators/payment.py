@@ -1,6 +1,7 @@
 """Validation rules for payment modifications."""
 
 from fastapi import HTTPException
+from sqlalchemy import ColumnElement, Exists, or_, select
 from sqlalchemy.orm import Session
 
 from app.db.models import Payment, PaymentStatus, PaymentAllocation
@@ -44,6 +45,28 @@ def validate_payment_update(
                 )
 
 
+def payment_update_allowed(
+    new_status: str | None = None,
+    new_amount: int | None = None,
+) -> list[ColumnElement[bool]]:
+    """
+    The rules of validate_payment_update as conditions on the payment row,
+    for updates that check them in their WHERE clause.
+    """
+    has_allocations = payment_has_allocations()
+    conditions = []
+    if new_amount is not None:
+        conditions.append(or_(Payment.amount_in_cents == new_amount, ~has_allocations))
+    if new_status in [PaymentStatus.PENDING.value, PaymentStatus.FAILED.value]:
+        conditions.append(or_(Payment.status != PaymentStatus.COMPLETED.value, ~has_allocations))
+    return conditions
+
+
+def payment_has_allocations() -> Exists:
+    """Whether the Payment row the statement is on has allocations."""
+    return select(PaymentAllocation.id).where(PaymentAllocation.payment_id == Payment.id).exists()
+
+
 def validate_payment_delete(db: Session, payment: Payment) -> None:
     """Validate payment deletion."""
     has_allocations = (
@@ -52,7 +75,11 @@ def validate_payment_delete(db: Session, payment: Payment) -> None:
         .first()
         is not None
     )
+    check_payment_delete(has_allocations)
+
 
+def check_payment_delete(has_allocations: bool) -> None:
+    """Raise PaymentValidationError if a payment with allocations is being deleted."""
     if has_allocations:
         raise PaymentValidationError(
             "Cannot delete a payment that has allocations. "
@@ -34,5 +34,11 @@ EOF
 echo "Running database migrations..."
 alembic upgrade head
 
+# Multiprocess metrics: samples left by a previous run must not be aggregated.
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
 echo "Starting uvicorn server on port ${PORT:-8000}..."
 exec uvicorn app.main:app --host 0.0.0.0 --port ${PORT:-8000}
@@ -0,0 +1,168 @@
+"""
+Benchmark concurrent allocations against a single payment.
+
+Fires N parallel allocations at one payment that can only cover half of them
+and reports throughput and whether the payment ended up over-allocated.
+`--unlocked` runs the previous check-then-insert flow for comparison.
+
+Adds its own school, student, payment and invoices; existing data is kept:
+    docker compose run --rm app python -m scripts.bench_allocation_concurrency --allocations 200
+"""
+
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.db.database import Base, DATABASE_URL
+from app.db.models import (
+    Invoice,
+    Payment,
+    PaymentAllocation,
+    PaymentMethod,
+    PaymentStatus,
+    School,
+    Student,
+)
+from app.logging_config import setup_logging, get_logger
+from app.services import payment_allocation as allocation_service
+from app.validators.allocation import (
+    AllocationValidationError,
+    get_payment_allocated_amount,
+    validate_allocation_create,
+)
+
+logger = get_logger(__name__)
+
+ALLOCATION_CENTS = 1000
+
+
+def seed_payment(db: Session, allocations: int) -> tuple[int, list[int]]:
+    """Create a payment covering half of `allocations` and one invoice per allocation."""
+    now = datetime.now()
+    suffix = uuid.uuid4().hex[:8]
+    school = School(name=f"Bench {suffix}", country="US", tax_id=suffix, created_at=now, updated_at=now)
+    db.add(school)
+    db.flush()
+    student = Student(
+        identifier=f"BENCH-{suffix}",
+        name="Bench Student",
+        email=f"bench-{suffix}@example.com",
+        school_id=school.id,
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(student)
+    db.flush()
+    payment = Payment(
+        amount_in_cents=ALLOCATION_CENTS * allocations // 2,
+        currency="USD",
+        status=PaymentStatus.COMPLETED.value,
+        payment_method=PaymentMethod.CARD.value,
+        student_id=student.id,
+        created_at=now,
+        updated_at=now,
+    )
+    invoices = [
+        Invoice(
+            invoice_number=f"BENCH-{suffix}-{i}",
+            amount_in_cents=ALLOCATION_CENTS,
+            currency="USD",
+            issue_date=now,
+            due_date=now,
+            student_id=student.id,
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(allocations)
+    ]
+    db.add(payment)
+    db.add_all(invoices)
+    db.commit()
+    return payment.id, [invoice.id for invoice in invoices]
+
+
+def allocate(db: Session, payment_id: int, invoice_id: int) -> None:
+    payment = db.get(Payment, payment_id)
+    invoice = db.get(Invoice, invoice_id)
+    validate_allocation_create(db, payment, invoice, ALLOCATION_CENTS)
+    allocation_service.create_allocation_with_status_update(db, payment, invoice, ALLOCATION_CENTS)
+
+
+def allocate_unlocked(db: Session, payment_id: int, invoice_id: int) -> None:
+    """The previous flow: SUM the allocations, then insert without holding a lock."""
+    payment = db.get(Payment, payment_id)
+    available = payment.amount_in_cents - get_payment_allocated_amount(db, payment_id)
+    if ALLOCATION_CENTS > available:
+        raise AllocationValidationError("Allocation exceeds available payment balance")
+    allocation_service.create_allocation(
+        db,
+        PaymentAllocation(
+            payment_id=payment_id,
+            invoice_id=invoice_id,
+            amount_in_cents=ALLOCATION_CENTS,
+            created_at=datetime.now(),
+        ),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--allocations", type=int, default=200)
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--unlocked", action="store_true", help="Use the previous unlocked check")
+    args = parser.parse_args()
+
+    setup_logging()
+    engine = create_engine(DATABASE_URL, pool_size=args.connections, max_overflow=0)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+    with session_factory() as db:
+        payment_id, invoice_ids = seed_payment(db, args.allocations)
+
+    fn = allocate_unlocked if args.unlocked else allocate
+
+    def run(invoice_id: int) -> bool:
+        with session_factory() as db:
+            try:
+                fn(db, payment_id, invoice_id)
+                return True
+            except AllocationValidationError:
+                return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.allocations) as executor:
+        results = list(executor.map(run, invoice_ids))
+    elapsed = time.perf_counter() - start
+
+    with session_factory() as db:
+        payment = db.get(Payment, payment_id)
+        allocated = (
+            db.query(func.coalesce(func.sum(PaymentAllocation.amount_in_cents), 0))
+            .filter(PaymentAllocation.payment_id == payment_id)
+            .scalar()
+        )
+        accepted = sum(results)
+        logger.info(
+            "%d allocations in %.2f s (%.0f/s): %d accepted, %d rejected",
+            len(results), elapsed, len(results) / elapsed, accepted, len(results) - accepted,
+        )
+        logger.info(
+            "Payment %d: amount %d, allocated %d (stored allocated_cents %d)",
+            payment_id, payment.amount_in_cents, allocated, payment.allocated_cents,
+        )
+        if allocated > payment.amount_in_cents:
+            logger.error("Payment is over-allocated by %d cents", allocated - payment.amount_in_cents)
+        else:
+            logger.info("Payment is not over-allocated")
+
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark the per-request cost of authenticating a bearer token.
+
+Compares the previous implementation, which loaded the user by email on
+every request, with claims-based authentication when the user's token
+version must be read from the database (cache miss) and when it is cached.
+Each request opens and closes its own session, as the API does:
+    docker compose run --rm app python -m scripts.bench_auth --requests 2000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+from datetime import datetime
+
+from app.auth import create_access_token, decode_token, token_versions, user_claims
+from app.config import settings
+from app.db.database import (
+    AsyncDatabase,
+    AsyncSessionLocal,
+    Base,
+    Database,
+    SessionLocal,
+    SyncDatabase,
+    async_engine,
+    engine,
+)
+from app.db.models import User
+from app.dependencies import get_current_user
+from app.logging_config import setup_logging, get_logger
+from app.services import user as user_service
+
+logger = get_logger(__name__)
+
+BENCH_EMAIL = "bench-auth@example.com"
+
+
+async def legacy_current_user(token: str, db: Database) -> User:
+    """The original implementation: look the user up by the token's email."""
+    payload = decode_token(token)
+    return await db.run(user_service.get_user_by_email, payload["sub"])
+
+
+async def cache_miss_current_user(token: str, db: Database):
+    token_versions.clear()
+    return await get_current_user(token, db)
+
+
+async def measure(
+    fn: Callable[[str, Database], Awaitable], token: str, requests: int, use_async: bool
+) -> list[float]:
+    """Return the latency in milliseconds of authenticating `requests` times."""
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        if use_async:
+            async with AsyncSessionLocal() as session:
+                await fn(token, AsyncDatabase(session))
+        else:
+            with SessionLocal() as db:
+                await fn(token, SyncDatabase(db))
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name: str, timings: list[float]) -> None:
+    percentiles = statistics.quantiles(timings, n=100)
+    logger.info(
+        "%-30s mean=%6.3f ms  p50=%6.3f ms  p99=%6.3f ms",
+        name, statistics.fmean(timings), percentiles[49], percentiles[98],
+    )
+
+
+def bench_user() -> User:
+    with SessionLocal() as db:
+        user = user_service.get_user_by_email(db, BENCH_EMAIL)
+        if user is None:
+            now = datetime.now()
+            user = User(
+                email=BENCH_EMAIL,
+                hashed_password="!",
+                is_admin=True,
+                created_at=now,
+                updated_at=now,
+            )
+            db.add(user)
+            db.commit()
+            db.refresh(user)
+        return user
+
+
+async def run(token: str, requests: int) -> None:
+    for use_async in (False, True):
+        stack = "async" if use_async else "sync"
+        # Warm up connections and statement caches.
+        await measure(legacy_current_user, token, 50, use_async)
+        await measure(get_current_user, token, 50, use_async)
+        for name, fn in (
+            ("user lookup (before)", legacy_current_user),
+            ("version lookup (miss)", cache_miss_current_user),
+            ("cached version", get_current_user),
+        ):
+            report(f"{stack} {name}", await measure(fn, token, requests, use_async))
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_logging()
+    Base.metadata.create_all(bind=engine)
+    token = create_access_token(data=user_claims(bench_user()))
+    logger.info("Token version cache TTL %.0f s", settings.token_version_ttl_seconds)
+    asyncio.run(run(token, args.requests))
+
+
+if __name__ == "__main__":
+    main()
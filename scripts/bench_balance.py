@@ -0,0 +1,118 @@
+"""
+Benchmark the school and student balance queries.
+
+Compares the previous five-query implementation with the single-statement
+one and reports p50/p99 latency. Seeding clears existing data:
+    docker compose run --rm app python -m scripts.bench_balance --invoices 1000000
+    docker compose run --rm app python -m scripts.bench_balance --skip-seed
+"""
+
+import argparse
+import random
+import statistics
+import time
+from collections.abc import Callable
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.db.database import Base, engine, SessionLocal
+from app.db.models import School, Student
+from app.logging_config import setup_logging, get_logger
+from app.schemas import BalanceResponse, InvoiceResponse, PaymentResponse
+from app.services import school as school_service
+from app.services import student as student_service
+from scripts.bench_data import add_seed_arguments, seed_from_args
+
+logger = get_logger(__name__)
+
+
+def legacy_school_balance(db: Session, school_id: int) -> BalanceResponse:
+    """The original implementation: one round trip per piece of the summary."""
+    total_invoiced = school_service.get_total_invoiced_for_school(db, school_id)
+    total_paid = school_service.get_total_paid_for_school(db, school_id)
+    return BalanceResponse(
+        total_invoiced_cents=total_invoiced,
+        total_paid_cents=total_paid,
+        total_pending_cents=total_invoiced - total_paid,
+        currency=school_service.get_currency_for_school(db, school_id),
+        invoices=[
+            InvoiceResponse.model_validate(inv)
+            for inv in school_service.get_unpaid_invoices_for_school(db, school_id)
+        ],
+        payments=[
+            PaymentResponse.model_validate(pay)
+            for pay in school_service.get_recent_payments_for_school(db, school_id)
+        ],
+    )
+
+
+def legacy_student_balance(db: Session, student_id: int) -> BalanceResponse:
+    """The original implementation: one round trip per piece of the summary."""
+    total_invoiced = student_service.get_total_invoiced_for_student(db, student_id)
+    total_paid = student_service.get_total_paid_for_student(db, student_id)
+    return BalanceResponse(
+        total_invoiced_cents=total_invoiced,
+        total_paid_cents=total_paid,
+        total_pending_cents=total_invoiced - total_paid,
+        currency=student_service.get_currency_for_student(db, student_id),
+        invoices=[
+            InvoiceResponse.model_validate(inv)
+            for inv in student_service.get_unpaid_invoices_for_student(db, student_id)
+        ],
+        payments=[
+            PaymentResponse.model_validate(pay)
+            for pay in student_service.get_recent_payments_for_student(db, student_id)
+        ],
+    )
+
+
+def measure(db: Session, fn: Callable[[Session, int], BalanceResponse], ids: list[int]) -> list[float]:
+    """Return the latency in milliseconds of fn for every id."""
+    timings = []
+    for entity_id in ids:
+        start = time.perf_counter()
+        fn(db, entity_id)
+        timings.append((time.perf_counter() - start) * 1000)
+        db.rollback()
+    return timings
+
+
+def report(name: str, timings: list[float]) -> None:
+    percentiles = statistics.quantiles(timings, n=100)
+    logger.info("%-28s p50=%8.2f ms  p99=%8.2f ms", name, percentiles[49], percentiles[98])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_seed_arguments(parser)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the data already in the database")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_logging()
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if not args.skip_seed:
+            seed_from_args(db, args)
+
+        school_ids = [row[0] for row in db.query(School.id).all()]
+        max_student_id = db.query(func.max(Student.id)).scalar()
+        schools = [random.choice(school_ids) for _ in range(args.iterations)]
+        students = [random.randint(1, max_student_id) for _ in range(args.iterations)]
+
+        # Warm up caches so both variants see the same buffer state.
+        measure(db, school_service.get_school_balance, schools[:10])
+        measure(db, student_service.get_student_balance, students[:10])
+
+        report("school balance (5 queries)", measure(db, legacy_school_balance, schools))
+        report("school balance (1 query)", measure(db, school_service.get_school_balance, schools))
+        report("student balance (5 queries)", measure(db, legacy_student_balance, students))
+        report("student balance (1 query)", measure(db, student_service.get_student_balance, students))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark bulk invoice creation.
+
+Validates and inserts N invoices through the bulk service on the sync and
+async stacks, and compares them with creating a sample one row at a time.
+Adds its own school, student and invoices; existing data is kept:
+    docker compose run --rm app python -m scripts.bench_bulk_invoices --invoices 50000
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime
+
+from app.db.database import AsyncSessionLocal, Base, SessionLocal, async_engine, engine
+from app.db.models import School, Student, User
+from app.logging_config import setup_logging, get_logger
+from app.schemas import BulkMode, InvoiceCreate
+from app.services import invoice as invoice_service
+
+logger = get_logger(__name__)
+
+
+def seed_student() -> int:
+    now = datetime.now()
+    suffix = uuid.uuid4().hex[:8]
+    with SessionLocal() as db:
+        school = School(name=f"Bench {suffix}", country="US", tax_id=suffix, created_at=now, updated_at=now)
+        db.add(school)
+        db.flush()
+        student = Student(
+            identifier=f"BENCH-{suffix}",
+            name="Bench Student",
+            email=f"bench-{suffix}@example.com",
+            school_id=school.id,
+            created_at=now,
+            updated_at=now,
+        )
+        db.add(student)
+        db.commit()
+        return student.id
+
+
+def payload(student_id: int, count: int) -> list[dict]:
+    """Request rows as they arrive in a JSON body."""
+    prefix = uuid.uuid4().hex[:8]
+    return [
+        {
+            "invoice_number": f"BULK-{prefix}-{i}",
+            "amount_in_cents": 10000,
+            "currency": "USD",
+            "issue_date": "2024-01-01T00:00:00",
+            "due_date": "2024-02-01T00:00:00",
+            "description": "Monthly fee",
+            "student_id": student_id,
+        }
+        for i in range(count)
+    ]
+
+
+def report(label: str, count: int, elapsed: float) -> None:
+    logger.info("%-8s %6d invoices in %.2f s: %.0f invoices/s", label, count, elapsed, count / elapsed)
+
+
+def bench_per_row(student_id: int, count: int, admin: User) -> None:
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        for row in payload(student_id, count):
+            invoice_service.create_invoice(db, InvoiceCreate.model_validate(row), admin)
+    report("per-row", count, time.perf_counter() - start)
+
+
+def bench_sync(student_id: int, count: int, admin: User) -> None:
+    rows = payload(student_id, count)
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        invoices = [InvoiceCreate.model_validate(row) for row in rows]
+        invoice_service.bulk_create_invoices(db, invoices, admin, BulkMode.ATOMIC)
+    report("sync", count, time.perf_counter() - start)
+
+
+async def bench_async(student_id: int, count: int, admin: User) -> None:
+    rows = payload(student_id, count)
+    start = time.perf_counter()
+    async with AsyncSessionLocal() as session:
+        invoices = [InvoiceCreate.model_validate(row) for row in rows]
+        await session.run_sync(invoice_service.bulk_create_invoices, invoices, admin, BulkMode.ATOMIC)
+    report("async", count, time.perf_counter() - start)
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--invoices", type=int, default=50000)
+    parser.add_argument("--per-row", type=int, default=1000, help="Invoices created one at a time")
+    args = parser.parse_args()
+
+    setup_logging()
+    Base.metadata.create_all(bind=engine)
+    student_id = seed_student()
+    # The service only reads is_admin; no user row is needed.
+    admin = User(is_admin=True)
+
+    bench_per_row(student_id, args.per_row, admin)
+    bench_sync(student_id, args.invoices, admin)
+    asyncio.run(bench_async(student_id, args.invoices, admin))
+
+
+if __name__ == "__main__":
+    main()
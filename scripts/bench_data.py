@@ -0,0 +1,144 @@
+"""
+Set-based seeding of large datasets for benchmarks.
+
+Unlike scripts.seed_data, rows are generated inside Postgres with
+generate_series, so millions of rows take seconds instead of hours.
+
+Running this module clears existing data:
+    docker compose run --rm app python -m scripts.bench_data --invoices 1000000
+"""
+
+import argparse
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db.database import Base, engine, SessionLocal
+from app.logging_config import setup_logging, get_logger
+from app.services.payment_allocation import repair_invoice_paid_cents, repair_payment_allocated_cents
+
+logger = get_logger(__name__)
+
+
+def seed_bulk(
+    db: Session,
+    schools: int = 100,
+    students: int = 50_000,
+    invoices: int = 1_000_000,
+    payments: int = 500_000,
+) -> None:
+    """Replace all data with a synthetic dataset of the given size."""
+    db.execute(text("TRUNCATE payment_allocation, payment, invoice, student, school RESTART IDENTITY CASCADE"))
+    db.execute(
+        text(
+            """
+            INSERT INTO school (name, country, tax_id, created_at, updated_at)
+            SELECT 'Bench School ' || g, 'MX', 'TAX' || g, now(), now()
+            FROM generate_series(1, :n) AS g
+            """
+        ),
+        {"n": schools},
+    )
+    db.execute(
+        text(
+            """
+            INSERT INTO student (identifier, name, email, school_id, created_at, updated_at)
+            SELECT 'BENCH-' || g, 'Student ' || g, 'student' || g || '@bench.example.com',
+                   1 + g % :schools, now(), now()
+            FROM generate_series(1, :n) AS g
+            """
+        ),
+        {"n": students, "schools": schools},
+    )
+    db.execute(
+        text(
+            """
+            INSERT INTO invoice (invoice_number, amount_in_cents, currency, status, issue_date,
+                                 due_date, description, student_id, created_at, updated_at)
+            SELECT 'BENCH-INV-' || g,
+                   (1 + g % 20) * 5000,
+                   'MXN',
+                   (ARRAY['pending', 'pending', 'paid', 'overdue', 'partially_paid', 'draft'])[1 + g % 6],
+                   now() - make_interval(days => g % 180),
+                   now() - make_interval(days => g % 180) + interval '30 days',
+                   'Monthly tuition fee',
+                   1 + g % :students,
+                   now() - make_interval(days => g % 180),
+                   now()
+            FROM generate_series(1, :n) AS g
+            """
+        ),
+        {"n": invoices, "students": students},
+    )
+    db.execute(
+        text(
+            """
+            INSERT INTO payment (amount_in_cents, currency, status, payment_method, student_id,
+                                 created_at, updated_at)
+            SELECT (1 + g % 20) * 5000,
+                   'MXN',
+                   (ARRAY['completed', 'completed', 'completed', 'pending', 'failed'])[1 + g % 5],
+                   (ARRAY['cash', 'card', 'bank_transfer'])[1 + g % 3],
+                   1 + g % :students,
+                   now() - make_interval(mins => g % 259200),
+                   now()
+            FROM generate_series(1, :n) AS g
+            """
+        ),
+        {"n": payments, "students": students},
+    )
+    # Payment g and invoice g belong to the same student, so pair them up.
+    db.execute(
+        text(
+            """
+            INSERT INTO payment_allocation (payment_id, invoice_id, amount_in_cents, created_at)
+            SELECT payment.id, payment.id, payment.amount_in_cents, payment.created_at
+            FROM payment
+            WHERE payment.status = 'completed' AND payment.id % 2 = 0 AND payment.id <= :invoices
+            """
+        ),
+        {"invoices": invoices},
+    )
+    repair_invoice_paid_cents(db)
+    repair_payment_allocated_cents(db)
+    db.execute(text("ANALYZE"))
+    db.commit()
+    logger.info(
+        "Seeded %d schools, %d students, %d invoices, %d payments",
+        schools, students, invoices, payments,
+    )
+
+
+def add_seed_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--schools", type=int, default=100)
+    parser.add_argument("--students", type=int, default=50_000)
+    parser.add_argument("--invoices", type=int, default=1_000_000)
+    parser.add_argument("--payments", type=int, default=500_000)
+
+
+def seed_from_args(db: Session, args: argparse.Namespace) -> None:
+    seed_bulk(
+        db,
+        schools=args.schools,
+        students=args.students,
+        invoices=args.invoices,
+        payments=args.payments,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_seed_arguments(parser)
+    args = parser.parse_args()
+
+    setup_logging()
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        seed_from_args(db, args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
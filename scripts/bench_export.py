@@ -0,0 +1,84 @@
+"""
+Benchmark the streaming invoice export.
+
+Exports every invoice as CSV and NDJSON through the sync and async row
+streams, discarding the output, and reports throughput and the process's
+peak RSS. Seeding clears existing data:
+    docker compose run --rm app python -m scripts.bench_export --invoices 5000000
+    docker compose run --rm app python -m scripts.bench_export --skip-seed
+"""
+
+import argparse
+import asyncio
+import resource
+import time
+
+from app.db.database import (
+    AsyncRowStream,
+    AsyncSessionLocal,
+    Base,
+    RowStream,
+    SessionLocal,
+    SyncRowStream,
+    async_engine,
+    engine,
+)
+from app.export import export_lines
+from app.logging_config import setup_logging, get_logger
+from app.schemas import ExportFormat
+from app.services import invoice as invoice_service
+from scripts.bench_data import add_seed_arguments, seed_from_args
+
+logger = get_logger(__name__)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def open_async_session():
+    return AsyncSessionLocal()
+
+
+async def bench(label: str, stream: RowStream, export_format: ExportFormat) -> None:
+    statement = invoice_service.get_invoice_export_statement()
+    lines = 0
+    size = 0
+    start = time.perf_counter()
+    async for chunk in export_lines(stream, statement, export_format):
+        lines += chunk.count("\n")
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "%-5s %-6s %d lines, %.0f MB in %.1f s (%.0f rows/s), peak RSS %.0f MB",
+        label, export_format.value, lines, size / 2**20, elapsed, lines / elapsed, peak_rss_mb(),
+    )
+
+
+async def run() -> None:
+    for export_format in ExportFormat:
+        await bench("sync", SyncRowStream(SessionLocal), export_format)
+        await bench("async", AsyncRowStream(open_async_session), export_format)
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_seed_arguments(parser)
+    parser.set_defaults(invoices=5_000_000)
+    parser.add_argument("--skip-seed", action="store_true", help="Export the existing data")
+    args = parser.parse_args()
+
+    setup_logging()
+    if not args.skip_seed:
+        Base.metadata.create_all(bind=engine)
+        with SessionLocal() as db:
+            seed_from_args(db, args)
+
+    logger.info("Peak RSS before exporting: %.0f MB", peak_rss_mb())
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
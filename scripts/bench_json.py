@@ -0,0 +1,128 @@
+"""
+Benchmark encoding response bodies to JSON.
+
+Compares FastAPI's JSONResponse (json.dumps) with FastJSONResponse (orjson)
+on the content FastAPI hands to the response class for a 1,000-invoice page
+and for a balance listing 1,000 invoices and 1,000 payments, and the
+previous json.dumps encoder with dumps on the projected rows the list
+endpoints encode directly. Every pair is checked to produce identical bytes.
+No database is needed:
+    docker compose run --rm app python -m scripts.bench_json
+    docker compose run --rm app python -m scripts.bench_json --items 10000
+"""
+
+import argparse
+import json
+import statistics
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.db.models import InvoiceStatus, PaymentMethod, PaymentStatus
+from app.logging_config import setup_logging, get_logger
+from app.schemas import BalanceResponse, InvoiceResponse, PaginatedResponse, PaymentResponse
+from app.serialization import FastJSONResponse, dumps, response_fields, row_dicts
+
+logger = get_logger(__name__)
+
+START = datetime(2024, 1, 1, 8, 30)
+
+
+def invoice_rows(count: int) -> list[tuple]:
+    return [
+        (
+            i, f"INV-{i:08d}", 10_000 + i, "USD", InvoiceStatus.PENDING,
+            START + timedelta(minutes=i), START + timedelta(days=30, microseconds=i),
+            "Tuition – matrícula" if i % 2 else None, i % 500 + 1,
+            START + timedelta(seconds=i, microseconds=123456), START + timedelta(seconds=i),
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def payment_rows(count: int) -> list[tuple]:
+    return [
+        (
+            i, 5_000 + i, "USD", PaymentStatus.COMPLETED, PaymentMethod.BANK_TRANSFER, i % 500 + 1,
+            START + timedelta(seconds=i, microseconds=654321), START + timedelta(seconds=i),
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def stdlib_dumps(content: Any) -> bytes:
+    """The encoder dumps replaced: FastAPI's json.dumps settings with datetimes in isoformat."""
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=datetime.isoformat
+    ).encode()
+
+
+def cases(count: int) -> dict[str, tuple[Any, Callable[[Any], bytes], Callable[[Any], bytes]]]:
+    """Content for each case with its old and new encoder."""
+    invoices = row_dicts(invoice_rows(count), response_fields(InvoiceResponse))
+    payments = row_dicts(payment_rows(count), response_fields(PaymentResponse))
+    page_adapter = TypeAdapter(PaginatedResponse[InvoiceResponse])
+    page = page_adapter.dump_python(
+        page_adapter.validate_python({
+            "items": invoices, "total": count, "limit": count, "offset": 0,
+            "pages": 1, "has_more": False, "next_cursor": None,
+        }),
+        mode="json",
+    )
+    balance = BalanceResponse(
+        total_invoiced_cents=sum(invoice["amount_in_cents"] for invoice in invoices),
+        total_paid_cents=sum(payment["amount_in_cents"] for payment in payments),
+        total_pending_cents=0,
+        currency="USD",
+        invoices=invoices,
+        payments=payments,
+    ).model_dump(mode="json")
+    projected = {"items": invoices, "total": count, "limit": count, "offset": 0, "pages": 1,
+                 "has_more": False, "next_cursor": None}
+
+    def response_body(response_class):
+        return lambda content: response_class(content).body
+
+    return {
+        "invoice page": (page, response_body(JSONResponse), response_body(FastJSONResponse)),
+        "balance": (balance, response_body(JSONResponse), response_body(FastJSONResponse)),
+        "projected page": (projected, stdlib_dumps, dumps),
+    }
+
+
+def measure(encode: Callable[[Any], bytes], content: Any, iterations: int) -> tuple[float, float]:
+    """p50 and p99 in milliseconds."""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        encode(content)
+        timings.append((time.perf_counter() - start) * 1000)
+    quantiles = statistics.quantiles(timings, n=100)
+    return quantiles[49], quantiles[98]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=1000, help="Invoices per page, and in the balance")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_logging()
+    for name, (content, old, new) in cases(args.items).items():
+        body = new(content)
+        if old(content) != body:
+            raise SystemExit(f"{name}: encoders disagree")
+        old_p50, old_p99 = measure(old, content, args.iterations)
+        new_p50, new_p99 = measure(new, content, args.iterations)
+        logger.info(
+            "%-15s json.dumps p50=%6.2f ms p99=%6.2f ms  orjson p50=%6.2f ms p99=%6.2f ms  %4.1fx  (%d KB)",
+            name, old_p50, old_p99, new_p50, new_p99, old_p50 / new_p50, len(body) // 1024,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark rendering a page of invoices to JSON.
+
+Compares loading Invoice entities and validating them through
+PaginatedResponse[InvoiceResponse] (what the list endpoints did, mirroring
+FastAPI's response_model handling) with selecting the InvoiceResponse
+columns and encoding the rows directly. Reports p50/p99 of the fetch and of
+the whole request body. Seeding clears existing data:
+    docker compose run --rm app python -m scripts.bench_serialization --invoices 100000
+    docker compose run --rm app python -m scripts.bench_serialization --skip-seed
+"""
+
+import argparse
+import json
+import statistics
+import time
+from collections.abc import Callable
+
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+from app.db.database import Base, SessionLocal, engine
+from app.db.models import Invoice
+from app.logging_config import setup_logging, get_logger
+from app.pagination import build_paginated_json, encode_cursor, fetch_page
+from app.schemas import CountMode, InvoiceResponse, PaginatedResponse
+from app.serialization import response_fields
+from app.services.invoice import INVOICE_COLUMNS
+from scripts.bench_data import add_seed_arguments, seed_from_args
+
+logger = get_logger(__name__)
+
+INVOICE_PAGE = TypeAdapter(PaginatedResponse[InvoiceResponse])
+
+
+def orm_page(db: Session, page_size: int) -> tuple[float, bytes]:
+    start = time.perf_counter()
+    items, total = fetch_page(db.query(Invoice), Invoice, limit=page_size + 1, count=CountMode.NONE)
+    fetched = time.perf_counter() - start
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    page = INVOICE_PAGE.validate_python(
+        {
+            "items": items, "total": total, "limit": page_size, "offset": 0, "pages": None,
+            "has_more": has_more, "next_cursor": encode_cursor(items[-1].id) if has_more else None,
+        },
+        from_attributes=True,
+    )
+    content = INVOICE_PAGE.dump_python(page, mode="json")
+    body = json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+    return fetched, body
+
+
+def projected_page(db: Session, page_size: int) -> tuple[float, bytes]:
+    start = time.perf_counter()
+    rows, total = fetch_page(db.query(*INVOICE_COLUMNS), Invoice, limit=page_size + 1, count=CountMode.NONE)
+    fetched = time.perf_counter() - start
+    return fetched, build_paginated_json(rows, response_fields(InvoiceResponse), total, page_size, 0).body
+
+
+def measure(fn: Callable[[Session, int], tuple[float, bytes]], page_size: int, iterations: int) -> tuple:
+    """Fetch and total timings in milliseconds, each run on a fresh session."""
+    fetch_timings = []
+    total_timings = []
+    for _ in range(iterations):
+        with SessionLocal() as db:
+            start = time.perf_counter()
+            fetched, body = fn(db, page_size)
+            total_timings.append((time.perf_counter() - start) * 1000)
+            fetch_timings.append(fetched * 1000)
+    return fetch_timings, total_timings, len(body)
+
+
+def report(name: str, fetch_timings: list[float], total_timings: list[float], size: int) -> None:
+    fetch = statistics.quantiles(fetch_timings, n=100)
+    total = statistics.quantiles(total_timings, n=100)
+    logger.info(
+        "%-16s fetch p50=%7.2f ms  total p50=%7.2f ms  p99=%7.2f ms  (%d KB)",
+        name, fetch[49], total[49], total[98], size // 1024,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_seed_arguments(parser)
+    parser.set_defaults(invoices=100_000)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the data already in the database")
+    parser.add_argument("--page-size", type=int, default=10_000)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_logging()
+    if not args.skip_seed:
+        Base.metadata.create_all(bind=engine)
+        with SessionLocal() as db:
+            seed_from_args(db, args)
+
+    with SessionLocal() as db:
+        orm_body = orm_page(db, args.page_size)[1]
+    with SessionLocal() as db:
+        projected_body = projected_page(db, args.page_size)[1]
+    if orm_body != projected_body:
+        raise SystemExit("Projected page is not byte for byte the ORM page")
+
+    report("ORM + pydantic", *measure(orm_page, args.page_size, args.iterations))
+    report("projected rows", *measure(projected_page, args.page_size, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
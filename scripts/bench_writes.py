@@ -0,0 +1,229 @@
+"""
+Benchmark write throughput per endpoint.
+
+For each write endpoint, compares the previous implementation (access check
+lookup, load, mutate, commit, refresh) with the single INSERT/UPDATE ...
+RETURNING statement, running the service calls the route makes one after
+another as a school user (admin for schools and users). Reports writes/sec
+and SQL statements per write. Each write opens and closes its own session,
+as the API does. Adds its own school, students, user, invoice and payment;
+existing data is kept:
+    docker compose run --rm app python -m scripts.bench_writes --writes 2000
+"""
+
+import argparse
+import time
+import uuid
+from collections.abc import Callable
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.auth import Principal
+from app.db.database import Base, SessionLocal, engine
+from app.db.models import Invoice, Payment, School, Student, User
+from app.logging_config import setup_logging, get_logger
+from app.schemas import (
+    InvoiceCreate,
+    InvoiceUpdate,
+    PaymentCreate,
+    PaymentMethod,
+    PaymentUpdate,
+    SchoolUpdate,
+    StudentUpdate,
+    UserUpdate,
+)
+from app.services import invoice as invoice_service
+from app.services import payment as payment_service
+from app.services import school as school_service
+from app.services import student as student_service
+from app.services import user as user_service
+from app.services.balance import bump_balance_versions
+
+logger = get_logger(__name__)
+
+
+def legacy_update(db: Session, instance, data, bump_student_ids=None):
+    """The previous update services: mutate the loaded instance, commit and refresh."""
+    for field, value in data.model_dump(exclude_unset=True, mode="json").items():
+        setattr(instance, field, value)
+    instance.updated_at = datetime.now()
+    if bump_student_ids is not None:
+        bump_balance_versions(db, bump_student_ids)
+    db.commit()
+    db.refresh(instance)
+    return instance
+
+
+def legacy_create(db: Session, instance, student_id: int | None = None):
+    """The previous create services: add, commit and refresh."""
+    db.add(instance)
+    if student_id is not None:
+        bump_balance_versions(db, [student_id])
+    db.commit()
+    db.refresh(instance)
+    return instance
+
+
+def seed(suffix: str) -> dict[str, int]:
+    now = datetime.now()
+    with SessionLocal() as db:
+        school = School(name=f"Bench {suffix}", country="US", tax_id=suffix, created_at=now, updated_at=now)
+        db.add(school)
+        db.flush()
+        student = Student(
+            identifier=f"WRITES-{suffix}", name="Bench Student", email=f"writes-{suffix}@example.com",
+            school_id=school.id, created_at=now, updated_at=now,
+        )
+        user = User(
+            email=f"writes-{suffix}@example.com", hashed_password="-", school_id=school.id,
+            created_at=now, updated_at=now,
+        )
+        db.add_all([student, user])
+        db.flush()
+        invoice = Invoice(
+            invoice_number=f"WRITES-{suffix}", amount_in_cents=10000, currency="USD",
+            issue_date=now, due_date=now, student_id=student.id, created_at=now, updated_at=now,
+        )
+        payment = Payment(
+            amount_in_cents=10000, currency="USD", payment_method=PaymentMethod.CARD.value,
+            student_id=student.id, created_at=now, updated_at=now,
+        )
+        db.add_all([invoice, payment])
+        db.commit()
+        return {
+            "school": school.id, "student": student.id, "user": user.id,
+            "invoice": invoice.id, "payment": payment.id,
+        }
+
+
+def endpoints(ids: dict[str, int], suffix: str) -> dict[str, tuple[Callable, Callable]]:
+    """The legacy and current implementation of each endpoint, called with a session and a counter."""
+    user = Principal(id=ids["user"], email="user@example.com", school_id=ids["school"], is_admin=False, token_version=0)
+    now = datetime.now()
+
+    def invoice_create(i: int) -> InvoiceCreate:
+        return InvoiceCreate(
+            invoice_number=f"WRITES-{suffix}-{i}", amount_in_cents=10000, currency="USD",
+            issue_date=now, due_date=now, student_id=ids["student"],
+        )
+
+    def payment_create(i: int) -> PaymentCreate:
+        return PaymentCreate(
+            amount_in_cents=10000 + i, currency="USD", payment_method=PaymentMethod.CARD, student_id=ids["student"],
+        )
+
+    def legacy_create_invoice(db: Session, i: int):
+        data = invoice_create(i)
+        student_service.get_student_by_id_for_user(db, data.student_id, user)
+        values = {**data.model_dump(), "status": data.status.value, "created_at": now, "updated_at": now}
+        return legacy_create(db, Invoice(**values), data.student_id)
+
+    def legacy_create_payment(db: Session, i: int):
+        data = payment_create(i)
+        student_service.get_student_by_id_for_user(db, data.student_id, user)
+        values = {
+            **data.model_dump(), "status": data.status.value, "payment_method": data.payment_method.value,
+            "created_at": now, "updated_at": now,
+        }
+        return legacy_create(db, Payment(**values), data.student_id)
+
+    def legacy_update_invoice(db: Session, i: int):
+        invoice = invoice_service.get_invoice_by_id_for_user(db, ids["invoice"], user)
+        return legacy_update(db, invoice, InvoiceUpdate(amount_in_cents=10000 + i), {invoice.student_id})
+
+    def legacy_update_payment(db: Session, i: int):
+        payment = payment_service.get_payment_by_id_for_user(db, ids["payment"], user)
+        return legacy_update(db, payment, PaymentUpdate(amount_in_cents=10000 + i), {payment.student_id})
+
+    def legacy_update_user(db: Session, i: int):
+        instance = user_service.get_user_by_id(db, ids["user"])
+        school_service.get_school_by_id(db, ids["school"])
+        data = UserUpdate(school_id=ids["school"])
+        instance.token_version += 1
+        return legacy_update(db, instance, data)
+
+    return {
+        "PUT /school": (
+            lambda db, i: legacy_update(
+                db, school_service.get_school_by_id(db, ids["school"]), SchoolUpdate(name=f"Bench {i}")
+            ),
+            lambda db, i: school_service.update_school(db, ids["school"], SchoolUpdate(name=f"Bench {i}")),
+        ),
+        "PUT /student": (
+            lambda db, i: legacy_update(
+                db, student_service.get_student_by_id_for_user(db, ids["student"], user),
+                StudentUpdate(name=f"Student {i}"),
+            ),
+            lambda db, i: student_service.update_student(db, ids["student"], StudentUpdate(name=f"Student {i}"), user),
+        ),
+        "POST /invoice": (
+            lambda db, i: legacy_create_invoice(db, i),
+            lambda db, i: invoice_service.create_invoice(db, invoice_create(-i - 1), user),
+        ),
+        "PUT /invoice": (
+            legacy_update_invoice,
+            lambda db, i: invoice_service.update_invoice(
+                db, ids["invoice"], InvoiceUpdate(amount_in_cents=10000 + i), user
+            ),
+        ),
+        "POST /payment": (
+            legacy_create_payment,
+            lambda db, i: payment_service.create_payment(db, payment_create(i), user),
+        ),
+        "PUT /payment": (
+            legacy_update_payment,
+            lambda db, i: payment_service.update_payment(
+                db, ids["payment"], PaymentUpdate(amount_in_cents=10000 + i), user
+            ),
+        ),
+        "PUT /user": (
+            legacy_update_user,
+            lambda db, i: user_service.update_user(db, ids["user"], UserUpdate(school_id=ids["school"])),
+        ),
+    }
+
+
+def measure(write: Callable[[Session, int], object], writes: int) -> tuple[float, float]:
+    """Writes per second and SQL statements per write."""
+    statements = 0
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        start = time.perf_counter()
+        for i in range(writes):
+            with SessionLocal() as db:
+                if write(db, i) is None:
+                    raise SystemExit("A benchmark write matched no row")
+        elapsed = time.perf_counter() - start
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return writes / elapsed, statements / writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writes", type=int, default=2000, help="Writes per endpoint and implementation")
+    args = parser.parse_args()
+
+    setup_logging()
+    Base.metadata.create_all(bind=engine)
+    suffix = uuid.uuid4().hex[:8]
+    ids = seed(suffix)
+
+    for name, (legacy, current) in endpoints(ids, suffix).items():
+        legacy_rate, legacy_statements = measure(legacy, args.writes)
+        rate, statements = measure(current, args.writes)
+        logger.info(
+            "%-14s before %6.0f writes/s (%.0f statements)  after %6.0f writes/s (%.0f statements)  %.2fx",
+            name, legacy_rate, legacy_statements, rate, statements, rate / legacy_rate,
+        )
+
+
+if __name__ == "__main__":
+    main()
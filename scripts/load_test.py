@@ -0,0 +1,147 @@
+"""
+Load test a running API with many concurrent clients.
+
+Logs in once, then N concurrent clients hit the read endpoints for a fixed
+duration and report requests/sec and latency percentiles. Run it once per
+stack to compare them, e.g. against a server started with DB_ASYNC=true and
+again with DB_ASYNC=false:
+    python -m scripts.load_test --base-url http://localhost:8000 --concurrency 500
+
+With --login-concurrency, extra clients log in continuously during the run,
+to check that read latency holds up during a login storm:
+    python -m scripts.load_test --concurrency 50 --login-concurrency 200
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+from app.logging_config import setup_logging, get_logger
+
+logger = get_logger(__name__)
+
+
+async def login(client: httpx.AsyncClient, email: str, password: str) -> dict:
+    response = await client.post("/token", data={"username": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def discover_ids(client: httpx.AsyncClient, headers: dict, path: str) -> list[int]:
+    response = await client.get(path, params={"limit": 100, "count": "none"}, headers=headers)
+    response.raise_for_status()
+    return [item["id"] for item in response.json()["items"]]
+
+
+async def run_client(
+    client: httpx.AsyncClient,
+    headers: dict,
+    paths: list[str],
+    deadline: float,
+    timings: list[float],
+    errors: list[int],
+) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.get(random.choice(paths), headers=headers)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        except httpx.HTTPError:
+            errors.append(0)
+        timings.append((time.perf_counter() - start) * 1000)
+
+
+async def run_login_client(
+    client: httpx.AsyncClient,
+    credentials: dict,
+    deadline: float,
+    statuses: list[int],
+) -> None:
+    while time.perf_counter() < deadline:
+        try:
+            response = await client.post("/token", data=credentials)
+            statuses.append(response.status_code)
+        except httpx.HTTPError:
+            statuses.append(0)
+
+
+async def load_test(args: argparse.Namespace) -> None:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    # Logins get their own connections so they do not queue behind the readers client-side.
+    login_limits = httpx.Limits(max_connections=max(args.login_concurrency, 1))
+    async with (
+        httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client,
+        httpx.AsyncClient(base_url=args.base_url, limits=login_limits, timeout=args.timeout) as login_client,
+    ):
+        headers = await login(client, args.email, args.password)
+        school_ids = await discover_ids(client, headers, "/school/")
+        student_ids = await discover_ids(client, headers, "/student/")
+        paths = (
+            ["/invoice/?limit=20&count=none", "/payment/?limit=20&count=none"]
+            + [f"/school/{school_id}" for school_id in school_ids[:20]]
+            + [f"/student/{student_id}" for student_id in student_ids[:20]]
+            + [f"/student/{student_id}/balance" for student_id in student_ids[:20]]
+        )
+
+        timings: list[float] = []
+        errors: list[int] = []
+        login_statuses: list[int] = []
+        credentials = {"username": args.email, "password": args.password}
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(
+            *(
+                run_client(client, headers, paths, deadline, timings, errors)
+                for _ in range(args.concurrency)
+            ),
+            *(
+                run_login_client(login_client, credentials, deadline, login_statuses)
+                for _ in range(args.login_concurrency)
+            ),
+        )
+        elapsed = time.perf_counter() - start
+
+    percentiles = statistics.quantiles(timings, n=100)
+    logger.info(
+        "%d requests in %.1f s: %.0f req/s, %d errors",
+        len(timings), elapsed, len(timings) / elapsed, len(errors),
+    )
+    logger.info(
+        "latency p50=%.1f ms  p95=%.1f ms  p99=%.1f ms  max=%.1f ms",
+        percentiles[49], percentiles[94], percentiles[98], max(timings),
+    )
+    if login_statuses:
+        logger.info(
+            "login storm: %d logins, %d succeeded, %d rejected with 503, %d other errors",
+            len(login_statuses),
+            login_statuses.count(200),
+            login_statuses.count(503),
+            sum(1 for code in login_statuses if code not in (200, 503)),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", default="admin@admin.com")
+    parser.add_argument("--password", default="admin1234")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument(
+        "--login-concurrency", type=int, default=0,
+        help="Extra clients logging in continuously during the run, to simulate a login storm",
+    )
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    args = parser.parse_args()
+
+    setup_logging()
+    asyncio.run(load_test(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Recompute the denormalized allocation totals and fix any drift.
+
+invoice.paid_cents and payment.allocated_cents are maintained incrementally
+by the allocation services; this job recomputes them from the allocations in
+set-based statements and logs every row that had drifted.
+
+Usage:
+    docker compose run --rm app python -m scripts.repair_totals [--dry-run]
+"""
+
+import argparse
+
+from app.db.database import SessionLocal
+from app.logging_config import setup_logging, get_logger
+from app.services.payment_allocation import repair_invoice_paid_cents, repair_payment_allocated_cents
+
+logger = get_logger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dry-run", action="store_true", help="Report drift without fixing it")
+    args = parser.parse_args()
+
+    setup_logging()
+    db = SessionLocal()
+    try:
+        invoice_drift = repair_invoice_paid_cents(db, dry_run=args.dry_run)
+        payment_drift = repair_payment_allocated_cents(db, dry_run=args.dry_run)
+    finally:
+        db.close()
+
+    for invoice_id, stored_cents, actual_cents in invoice_drift:
+        logger.warning(
+            "Invoice %d paid_cents drifted: stored %d, actual %d",
+            invoice_id, stored_cents, actual_cents,
+        )
+    for payment_id, stored_cents, actual_cents in payment_drift:
+        logger.warning(
+            "Payment %d allocated_cents drifted: stored %d, actual %d",
+            payment_id, stored_cents, actual_cents,
+        )
+    action = "Found" if args.dry_run else "Repaired"
+    logger.info(
+        "%s %d drifted invoices and %d drifted payments",
+        action, len(invoice_drift), len(payment_drift),
+    )
+
+
+if __name__ == "__main__":
+    main()
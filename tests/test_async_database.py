@@ -0,0 +1,160 @@
+from app.db.models import InvoiceStatus
+
+
+class TestAsyncDatabase:
+    def test_login(self, async_client, db_helpers):
+        db_helpers.create_user(email="async@example.com", password="password123")
+
+        response = async_client.post(
+            "/token", data={"username": "async@example.com", "password": "password123"}
+        )
+
+        assert response.status_code == 200
+        assert response.json()["token_type"] == "bearer"
+
+    def test_login_wrong_password(self, async_client, db_helpers):
+        db_helpers.create_user(email="async@example.com", password="password123")
+
+        response = async_client.post(
+            "/token", data={"username": "async@example.com", "password": "wrong"}
+        )
+
+        assert response.status_code == 401
+
+    def test_list_invoices_school_scoped(self, async_client, db_helpers, school_user, school_user_headers):
+        _, school = school_user
+        other_school = db_helpers.create_school(name="Other School")
+        student = db_helpers.create_student(school)
+        other_student = db_helpers.create_student(other_school, identifier="ID-002", email="other@example.com")
+        db_helpers.create_invoice(student, invoice_number="INV-001")
+        db_helpers.create_invoice(other_student, invoice_number="INV-002")
+
+        response = async_client.get("/invoice/", headers=school_user_headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 1
+        assert data["items"][0]["invoice_number"] == "INV-001"
+
+    def test_create_and_update_student(self, async_client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+
+        response = async_client.post(
+            "/student/",
+            json={
+                "identifier": "ID-100",
+                "name": "Async Student",
+                "email": "async.student@example.com",
+                "school_id": school.id,
+            },
+            headers=admin_headers,
+        )
+        assert response.status_code == 201
+        student_id = response.json()["id"]
+
+        response = async_client.put(
+            f"/student/{student_id}", json={"name": "Renamed"}, headers=admin_headers
+        )
+
+        assert response.status_code == 200
+        assert response.json()["name"] == "Renamed"
+
+    def test_update_invoice_dates_and_status(self, async_client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student)
+
+        response = async_client.put(
+            f"/invoice/{invoice.id}",
+            json={"due_date": "2030-06-30T12:00:00", "status": InvoiceStatus.OVERDUE.value},
+            headers=admin_headers,
+        )
+
+        assert response.status_code == 200
+        assert response.json()["due_date"] == "2030-06-30T12:00:00"
+        assert response.json()["status"] == InvoiceStatus.OVERDUE.value
+
+    def test_allocation_updates_invoice_and_balance(self, async_client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000)
+
+        response = async_client.post(
+            "/payment-allocation/",
+            json={"payment_id": payment.id, "invoice_id": invoice.id, "amount_in_cents": 10000},
+            headers=admin_headers,
+        )
+        assert response.status_code == 201
+
+        response = async_client.get(f"/invoice/{invoice.id}", headers=admin_headers)
+        assert response.json()["status"] == InvoiceStatus.PAID.value
+
+        response = async_client.get(f"/student/{student.id}/balance", headers=admin_headers)
+        assert response.status_code == 200
+        assert response.json()["total_paid_cents"] == 10000
+        assert response.json()["total_pending_cents"] == 0
+
+    def test_overallocation_rejected(self, async_client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
+        payment = db_helpers.create_payment(student, amount_in_cents=5000)
+
+        response = async_client.post(
+            "/payment-allocation/",
+            json={"payment_id": payment.id, "invoice_id": invoice.id, "amount_in_cents": 6000},
+            headers=admin_headers,
+        )
+
+        assert response.status_code == 400
+
+    def test_bulk_create_invoices(self, async_client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        db_helpers.create_invoice(student, invoice_number="TAKEN")
+        rows = [
+            {
+                "invoice_number": number,
+                "amount_in_cents": 10000,
+                "currency": "USD",
+                "issue_date": "2024-01-01T00:00:00",
+                "due_date": "2024-02-01T00:00:00",
+                "student_id": student.id,
+            }
+            for number in ("NEW-1", "TAKEN", "NEW-2")
+        ]
+
+        response = async_client.post("/invoice/bulk?mode=best_effort", json=rows, headers=admin_headers)
+
+        assert response.status_code == 201
+        data = response.json()
+        assert data["created"] == 2
+        assert data["results"][1]["error"] == "Invoice number already exists"
+
+    def test_export_invoices(self, async_client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        for i in range(3):
+            db_helpers.create_invoice(student, invoice_number=f"INV-{i}")
+
+        response = async_client.get("/invoice/export", headers=admin_headers)
+
+        assert response.status_code == 200
+        lines = response.text.splitlines()
+        assert len(lines) == 4
+        assert lines[1].split(",")[1] == "INV-0"
+
+    def test_auto_allocate_payment(self, async_client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        for i in range(3):
+            db_helpers.create_invoice(student, invoice_number=f"INV-{i}", amount_in_cents=3000)
+        payment = db_helpers.create_payment(student, amount_in_cents=7000)
+
+        response = async_client.post(f"/payment/{payment.id}/auto-allocate", headers=admin_headers)
+
+        assert response.status_code == 201
+        assert [item["amount_in_cents"] for item in response.json()] == [3000, 3000, 1000]
+        response = async_client.get(f"/student/{student.id}/balance", headers=admin_headers)
+        assert response.json()["total_paid_cents"] == 7000
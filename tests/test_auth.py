@@ -1,3 +1,27 @@
+import asyncio
+
+from sqlalchemy import event
+
+from app.auth import create_access_token, decode_token, password_hasher, token_versions
+from app.db.database import SyncDatabase
+from app.dependencies import get_read_database
+from app.services import user as user_service
+from tests.conftest import engine, get_auth_header
+
+
+class LaggingReplica:
+    """A read database that has not replayed token version bumps yet."""
+
+    def __init__(self, session, stale_token_version: int):
+        self.database = SyncDatabase(session)
+        self.stale_token_version = stale_token_version
+
+    async def run(self, fn, *args, **kwargs):
+        if fn is user_service.get_token_version:
+            return self.stale_token_version
+        return await self.database.run(fn, *args, **kwargs)
+
+
 class TestLogin:
     def test_login_success(self, client, db_helpers):
         db_helpers.create_user(email="test@example.com", password="testpass123")
@@ -32,6 +56,19 @@ class TestLogin:
         assert response.status_code == 401
         assert response.json()["detail"] == "Incorrect email or password"
 
+    def test_login_returns_503_when_password_hashing_is_saturated(self, client, db_helpers, monkeypatch):
+        db_helpers.create_user(email="test@example.com", password="testpass123")
+        monkeypatch.setattr(password_hasher, "_slots", asyncio.Semaphore(0))
+        monkeypatch.setattr(password_hasher, "queue_timeout", 0.01)
+
+        response = client.post(
+            "/token",
+            data={"username": "test@example.com", "password": "testpass123"},
+        )
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
     def test_login_admin_user(self, client, db_helpers):
         db_helpers.create_admin_user(email="admin@test.com", password="adminpass")
 
@@ -117,3 +154,91 @@ class TestSchoolUserAccess:
 
         assert response.status_code == 201
 
+
+class TestTokenClaims:
+    def test_login_token_carries_identity_claims(self, client, db_helpers):
+        school = db_helpers.create_school()
+        user = db_helpers.create_user(email="test@example.com", password="testpass123", school=school)
+
+        response = client.post(
+            "/token",
+            data={"username": "test@example.com", "password": "testpass123"},
+        )
+
+        payload = decode_token(response.json()["access_token"])
+        assert payload["sub"] == "test@example.com"
+        assert payload["uid"] == user.id
+        assert payload["school_id"] == school.id
+        assert payload["is_admin"] is False
+        assert payload["ver"] == 0
+
+    def test_authenticated_requests_skip_user_lookup(self, client, db_helpers, admin_headers):
+        client.get("/school/", headers=admin_headers)
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            response = client.get("/school/", headers=admin_headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert response.status_code == 200
+        assert not [statement for statement in statements if 'FROM "user"' in statement]
+
+    def test_token_without_identity_claims_rejected(self, client, admin_user):
+        token = create_access_token(data={"sub": admin_user.email})
+
+        response = client.get("/school/", headers={"Authorization": f"Bearer {token}"})
+
+        assert response.status_code == 401
+
+    def test_token_revoked_when_user_updated(self, client, db_helpers, admin_headers):
+        user = db_helpers.create_user(email="test@example.com", is_admin=True)
+        headers = get_auth_header(user)
+        assert client.get("/school/", headers=headers).status_code == 200
+
+        client.put(f"/user/{user.id}", json={"password": "newpassword"}, headers=admin_headers)
+
+        assert client.get("/school/", headers=headers).status_code == 401
+        db_helpers.db.refresh(user)
+        assert client.get("/school/", headers=get_auth_header(user)).status_code == 200
+
+    def test_token_rejected_after_user_deleted(self, client, db_helpers, admin_headers):
+        user = db_helpers.create_user(email="test@example.com", is_admin=True)
+        headers = get_auth_header(user)
+        assert client.get("/school/", headers=headers).status_code == 200
+
+        client.delete(f"/user/{user.id}", headers=admin_headers)
+
+        assert client.get("/school/", headers=headers).status_code == 401
+
+    def test_revocation_from_another_worker_applies_after_cache_expiry(self, client, db_helpers):
+        user = db_helpers.create_user(email="test@example.com", is_admin=True)
+        headers = get_auth_header(user)
+        assert client.get("/school/", headers=headers).status_code == 200
+
+        # Another worker bumps the version; this one still trusts its cached copy.
+        user.token_version += 1
+        db_helpers.db.commit()
+        assert client.get("/school/", headers=headers).status_code == 200
+
+        token_versions.invalidate(user.id)
+        assert client.get("/school/", headers=headers).status_code == 401
+
+    def test_token_version_read_from_primary_after_invalidation(self, client, db_helpers):
+        user = db_helpers.create_user(email="test@example.com", is_admin=True)
+        headers = get_auth_header(user)
+        assert client.get("/school/", headers=headers).status_code == 200
+        client.app.dependency_overrides[get_read_database] = lambda: LaggingReplica(db_helpers.db, 0)
+
+        # The version is bumped and the notification drops the cached copy,
+        # but the replica still returns the old version.
+        user.token_version += 1
+        db_helpers.db.commit()
+        token_versions.invalidate(user.id)
+
+        assert client.get("/school/", headers=headers).status_code == 401
+        assert token_versions.get(user.id) == 1
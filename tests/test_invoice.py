@@ -1,4 +1,11 @@
+import csv
+import io
+import json
+
+import pytest
+
 from app.db.models import InvoiceStatus
+from app.routers import invoice as invoice_router
 
 
 class TestInvoiceList:
@@ -52,6 +59,93 @@ class TestInvoiceList:
         assert data_page2["offset"] == 2
 
 
+    def test_list_invoices_cursor_pagination(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice_ids = [
+            db_helpers.create_invoice(student, invoice_number=f"INV-00{i}").id for i in range(5)
+        ]
+
+        response = client.get("/invoice/?limit=2", headers=admin_headers)
+        data = response.json()
+        seen = [item["id"] for item in data["items"]]
+        while data["next_cursor"] is not None:
+            response = client.get(f"/invoice/?limit=2&cursor={data['next_cursor']}", headers=admin_headers)
+            assert response.status_code == 200
+            data = response.json()
+            seen.extend(item["id"] for item in data["items"])
+
+        assert seen == invoice_ids
+        assert data["total"] == 5
+
+    def test_list_invoices_cursor_scoped_to_school(self, client, db_helpers, school_user, school_user_headers):
+        _, school = school_user
+        other_school = db_helpers.create_school(name="Other School", tax_id="999")
+        student = db_helpers.create_student(school)
+        other_student = db_helpers.create_student(other_school, identifier="ID-002", email="other@example.com")
+        first = db_helpers.create_invoice(student, invoice_number="INV-001")
+        db_helpers.create_invoice(other_student, invoice_number="INV-002")
+        last = db_helpers.create_invoice(student, invoice_number="INV-003")
+
+        response = client.get("/invoice/?limit=1", headers=school_user_headers)
+        data = response.json()
+        assert [item["id"] for item in data["items"]] == [first.id]
+
+        response = client.get(f"/invoice/?limit=1&cursor={data['next_cursor']}", headers=school_user_headers)
+        data = response.json()
+        assert [item["id"] for item in data["items"]] == [last.id]
+        assert data["total"] == 2
+
+    def test_list_invoices_limit_must_be_positive(self, client, admin_headers):
+        response = client.get("/invoice/?limit=0", headers=admin_headers)
+
+        assert response.status_code == 422
+
+    def test_list_invoices_invalid_cursor(self, client, admin_headers):
+        response = client.get("/invoice/?cursor=not-a-cursor", headers=admin_headers)
+
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
+
+
+    def test_list_invoices_count_none(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        for i in range(3):
+            db_helpers.create_invoice(student, invoice_number=f"INV-00{i}")
+
+        response = client.get("/invoice/?limit=2&count=none", headers=admin_headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] is None
+        assert data["pages"] is None
+        assert len(data["items"]) == 2
+        assert data["has_more"] is True
+
+        response = client.get(f"/invoice/?limit=2&count=none&cursor={data['next_cursor']}", headers=admin_headers)
+        data = response.json()
+        assert len(data["items"]) == 1
+        assert data["has_more"] is False
+
+    def test_list_invoices_count_estimated(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        db_helpers.create_invoice(student)
+
+        response = client.get("/invoice/?count=estimated", headers=admin_headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert isinstance(data["total"], int)
+        assert len(data["items"]) == 1
+
+    def test_list_invoices_invalid_count_mode(self, client, admin_headers):
+        response = client.get("/invoice/?count=approximate", headers=admin_headers)
+
+        assert response.status_code == 422
+
+
 class TestInvoiceCreate:
     def test_create_invoice(self, client, db_helpers, admin_headers):
         school = db_helpers.create_school()
@@ -123,6 +217,212 @@ class TestInvoiceCreate:
         assert data["status"] == "pending"
 
 
+def bulk_row(student_id: int, invoice_number: str, **overrides) -> dict:
+    return {
+        "invoice_number": invoice_number,
+        "amount_in_cents": 10000,
+        "currency": "USD",
+        "issue_date": "2024-01-01T00:00:00",
+        "due_date": "2024-02-01T00:00:00",
+        "student_id": student_id,
+        **overrides,
+    }
+
+
+class TestInvoiceBulkCreate:
+    def test_bulk_create_invoices(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        rows = [bulk_row(student.id, f"BULK-{i}") for i in range(3)]
+
+        response = client.post("/invoice/bulk", json=rows, headers=admin_headers)
+
+        assert response.status_code == 201
+        data = response.json()
+        assert data["created"] == 3
+        assert data["failed"] == 0
+        assert [result["index"] for result in data["results"]] == [0, 1, 2]
+        assert all(result["id"] is not None for result in data["results"])
+        invoice = db_helpers.get_invoice(data["results"][0]["id"])
+        assert invoice.invoice_number == "BULK-0"
+        assert invoice.status == InvoiceStatus.PENDING.value
+        assert invoice.paid_cents == 0
+        assert db_helpers.count_invoices() == 3
+
+    def test_bulk_create_atomic_rejects_whole_batch(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        db_helpers.create_invoice(student, invoice_number="TAKEN")
+        rows = [bulk_row(student.id, "NEW-1"), bulk_row(student.id, "TAKEN")]
+
+        response = client.post("/invoice/bulk", json=rows, headers=admin_headers)
+
+        assert response.status_code == 422
+        assert response.json()["detail"] == [
+            {"index": 1, "invoice_number": "TAKEN", "id": None, "error": "Invoice number already exists"}
+        ]
+        assert db_helpers.count_invoices() == 1
+
+    def test_bulk_create_best_effort_ndjson(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        db_helpers.create_invoice(student, invoice_number="TAKEN")
+        lines = [
+            json.dumps(bulk_row(student.id, "NEW-1")),
+            json.dumps(bulk_row(student.id, "TAKEN")),
+            json.dumps(bulk_row(student.id, "NEW-1")),
+            json.dumps(bulk_row(999, "NEW-2")),
+            '{"invoice_number": "BROKEN"}',
+            json.dumps(bulk_row(student.id, "X" * 51)),
+            json.dumps(bulk_row(student.id, "NEW-3")),
+        ]
+
+        response = client.post(
+            "/invoice/bulk?mode=best_effort",
+            content="\n".join(lines) + "\n",
+            headers={**admin_headers, "Content-Type": "application/x-ndjson"},
+        )
+
+        assert response.status_code == 201
+        data = response.json()
+        assert data["created"] == 2
+        assert data["failed"] == 5
+        errors = [result["error"] for result in data["results"]]
+        assert errors[0] is None
+        assert errors[1] == "Invoice number already exists"
+        assert errors[2] == "Duplicate invoice number in batch"
+        assert errors[3] == "Student not found"
+        assert errors[4].startswith("amount_in_cents: Field required")
+        assert errors[5] == "invoice_number exceeds 50 characters"
+        assert errors[6] is None
+        assert db_helpers.count_invoices() == 3
+
+    def test_bulk_create_atomic_rejects_invalid_rows(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        rows = [bulk_row(student.id, "NEW-1"), {"invoice_number": "BROKEN"}]
+
+        response = client.post("/invoice/bulk", json=rows, headers=admin_headers)
+
+        assert response.status_code == 422
+        assert [error["index"] for error in response.json()["detail"]] == [1]
+        assert db_helpers.count_invoices() == 0
+
+    def test_bulk_create_school_user_other_school(self, client, db_helpers, school_user, school_user_headers):
+        _, school = school_user
+        other_school = db_helpers.create_school(name="Other School")
+        student = db_helpers.create_student(school)
+        other_student = db_helpers.create_student(other_school, identifier="ID-002", email="other@example.com")
+        rows = [bulk_row(student.id, "OWN"), bulk_row(other_student.id, "OTHER")]
+
+        response = client.post("/invoice/bulk?mode=best_effort", json=rows, headers=school_user_headers)
+
+        assert response.status_code == 201
+        results = response.json()["results"]
+        assert results[0]["error"] is None
+        assert results[1]["error"] == "Student not found"
+        assert db_helpers.count_invoices() == 1
+
+    def test_bulk_create_requires_list(self, client, admin_headers):
+        response = client.post("/invoice/bulk", json={"invoice_number": "X"}, headers=admin_headers)
+
+        assert response.status_code == 400
+
+    def test_bulk_create_too_many_rows_rejected_before_validation(self, client, admin_headers, monkeypatch):
+        monkeypatch.setattr(invoice_router, "MAX_BULK_INVOICES", 2)
+        monkeypatch.setattr(invoice_router, "parse_invoice_row", pytest.fail)
+        rows = [bulk_row(1, f"NEW-{index}") for index in range(3)]
+
+        response = client.post("/invoice/bulk", json=rows, headers=admin_headers)
+
+        assert response.status_code == 413
+
+    def test_bulk_create_too_many_ndjson_lines_rejected_before_validation(self, client, admin_headers, monkeypatch):
+        monkeypatch.setattr(invoice_router, "MAX_BULK_INVOICES", 2)
+        monkeypatch.setattr(invoice_router, "parse_invoice_row", pytest.fail)
+        lines = [json.dumps(bulk_row(1, f"NEW-{index}")) for index in range(3)]
+
+        response = client.post(
+            "/invoice/bulk",
+            content="\n".join(lines),
+            headers={**admin_headers, "Content-Type": "application/x-ndjson"},
+        )
+
+        assert response.status_code == 413
+
+
+class TestInvoiceExport:
+    def test_export_csv(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, invoice_number="INV-001", amount_in_cents=10000)
+        db_helpers.create_invoice(student, invoice_number="INV-002", description='Fee, "March"')
+
+        response = client.get("/invoice/export", headers=admin_headers)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert response.headers["content-disposition"] == 'attachment; filename="invoices.csv"'
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert [row["invoice_number"] for row in rows] == ["INV-001", "INV-002"]
+        assert rows[0]["id"] == str(invoice.id)
+        assert rows[0]["amount_in_cents"] == "10000"
+        assert rows[0]["issue_date"] == invoice.issue_date.isoformat()
+        assert rows[1]["description"] == 'Fee, "March"'
+        assert "paid_cents" not in rows[0]
+
+    def test_export_ndjson(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, invoice_number="INV-001")
+
+        response = client.get("/invoice/export?format=ndjson", headers=admin_headers)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert len(rows) == 1
+        assert rows[0] == client.get(f"/invoice/{invoice.id}", headers=admin_headers).json()
+
+    def test_export_school_user_only_sees_own_school(
+        self, client, db_helpers, school_user, school_user_headers
+    ):
+        _, school = school_user
+        other_school = db_helpers.create_school(name="Other School")
+        student = db_helpers.create_student(school)
+        other_student = db_helpers.create_student(other_school, identifier="ID-002", email="other@example.com")
+        db_helpers.create_invoice(student, invoice_number="INV-001")
+        db_helpers.create_invoice(other_student, invoice_number="INV-002")
+
+        response = client.get("/invoice/export?format=ndjson", headers=school_user_headers)
+
+        assert [json.loads(line)["invoice_number"] for line in response.text.splitlines()] == ["INV-001"]
+
+    def test_export_streams_in_batches(self, client, db_helpers, admin_headers, monkeypatch):
+        monkeypatch.setattr("app.export.EXPORT_BATCH_SIZE", 2)
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        for i in range(5):
+            db_helpers.create_invoice(student, invoice_number=f"INV-{i}")
+
+        response = client.get("/invoice/export?format=ndjson", headers=admin_headers)
+
+        numbers = [json.loads(line)["invoice_number"] for line in response.text.splitlines()]
+        assert numbers == [f"INV-{i}" for i in range(5)]
+
+    def test_export_empty_csv_has_header(self, client, admin_headers):
+        response = client.get("/invoice/export", headers=admin_headers)
+
+        assert response.status_code == 200
+        assert response.text.startswith("id,invoice_number,")
+        assert len(response.text.splitlines()) == 1
+
+    def test_export_requires_auth(self, client):
+        response = client.get("/invoice/export")
+
+        assert response.status_code == 401
+
+
 class TestInvoiceGet:
     def test_get_invoice(self, client, db_helpers, admin_headers):
         school = db_helpers.create_school()
@@ -154,6 +454,31 @@ class TestInvoiceGet:
         assert response.status_code == 404
         assert response.json()["detail"] == "Invoice not found"
 
+    def test_get_invoice_not_modified(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student)
+        etag = client.get(f"/invoice/{invoice.id}", headers=admin_headers).headers["etag"]
+
+        response = client.get(f"/invoice/{invoice.id}", headers={**admin_headers, "If-None-Match": f"W/{etag}"})
+
+        assert etag == f'"invoice-{invoice.id}-{invoice.updated_at:%Y%m%d%H%M%S%f}"'
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+
+    def test_get_invoice_etag_changes_after_update(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student)
+        etag = client.get(f"/invoice/{invoice.id}", headers=admin_headers).headers["etag"]
+
+        client.put(f"/invoice/{invoice.id}", json={"amount_in_cents": 15000}, headers=admin_headers)
+        response = client.get(f"/invoice/{invoice.id}", headers={**admin_headers, "If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert response.json()["amount_in_cents"] == 15000
+
 
 class TestInvoiceUpdate:
     def test_update_invoice(self, client, db_helpers, admin_headers):
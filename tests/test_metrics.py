@@ -0,0 +1,81 @@
+from prometheus_client import REGISTRY
+
+
+def serialization_count(route: str) -> float:
+    return REGISTRY.get_sample_value("http_response_serialization_seconds_count", {"route": route}) or 0.0
+
+
+def request_count(method: str, route: str, status: str) -> float:
+    labels = {"method": method, "route": route, "status": status}
+    return REGISTRY.get_sample_value("http_request_duration_seconds_count", labels) or 0.0
+
+
+class TestMetrics:
+    def test_metrics_exposes_pool_metrics(self, client):
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'db_pool_capacity{pool="sync"}' in response.text
+        assert 'db_pool_checked_out{pool="async"}' in response.text
+        assert "# TYPE db_pool_checkout_wait_seconds histogram" in response.text
+        assert 'db_pool_overflow{pool="sync"}' in response.text
+
+    def test_serialization_time_recorded_per_route(self, client, admin_headers, db_helpers):
+        school = db_helpers.create_school()
+        before = {route: serialization_count(route) for route in ("/school/", "/school/{school_id}")}
+
+        assert client.get("/school/", headers=admin_headers).status_code == 200
+        assert client.get(f"/school/{school.id}", headers=admin_headers).status_code == 200
+
+        assert serialization_count("/school/") == before["/school/"] + 1
+        assert serialization_count("/school/{school_id}") == before["/school/{school_id}"] + 1
+
+    def test_request_duration_recorded_per_route_and_status(self, client, admin_headers, db_helpers):
+        school = db_helpers.create_school()
+        before = {
+            status: request_count("GET", "/school/{school_id}", status) for status in ("200", "404")
+        }
+
+        assert client.get(f"/school/{school.id}", headers=admin_headers).status_code == 200
+        assert client.get("/school/999", headers=admin_headers).status_code == 404
+
+        assert request_count("GET", "/school/{school_id}", "200") == before["200"] + 1
+        assert request_count("GET", "/school/{school_id}", "404") == before["404"] + 1
+
+    def test_unknown_paths_share_one_route_label(self, client):
+        before = request_count("GET", "unmatched", "404")
+
+        client.get("/no-such-page")
+        client.get("/another/missing/page")
+
+        assert request_count("GET", "unmatched", "404") == before + 2
+
+    def test_in_flight_and_threadpool_gauges(self, client):
+        response = client.get("/metrics")
+
+        # The scrape itself is the only request in flight.
+        assert "http_requests_in_flight 1.0" in response.text
+        assert REGISTRY.get_sample_value("http_requests_in_flight") == 0
+        assert REGISTRY.get_sample_value("threadpool_capacity") > 0
+        assert "# TYPE threadpool_threads_in_use gauge" in response.text
+
+    def test_allocation_validation_failures_counted_by_reason(self, client, admin_headers, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student)
+        payment = db_helpers.create_payment(student, status="pending")
+        before = REGISTRY.get_sample_value(
+            "allocation_validation_failures_total", {"reason": "payment_not_completed"}
+        ) or 0.0
+
+        response = client.post(
+            "/payment-allocation/",
+            json={"payment_id": payment.id, "invoice_id": invoice.id, "amount_in_cents": 1000},
+            headers=admin_headers,
+        )
+
+        assert response.status_code == 400
+        assert REGISTRY.get_sample_value(
+            "allocation_validation_failures_total", {"reason": "payment_not_completed"}
+        ) == before + 1
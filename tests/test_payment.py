@@ -1,3 +1,5 @@
+import json
+
 from app.db.models import PaymentStatus, PaymentMethod
 
 
@@ -113,6 +115,81 @@ class TestPaymentCreate:
         assert db_helpers.count_payments() == 3
 
 
+class TestPaymentExport:
+    def test_export_ndjson_school_scoped(self, client, db_helpers, school_user, school_user_headers):
+        _, school = school_user
+        other_school = db_helpers.create_school(name="Other School")
+        student = db_helpers.create_student(school)
+        other_student = db_helpers.create_student(other_school, identifier="ID-002", email="other@example.com")
+        payment = db_helpers.create_payment(student, amount_in_cents=5000)
+        db_helpers.create_payment(other_student)
+
+        response = client.get("/payment/export?format=ndjson", headers=school_user_headers)
+
+        assert response.status_code == 200
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert len(rows) == 1
+        assert rows[0]["id"] == payment.id
+        assert rows[0]["amount_in_cents"] == 5000
+        assert rows[0]["payment_method"] == PaymentMethod.CARD.value
+
+
+class TestPaymentAutoAllocate:
+    def test_auto_allocate(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        first = db_helpers.create_invoice(student, invoice_number="INV-001", amount_in_cents=4000)
+        second = db_helpers.create_invoice(student, invoice_number="INV-002", amount_in_cents=4000)
+        payment = db_helpers.create_payment(student, amount_in_cents=6000)
+
+        response = client.post(f"/payment/{payment.id}/auto-allocate", headers=admin_headers)
+
+        assert response.status_code == 201
+        data = response.json()
+        assert [(item["invoice_id"], item["amount_in_cents"]) for item in data] == [
+            (first.id, 4000),
+            (second.id, 2000),
+        ]
+        assert all(item["payment_id"] == payment.id for item in data)
+        assert client.get(f"/invoice/{first.id}", headers=admin_headers).json()["status"] == "paid"
+        assert client.get(f"/invoice/{second.id}", headers=admin_headers).json()["status"] == "partially_paid"
+
+    def test_auto_allocate_largest_first(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        db_helpers.create_invoice(student, invoice_number="INV-001", amount_in_cents=4000)
+        largest = db_helpers.create_invoice(student, invoice_number="INV-002", amount_in_cents=9000)
+        payment = db_helpers.create_payment(student, amount_in_cents=6000)
+
+        response = client.post(
+            f"/payment/{payment.id}/auto-allocate?strategy=largest_first", headers=admin_headers
+        )
+
+        assert response.status_code == 201
+        assert [(item["invoice_id"], item["amount_in_cents"]) for item in response.json()] == [(largest.id, 6000)]
+
+    def test_auto_allocate_pending_payment(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        db_helpers.create_invoice(student)
+        payment = db_helpers.create_payment(student, status=PaymentStatus.PENDING.value)
+
+        response = client.post(f"/payment/{payment.id}/auto-allocate", headers=admin_headers)
+
+        assert response.status_code == 400
+
+    def test_auto_allocate_other_school(self, client, db_helpers, school_user_headers):
+        other_school = db_helpers.create_school(name="Other School")
+        student = db_helpers.create_student(other_school)
+        db_helpers.create_invoice(student)
+        payment = db_helpers.create_payment(student)
+
+        response = client.post(f"/payment/{payment.id}/auto-allocate", headers=school_user_headers)
+
+        assert response.status_code == 404
+        assert db_helpers.count_allocations() == 0
+
+
 class TestPaymentGet:
     def test_get_payment(self, client, db_helpers, admin_headers):
         school = db_helpers.create_school()
@@ -142,6 +219,19 @@ class TestPaymentGet:
         assert response.status_code == 404
         assert response.json()["detail"] == "Payment not found"
 
+    def test_get_payment_not_modified(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        payment = db_helpers.create_payment(student)
+        etag = client.get(f"/payment/{payment.id}", headers=admin_headers).headers["etag"]
+
+        response = client.get(
+            f"/payment/{payment.id}", headers={**admin_headers, "If-None-Match": f'"stale", {etag}'}
+        )
+
+        assert etag == f'"payment-{payment.id}-{payment.updated_at:%Y%m%d%H%M%S%f}"'
+        assert response.status_code == 304
+
 
 class TestPaymentUpdate:
     def test_update_payment(self, client, db_helpers, admin_headers):
@@ -184,6 +274,17 @@ class TestPaymentUpdate:
         assert response.status_code == 404
         assert response.json()["detail"] == "Student not found"
 
+    def test_update_allocated_payment_amount_rejected(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000, status="completed")
+        db_helpers.create_allocation(payment, db_helpers.create_invoice(student), 4000)
+
+        response = client.put(f"/payment/{payment.id}", json={"amount_in_cents": 5000}, headers=admin_headers)
+
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Cannot modify amount of a payment that has allocations"
+
 
 class TestPaymentDelete:
     def test_delete_payment(self, client, db_helpers, admin_headers):
@@ -204,3 +305,24 @@ class TestPaymentDelete:
 
         assert response.status_code == 404
         assert response.json()["detail"] == "Payment not found"
+
+    def test_delete_allocated_payment_rejected(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000, status="completed")
+        db_helpers.create_allocation(payment, db_helpers.create_invoice(student), 4000)
+
+        response = client.delete(f"/payment/{payment.id}", headers=admin_headers)
+
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Cannot delete a payment that has allocations. Delete the allocations first."
+        assert db_helpers.count_payments() == 1
+
+    def test_delete_payment_of_another_school_not_found(self, client, db_helpers, school_user_headers):
+        other_school = db_helpers.create_school(name="Other", tax_id="222")
+        payment = db_helpers.create_payment(db_helpers.create_student(other_school))
+
+        response = client.delete(f"/payment/{payment.id}", headers=school_user_headers)
+
+        assert response.status_code == 404
+        assert db_helpers.count_payments() == 1
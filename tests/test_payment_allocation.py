@@ -90,6 +90,29 @@ class TestPaymentAllocationCreate:
         assert response.json()["detail"] == "Invoice not found"
 
 
+class TestPaymentAllocationExport:
+    def test_export_csv_school_scoped(self, client, db_helpers, school_user, school_user_headers):
+        _, school = school_user
+        other_school = db_helpers.create_school(name="Other School")
+        student = db_helpers.create_student(school)
+        other_student = db_helpers.create_student(other_school, identifier="ID-002", email="other@example.com")
+        allocation = db_helpers.create_allocation(
+            db_helpers.create_payment(student), db_helpers.create_invoice(student, invoice_number="INV-001")
+        )
+        db_helpers.create_allocation(
+            db_helpers.create_payment(other_student),
+            db_helpers.create_invoice(other_student, invoice_number="INV-002"),
+        )
+
+        response = client.get("/payment-allocation/export", headers=school_user_headers)
+
+        assert response.status_code == 200
+        lines = response.text.splitlines()
+        assert lines[0] == "id,payment_id,invoice_id,amount_in_cents,created_at"
+        assert len(lines) == 2
+        assert lines[1].startswith(f"{allocation.id},{allocation.payment_id},{allocation.invoice_id},5000,")
+
+
 class TestPaymentAllocationGet:
     def test_get_allocation(self, client, db_helpers, admin_headers):
         school = db_helpers.create_school()
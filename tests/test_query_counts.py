@@ -0,0 +1,63 @@
+"""
+Statement budgets per endpoint.
+
+Each request must stay within its budget however many rows it returns, so a
+lazy load or a per-row lookup creeping into an endpoint fails here.
+"""
+
+import pytest
+
+from app.db.query_stats import SERVER_TIMING_HEADER
+
+ROWS = 5
+
+
+@pytest.fixture
+def seeded(client, db_helpers, admin_headers) -> dict[str, int]:
+    school = db_helpers.create_school()
+    student = db_helpers.create_student(school)
+    for index in range(1, ROWS):
+        db_helpers.create_student(school, identifier=f"ID-{index}", email=f"student{index}@example.com")
+    invoices = [db_helpers.create_invoice(student, invoice_number=f"INV-{index}") for index in range(ROWS)]
+    payment = db_helpers.create_payment(student, amount_in_cents=50000, status="completed")
+    allocations = [db_helpers.create_allocation(payment, invoice, 1000) for invoice in invoices]
+    # Authenticate once so the token version lookup is not charged to the endpoints.
+    client.get("/school/", headers=admin_headers)
+    return {
+        "school": school.id,
+        "student": student.id,
+        "invoice": invoices[0].id,
+        "payment": payment.id,
+        "allocation": allocations[0].id,
+    }
+
+
+@pytest.mark.parametrize(
+    ("method", "path", "body", "budget"),
+    [
+        ("get", "/student/", None, 1),
+        ("get", "/invoice/", None, 1),
+        ("get", "/payment/", None, 1),
+        ("get", "/payment-allocation/", None, 1),
+        ("get", "/invoice/{invoice}", None, 1),
+        ("get", "/school/{school}/balance", None, 3),
+        ("get", "/student/{student}/balance", None, 3),
+        ("put", "/invoice/{invoice}", {"description": "Updated"}, 3),
+        ("put", "/payment-allocation/{allocation}", {"amount_in_cents": 2000}, 7),
+        ("delete", "/payment-allocation/{allocation}", None, 6),
+    ],
+)
+def test_endpoint_statement_budget(client, admin_headers, seeded, max_queries, method, path, body, budget):
+    options = {"json": body} if body is not None else {}
+
+    with max_queries(budget):
+        response = client.request(method.upper(), path.format(**seeded), headers=admin_headers, **options)
+
+    assert response.status_code < 300
+
+
+def test_server_timing_reports_statement_count(client, admin_headers, seeded, max_queries):
+    with max_queries(3) as statements:
+        response = client.get(f"/school/{seeded['school']}/balance", headers=admin_headers)
+
+    assert response.headers[SERVER_TIMING_HEADER].endswith(f'desc="{len(statements)} statements"')
@@ -0,0 +1,106 @@
+"""
+Guard the hot-path indexes: every scoped service query must be served by an index.
+
+The queries are captured while calling the services against a seeded dataset,
+then re-run under EXPLAIN with the same parameters.
+"""
+
+import pytest
+from sqlalchemy import event
+
+from app.auth import Principal
+from app.db.database import Base
+from app.services import invoice as invoice_service
+from app.services import payment as payment_service
+from app.services import payment_allocation as allocation_service
+from app.services import school as school_service
+from app.services import student as student_service
+from app.validators.allocation import get_payment_allocated_amount
+from scripts.bench_data import seed_bulk
+from tests.conftest import TestingSessionLocal, engine
+
+# Small lookup tables may legitimately be scanned; these may not.
+LARGE_TABLES = {"student", "invoice", "payment", "payment_allocation"}
+
+SCHOOL_ID = 7
+STUDENT_ID = 42
+
+
+@pytest.fixture(scope="module")
+def seeded_db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    try:
+        seed_bulk(session, schools=1_000, students=20_000, invoices=100_000, payments=100_000)
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+def capture_statements(db_session, fn, *args) -> list[tuple[str, dict]]:
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        fn(db_session, *args)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return statements
+
+
+def find_seq_scans(plan: dict) -> list[str]:
+    scans = []
+    if plan["Node Type"] == "Seq Scan" and plan["Relation Name"] in LARGE_TABLES:
+        scans.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        scans.extend(find_seq_scans(child))
+    return scans
+
+
+SCHOOL_USER = Principal(id=1, email="plans@example.com", school_id=SCHOOL_ID, is_admin=False, token_version=0)
+
+SERVICE_QUERIES = [
+    (school_service.get_school_balance, (SCHOOL_ID,)),
+    (school_service.get_total_invoiced_for_school, (SCHOOL_ID,)),
+    (school_service.get_total_paid_for_school, (SCHOOL_ID,)),
+    (school_service.get_currency_for_school, (SCHOOL_ID,)),
+    (school_service.get_unpaid_invoices_for_school, (SCHOOL_ID,)),
+    (school_service.get_recent_payments_for_school, (SCHOOL_ID,)),
+    (student_service.get_student_balance, (STUDENT_ID,)),
+    (student_service.get_total_invoiced_for_student, (STUDENT_ID,)),
+    (student_service.get_total_paid_for_student, (STUDENT_ID,)),
+    (student_service.get_currency_for_student, (STUDENT_ID,)),
+    (student_service.get_unpaid_invoices_for_student, (STUDENT_ID,)),
+    (student_service.get_recent_payments_for_student, (STUDENT_ID,)),
+    (student_service.get_students_by_school_with_count, (SCHOOL_ID,)),
+    (invoice_service.get_invoices_by_school_with_count, (SCHOOL_ID,)),
+    (payment_service.get_payments_by_school_with_count, (SCHOOL_ID,)),
+    (allocation_service.get_allocations_by_school_with_count, (SCHOOL_ID,)),
+    (invoice_service.get_invoice_by_id_for_user, (STUDENT_ID, SCHOOL_USER)),
+    (payment_service.get_payment_by_id_for_user, (STUDENT_ID, SCHOOL_USER)),
+    (allocation_service.get_allocation_by_id_for_user, (STUDENT_ID, SCHOOL_USER)),
+    (allocation_service.get_invoice_paid_amount, (STUDENT_ID,)),
+    (get_payment_allocated_amount, (STUDENT_ID,)),
+]
+
+
+@pytest.mark.parametrize(
+    "fn,args",
+    SERVICE_QUERIES,
+    ids=[fn.__name__ for fn, _ in SERVICE_QUERIES],
+)
+def test_service_query_uses_indexes(seeded_db, fn, args):
+    statements = capture_statements(seeded_db, fn, *args)
+    assert statements
+
+    for statement, parameters in statements:
+        result = seeded_db.connection().exec_driver_sql(
+            "EXPLAIN (FORMAT JSON) " + statement, parameters
+        )
+        plan = result.scalar()[0]["Plan"]
+        assert find_seq_scans(plan) == [], statement
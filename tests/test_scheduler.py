@@ -0,0 +1,47 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from prometheus_client import REGISTRY
+
+from app import scheduler
+from app.config import settings
+from app.db.database import async_engine
+from app.db.models import InvoiceStatus
+
+
+def sweep_runs(outcome: str) -> float:
+    return REGISTRY.get_sample_value("overdue_sweep_runs_total", {"outcome": outcome}) or 0.0
+
+
+async def sweep_and_dispose() -> int | None:
+    # Close the pooled asyncpg connections before asyncio.run closes their loop.
+    try:
+        return await scheduler.sweep_overdue_invoices()
+    finally:
+        await async_engine.dispose()
+
+
+class TestOverdueSweeper:
+    def test_sweep_marks_invoices_and_records_metrics(self, db_session, db_helpers, monkeypatch):
+        monkeypatch.setattr(settings, "db_async", False)
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, due_date=datetime.now() - timedelta(days=1))
+        completed = sweep_runs("completed")
+
+        assert asyncio.run(scheduler.sweep_overdue_invoices()) == 1
+
+        db_session.expire_all()
+        assert invoice.status == InvoiceStatus.OVERDUE.value
+        assert sweep_runs("completed") == completed + 1
+
+    def test_async_sweep(self, db_session, db_helpers, monkeypatch):
+        monkeypatch.setattr(settings, "db_async", True)
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, due_date=datetime.now() - timedelta(days=1))
+
+        assert asyncio.run(sweep_and_dispose()) == 1
+
+        db_session.expire_all()
+        assert invoice.status == InvoiceStatus.OVERDUE.value
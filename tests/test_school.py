@@ -1,4 +1,7 @@
+from sqlalchemy import event
+
 from app.db.models import InvoiceStatus, PaymentStatus
+from tests.conftest import engine
 
 
 class TestSchoolList:
@@ -222,3 +225,78 @@ class TestSchoolBalance:
         assert data["total_invoiced_cents"] == 10000
         assert data["total_paid_cents"] == 0
         assert data["total_pending_cents"] == 10000
+
+    def test_get_school_balance_returns_etag(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+
+        response = client.get(f"/school/{school.id}/balance", headers=admin_headers)
+
+        assert response.status_code == 200
+        assert response.headers["etag"] == f'"school-{school.id}-balance-0"'
+        assert response.headers["cache-control"] == "private, no-cache"
+
+    def test_get_school_balance_not_modified(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        etag = client.get(f"/school/{school.id}/balance", headers=admin_headers).headers["etag"]
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            response = client.get(
+                f"/school/{school.id}/balance", headers={**admin_headers, "If-None-Match": etag}
+            )
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+        assert len(statements) == 1
+
+    def test_get_school_balance_served_from_cache(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        db_helpers.create_invoice(student, amount_in_cents=10000)
+        first = client.get(f"/school/{school.id}/balance", headers=admin_headers)
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            response = client.get(f"/school/{school.id}/balance", headers=admin_headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert response.status_code == 200
+        assert response.json() == first.json()
+        assert response.headers["etag"] == first.headers["etag"]
+        assert len(statements) == 1
+
+    def test_get_school_balance_etag_changes_after_allocation(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        db_helpers.create_invoice(student, amount_in_cents=10000)
+        payment = db_helpers.create_payment(student, amount_in_cents=4000)
+        etag = client.get(f"/school/{school.id}/balance", headers=admin_headers).headers["etag"]
+
+        client.post(f"/payment/{payment.id}/auto-allocate", headers=admin_headers)
+        response = client.get(f"/school/{school.id}/balance", headers={**admin_headers, "If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert response.json()["total_paid_cents"] == 4000
+
+    def test_get_school_balance_not_modified_requires_access(self, client, db_helpers, school_user_headers):
+        other_school = db_helpers.create_school(name="Other School", tax_id="999")
+
+        response = client.get(
+            f"/school/{other_school.id}/balance",
+            headers={**school_user_headers, "If-None-Match": f'"school-{other_school.id}-balance-0"'},
+        )
+
+        assert response.status_code == 404
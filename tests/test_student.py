@@ -241,3 +241,36 @@ class TestStudentBalance:
         assert data["total_invoiced_cents"] == 10000
         assert data["total_paid_cents"] == 0
         assert data["total_pending_cents"] == 10000
+
+    def test_get_student_balance_not_modified(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        first = client.get(f"/student/{student.id}/balance", headers=admin_headers)
+
+        response = client.get(
+            f"/student/{student.id}/balance", headers={**admin_headers, "If-None-Match": first.headers["etag"]}
+        )
+
+        assert first.headers["etag"] == f'"student-{student.id}-balance-0"'
+        assert response.status_code == 304
+        assert response.content == b""
+
+    def test_get_student_balance_etag_changes_after_invoice_created(self, client, db_helpers, admin_headers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        etag = client.get(f"/student/{student.id}/balance", headers=admin_headers).headers["etag"]
+        invoice_data = {
+            "invoice_number": "INV-001",
+            "amount_in_cents": 10000,
+            "currency": "USD",
+            "issue_date": "2024-01-01T00:00:00",
+            "due_date": "2024-02-01T00:00:00",
+            "student_id": student.id,
+        }
+
+        client.post("/invoice/", json=invoice_data, headers=admin_headers)
+        response = client.get(f"/student/{student.id}/balance", headers={**admin_headers, "If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert response.json()["total_invoiced_cents"] == 10000
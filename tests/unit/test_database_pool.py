@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy import create_engine, exc
+from prometheus_client import REGISTRY
+
+from app.db.database import asyncpg_connect_args
+from app.db.pool import InstrumentedQueuePool
+from tests.conftest import DATABASE_URL
+
+
+def sample(name: str, pool: str) -> float:
+    return REGISTRY.get_sample_value(name, {"pool": pool}) or 0.0
+
+
+class TestInstrumentedQueuePool:
+    def test_records_checkout_wait(self):
+        engine = create_engine(DATABASE_URL, poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0)
+        before = sample("db_pool_checkout_wait_seconds_count", "sync")
+        try:
+            with engine.connect():
+                pass
+        finally:
+            engine.dispose()
+
+        assert sample("db_pool_checkout_wait_seconds_count", "sync") == before + 1
+
+    def test_counts_checkout_timeouts(self):
+        engine = create_engine(
+            DATABASE_URL, poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.1
+        )
+        before = sample("db_pool_checkout_timeouts_total", "sync")
+        try:
+            with engine.connect():
+                with pytest.raises(exc.TimeoutError):
+                    engine.connect()
+        finally:
+            engine.dispose()
+
+        assert sample("db_pool_checkout_timeouts_total", "sync") == before + 1
+
+    def test_reports_usage_on_checkout_and_return(self):
+        engine = create_engine(DATABASE_URL, poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=1)
+        try:
+            with engine.connect():
+                with engine.connect():
+                    in_use = [sample(name, "sync") for name in ("db_pool_checked_out", "db_pool_overflow")]
+                    saturation = sample("db_pool_saturation_ratio", "sync")
+            released = sample("db_pool_checked_out", "sync")
+        finally:
+            engine.dispose()
+
+        assert in_use == [2, 1]
+        assert saturation == 1.0
+        assert released == 0
+
+
+class TestAsyncpgConnectArgs:
+    def test_default_keeps_statement_cache(self):
+        assert asyncpg_connect_args(pgbouncer=False) == {}
+
+    def test_pgbouncer_disables_prepared_statement_caches(self):
+        args = asyncpg_connect_args(pgbouncer=True)
+
+        assert args["statement_cache_size"] == 0
+        assert args["prepared_statement_cache_size"] == 0
+        assert args["prepared_statement_name_func"]() != args["prepared_statement_name_func"]()
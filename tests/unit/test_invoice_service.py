@@ -1,8 +1,16 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
+import pytest
+from sqlalchemy import event, text
+
+from app.auth import Principal
 from app.db.models import Invoice, InvoiceStatus
-from app.schemas import InvoiceUpdate
+from app.schemas import BulkMode, CountMode, InvoiceCreate, InvoiceUpdate
 from app.services import invoice as invoice_service
+from app.validators.invoice import BulkInvoiceError
+from tests.conftest import engine
+
+ADMIN = Principal(id=1, email="admin@example.com", school_id=None, is_admin=True, token_version=0)
 
 
 class TestInvoiceServiceCRUD:
@@ -10,19 +18,17 @@ class TestInvoiceServiceCRUD:
         school = db_helpers.create_school()
         student = db_helpers.create_student(school)
         now = datetime.now()
-        invoice = Invoice(
+        invoice_data = InvoiceCreate(
             invoice_number="INV-001",
             amount_in_cents=10000,
             currency="USD",
-            status=InvoiceStatus.PENDING.value,
+            status=InvoiceStatus.PENDING,
             issue_date=now,
             due_date=now,
             student_id=student.id,
-            created_at=now,
-            updated_at=now,
         )
 
-        result = invoice_service.create_invoice(db_session, invoice)
+        result = invoice_service.create_invoice(db_session, invoice_data, ADMIN)
 
         assert result.id is not None
         assert result.invoice_number == "INV-001"
@@ -108,7 +114,7 @@ class TestInvoiceServiceCRUD:
         assert total == 2
         assert len(items) == 2
         for invoice in items:
-            assert invoice.student.school_id == school1.id
+            assert invoice.student_id == student1.id
 
     def test_update_invoice(self, db_session, db_helpers):
         school = db_helpers.create_school()
@@ -116,7 +122,7 @@ class TestInvoiceServiceCRUD:
         invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
         update_data = InvoiceUpdate(amount_in_cents=15000)
 
-        result = invoice_service.update_invoice(db_session, invoice, update_data)
+        result = invoice_service.update_invoice(db_session, invoice.id, update_data, ADMIN)
 
         assert result.amount_in_cents == 15000
         assert result.id == invoice.id
@@ -132,7 +138,7 @@ class TestInvoiceServiceCRUD:
         )
         update_data = InvoiceUpdate(status=InvoiceStatus.OVERDUE.value)
 
-        result = invoice_service.update_invoice(db_session, invoice, update_data)
+        result = invoice_service.update_invoice(db_session, invoice.id, update_data, ADMIN)
 
         assert result.invoice_number == "INV-001"
         assert result.amount_in_cents == 10000
@@ -144,19 +150,227 @@ class TestInvoiceServiceCRUD:
         invoice = db_helpers.create_invoice(student, description="Original description")
         update_data = InvoiceUpdate(description="Updated description")
 
-        result = invoice_service.update_invoice(db_session, invoice, update_data)
+        result = invoice_service.update_invoice(db_session, invoice.id, update_data, ADMIN)
 
         assert result.description == "Updated description"
 
+    def test_update_invoice_is_one_update(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
+        invoice_id = invoice.id
+        user = Principal(id=2, email="user@example.com", school_id=school.id, is_admin=False, token_version=0)
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            result = invoice_service.update_invoice(
+                db_session, invoice_id, InvoiceUpdate(amount_in_cents=15000), user
+            )
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert result.amount_in_cents == 15000
+        # The invoice update, then the student and school balance version bumps.
+        assert [statement.split()[0] for statement in statements] == ["UPDATE", "UPDATE", "UPDATE"]
+        assert "RETURNING" in statements[0]
+
+    def test_update_invoice_of_another_school_writes_nothing(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        other_school = db_helpers.create_school(name="Other", tax_id="222")
+        invoice = db_helpers.create_invoice(db_helpers.create_student(school), amount_in_cents=10000)
+        user = Principal(id=2, email="user@example.com", school_id=other_school.id, is_admin=False, token_version=0)
+
+        result = invoice_service.update_invoice(db_session, invoice.id, InvoiceUpdate(amount_in_cents=1), user)
+
+        assert result is None
+        db_session.expire_all()
+        assert invoice.amount_in_cents == 10000
+
+    def test_create_invoice_for_student_of_another_school_writes_nothing(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        other_school = db_helpers.create_school(name="Other", tax_id="222")
+        student = db_helpers.create_student(school)
+        user = Principal(id=2, email="user@example.com", school_id=other_school.id, is_admin=False, token_version=0)
+
+        result = invoice_service.create_invoice(db_session, invoice_create(student.id, "INV-001"), user)
+
+        assert result is None
+        assert invoice_service.get_invoices_with_count(db_session)[1] == 0
+
+    def test_move_invoice_bumps_both_student_balances(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        other_student = db_helpers.create_student(school, identifier="ID-2", email="other@example.com")
+        invoice = db_helpers.create_invoice(student)
+        versions = (student.balance_version, other_student.balance_version)
+
+        result = invoice_service.update_invoice(
+            db_session, invoice.id, InvoiceUpdate(student_id=other_student.id), ADMIN
+        )
+
+        assert result.student_id == other_student.id
+        db_session.expire_all()
+        assert (student.balance_version, other_student.balance_version) == (versions[0] + 1, versions[1] + 1)
+
     def test_delete_invoice(self, db_session, db_helpers):
         school = db_helpers.create_school()
         student = db_helpers.create_student(school)
         invoice = db_helpers.create_invoice(student)
         invoice_id = invoice.id
 
-        invoice_service.delete_invoice(db_session, invoice)
+        version = student.balance_version
+
+        assert invoice_service.delete_invoice(db_session, invoice_id, ADMIN) is True
 
         assert invoice_service.get_invoice_by_id(db_session, invoice_id) is None
+        db_session.expire_all()
+        assert student.balance_version == version + 1
+
+    def test_delete_invoice_is_one_delete(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice_id = db_helpers.create_invoice(student).id
+        user = Principal(id=2, email="user@example.com", school_id=school.id, is_admin=False, token_version=0)
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            assert invoice_service.delete_invoice(db_session, invoice_id, user) is True
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        # The scoped delete, then the student and school balance version bumps.
+        assert [statement.split()[0] for statement in statements] == ["DELETE", "UPDATE", "UPDATE"]
+        assert "RETURNING" in statements[0]
+
+    def test_delete_invoice_of_another_school_deletes_nothing(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        other_school = db_helpers.create_school(name="Other", tax_id="222")
+        invoice = db_helpers.create_invoice(db_helpers.create_student(school))
+        user = Principal(id=2, email="user@example.com", school_id=other_school.id, is_admin=False, token_version=0)
+
+        assert invoice_service.delete_invoice(db_session, invoice.id, user) is False
+
+        assert invoice_service.get_invoice_by_id(db_session, invoice.id) is not None
+
+
+def invoice_create(student_id: int, invoice_number: str, **overrides) -> InvoiceCreate:
+    now = datetime.now()
+    fields = {
+        "invoice_number": invoice_number,
+        "amount_in_cents": 10000,
+        "currency": "USD",
+        "issue_date": now,
+        "due_date": now,
+        "student_id": student_id,
+    }
+    return InvoiceCreate(**{**fields, **overrides})
+
+
+class TestInvoiceServiceBulkCreate:
+    def test_bulk_create_invoices(self, db_session, db_helpers):
+        admin = db_helpers.create_admin_user()
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoices = [invoice_create(student.id, f"BULK-{i}") for i in range(5)]
+
+        results = invoice_service.bulk_create_invoices(db_session, invoices, admin)
+
+        assert [result.error for result in results] == [None] * 5
+        created = {invoice.invoice_number: invoice.id for invoice in db_session.query(Invoice)}
+        assert {result.invoice_number: result.id for result in results} == created
+
+    def test_bulk_create_atomic_rolls_back(self, db_session, db_helpers):
+        admin = db_helpers.create_admin_user()
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        db_helpers.create_invoice(student, invoice_number="TAKEN")
+        invoices = [invoice_create(student.id, "NEW-1"), invoice_create(student.id, "TAKEN")]
+
+        with pytest.raises(BulkInvoiceError) as exc_info:
+            invoice_service.bulk_create_invoices(db_session, invoices, admin, BulkMode.ATOMIC)
+
+        assert exc_info.value.status_code == 422
+        assert [error["index"] for error in exc_info.value.detail] == [1]
+        assert db_helpers.count_invoices() == 1
+
+    def test_bulk_create_best_effort_keeps_valid_rows(self, db_session, db_helpers):
+        admin = db_helpers.create_admin_user()
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoices = [
+            invoice_create(student.id, "NEW-1"),
+            invoice_create(student.id, "NEW-2", amount_in_cents=2**31),
+            invoice_create(student.id, "NEW-3", status=InvoiceStatus.DRAFT),
+        ]
+
+        results = invoice_service.bulk_create_invoices(db_session, invoices, admin, BulkMode.BEST_EFFORT)
+
+        assert results[1].error == "amount_in_cents is out of range"
+        assert results[1].id is None
+        assert db_helpers.get_invoice(results[2].id).status == InvoiceStatus.DRAFT.value
+        assert db_helpers.count_invoices() == 2
+
+
+class TestMarkOverdueInvoices:
+    def test_marks_late_pending_invoices_only(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        late = datetime.now() - timedelta(days=1)
+        early = datetime.now() + timedelta(days=1)
+        late_pending = db_helpers.create_invoice(student, invoice_number="LATE", due_date=late)
+        not_due = db_helpers.create_invoice(student, invoice_number="NOT-DUE", due_date=early)
+        late_draft = db_helpers.create_invoice(
+            student, invoice_number="DRAFT", due_date=late, status=InvoiceStatus.DRAFT.value
+        )
+        late_paid = db_helpers.create_invoice(
+            student, invoice_number="PAID", due_date=late, status=InvoiceStatus.PAID.value
+        )
+
+        assert invoice_service.mark_overdue_invoices(db_session) == 1
+
+        db_session.expire_all()
+        assert late_pending.status == InvoiceStatus.OVERDUE.value
+        assert not_due.status == InvoiceStatus.PENDING.value
+        assert late_draft.status == InvoiceStatus.DRAFT.value
+        assert late_paid.status == InvoiceStatus.PAID.value
+
+    def test_sweeps_in_chunks(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        late = datetime.now() - timedelta(days=1)
+        for i in range(7):
+            db_helpers.create_invoice(student, invoice_number=f"LATE-{i}", due_date=late)
+
+        assert invoice_service.mark_overdue_invoices(db_session, batch_size=3) == 7
+        assert invoice_service.mark_overdue_invoices(db_session, batch_size=3) == 0
+        overdue = db_session.query(Invoice).filter(Invoice.status == InvoiceStatus.OVERDUE.value)
+        assert overdue.count() == 7
+
+    def test_skips_when_another_worker_holds_the_lock(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(
+            student, invoice_number="LATE", due_date=datetime.now() - timedelta(days=1)
+        )
+
+        lock = {"key": invoice_service.OVERDUE_SWEEP_LOCK_ID}
+        with engine.connect() as other:
+            other.execute(text("SELECT pg_advisory_lock(:key)"), lock)
+            try:
+                assert invoice_service.mark_overdue_invoices(db_session) is None
+            finally:
+                other.execute(text("SELECT pg_advisory_unlock(:key)"), lock)
+
+        db_session.expire_all()
+        assert invoice.status == InvoiceStatus.PENDING.value
 
 
 class TestInvoiceServiceFiltering:
@@ -183,3 +397,43 @@ class TestInvoiceServiceFiltering:
 
         assert total == 10
         assert len(items) == 3
+
+    def test_get_invoices_with_count_past_last_page(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        db_helpers.create_invoice(student)
+
+        items, total = invoice_service.get_invoices_with_count(db_session, offset=10, limit=2)
+
+        assert items == []
+        assert total == 1
+
+    def test_get_invoices_by_school_count_modes(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        for i in range(3):
+            db_helpers.create_invoice(student, invoice_number=f"INV-{i:03d}")
+        db_session.execute(text("ANALYZE invoice"))
+
+        items, total = invoice_service.get_invoices_by_school_with_count(
+            db_session, school.id, limit=2, count=CountMode.NONE
+        )
+        assert len(items) == 2
+        assert total is None
+
+        items, total = invoice_service.get_invoices_by_school_with_count(
+            db_session, school.id, limit=2, count=CountMode.ESTIMATED
+        )
+        assert len(items) == 2
+        assert total >= 1
+
+    def test_get_invoices_estimated_uses_table_statistics(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        for i in range(4):
+            db_helpers.create_invoice(student, invoice_number=f"INV-{i:03d}")
+        db_session.execute(text("ANALYZE invoice"))
+
+        _, total = invoice_service.get_invoices_with_count(db_session, count=CountMode.ESTIMATED)
+
+        assert total == 4
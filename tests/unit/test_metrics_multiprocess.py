@@ -0,0 +1,49 @@
+import subprocess
+import sys
+
+WORKER = """
+from app.metrics import ALLOCATION_VALIDATION_FAILURES, HTTP_REQUESTS_IN_FLIGHT, record_pool_usage
+ALLOCATION_VALIDATION_FAILURES.labels("currency_mismatch").inc()
+HTTP_REQUESTS_IN_FLIGHT.inc()
+record_pool_usage("sync", checked_out=2, overflow=0, capacity=4)
+"""
+
+STOPPED_WORKER = WORKER + """
+from app.metrics import mark_worker_stopped
+mark_worker_stopped()
+"""
+
+SCRAPE = """
+import sys
+from app.routers.metrics import render_metrics
+sys.stdout.write(render_metrics().decode())
+"""
+
+
+def run(code: str, multiproc_dir) -> str:
+    env = {"PROMETHEUS_MULTIPROC_DIR": str(multiproc_dir), "PATH": ""}
+    return subprocess.run(
+        [sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True
+    ).stdout
+
+
+class TestMultiprocessMetrics:
+    def test_scrape_aggregates_every_worker(self, tmp_path):
+        run(WORKER, tmp_path)
+        run(WORKER, tmp_path)
+
+        exposition = run(SCRAPE, tmp_path)
+
+        assert 'allocation_validation_failures_total{reason="currency_mismatch"} 2.0' in exposition
+        assert "http_requests_in_flight 2.0" in exposition
+        assert 'db_pool_checked_out{pool="sync"} 4.0' in exposition
+        assert 'db_pool_saturation_ratio{pool="sync"} 0.5' in exposition
+
+    def test_stopped_worker_keeps_counters_but_not_live_gauges(self, tmp_path):
+        run(WORKER, tmp_path)
+        run(STOPPED_WORKER, tmp_path)
+
+        exposition = run(SCRAPE, tmp_path)
+
+        assert 'allocation_validation_failures_total{reason="currency_mismatch"} 2.0' in exposition
+        assert "http_requests_in_flight 1.0" in exposition
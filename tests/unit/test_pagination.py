@@ -0,0 +1,97 @@
+import json
+from collections import namedtuple
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from app.db.models import Invoice
+from app.pagination import (
+    InvalidCursorError,
+    build_paginated_json,
+    decode_cursor,
+    encode_cursor,
+    fetch_page,
+)
+from app.schemas import CountMode, InvoiceResponse, PaginatedResponse
+from app.serialization import response_columns, response_fields
+
+
+class TestCursor:
+    def test_round_trip(self):
+        assert decode_cursor(encode_cursor(12345)) == 12345
+
+    def test_cursor_is_url_safe(self):
+        cursor = encode_cursor(2**40)
+
+        assert "=" not in cursor
+        assert "/" not in cursor
+        assert "+" not in cursor
+
+    @pytest.mark.parametrize("cursor", ["", "garbage!", "eyJpZCI6ICJ4In0", "e30"])
+    def test_decode_invalid(self, cursor):
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(cursor)
+
+
+class TestBuildPaginatedJson:
+    Row = namedtuple("Row", ["id", "name"])
+
+    def page(self, rows, total):
+        return json.loads(build_paginated_json(rows, ["id", "name"], total, limit=2, offset=0).body)
+
+    def test_lookahead_row_is_dropped(self):
+        page = self.page([self.Row(1, "a"), self.Row(7, "b"), self.Row(9, "c")], total=5)
+
+        assert page["items"] == [{"id": 1, "name": "a"}, {"id": 7, "name": "b"}]
+        assert page["has_more"] is True
+        assert decode_cursor(page["next_cursor"]) == 7
+        assert page["pages"] == 3
+
+    def test_last_page(self):
+        page = self.page([self.Row(1, "a")], total=1)
+
+        assert page["has_more"] is False
+        assert page["next_cursor"] is None
+
+    def test_without_total(self):
+        page = self.page([self.Row(1, "a")], total=None)
+
+        assert page["total"] is None
+        assert page["pages"] is None
+
+
+class TestProjectedPages:
+    def test_fetch_page_of_columns_returns_rows(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoices = [db_helpers.create_invoice(student, invoice_number=f"INV-{i}") for i in range(3)]
+        query = db_session.query(*response_columns(Invoice, InvoiceResponse))
+
+        for count in CountMode:
+            rows, total = fetch_page(query, Invoice, limit=2, count=count)
+
+            assert [row.id for row in rows] == [invoices[0].id, invoices[1].id]
+            assert rows[0].invoice_number == "INV-0"
+        assert fetch_page(query, Invoice, limit=2)[1] == 3
+
+    def test_json_matches_response_model(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        for i in range(3):
+            db_helpers.create_invoice(student, invoice_number=f"INV-{i}", description=None if i else "First")
+        fields = response_fields(InvoiceResponse)
+        rows, total = fetch_page(db_session.query(*response_columns(Invoice, InvoiceResponse)), Invoice, limit=3)
+        entities, _ = fetch_page(db_session.query(Invoice), Invoice, limit=3)
+
+        projected = build_paginated_json(rows, fields, total, limit=2, offset=0)
+        validated = PaginatedResponse[InvoiceResponse].model_validate(
+            {
+                "items": entities[:2], "total": total, "limit": 2, "offset": 0, "pages": 2,
+                "has_more": True, "next_cursor": encode_cursor(entities[1].id),
+            },
+            from_attributes=True,
+        )
+
+        assert projected.media_type == "application/json"
+        assert json.loads(projected.body) == jsonable_encoder(validated)
+
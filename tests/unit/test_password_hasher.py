@@ -0,0 +1,35 @@
+import asyncio
+
+from app.auth import PasswordHasher, PasswordHasherBusyError
+
+
+class TestPasswordHasher:
+    def test_hash_and_verify(self):
+        hasher = PasswordHasher(workers=1, queue_timeout=5)
+
+        async def check() -> tuple[bool, bool]:
+            hashed = await hasher.hash("secret")
+            return await hasher.verify("secret", hashed), await hasher.verify("wrong", hashed)
+
+        assert asyncio.run(check()) == (True, False)
+
+    def test_rejects_when_workers_stay_busy(self):
+        hasher = PasswordHasher(workers=1, queue_timeout=0.01)
+
+        async def burst() -> list:
+            return await asyncio.gather(hasher.hash("first"), hasher.hash("second"), return_exceptions=True)
+
+        first, second = asyncio.run(burst())
+
+        assert isinstance(first, str)
+        assert isinstance(second, PasswordHasherBusyError)
+        assert second.status_code == 503
+        assert second.headers["Retry-After"] == "1"
+
+    def test_queued_request_runs_when_a_worker_frees_up(self):
+        hasher = PasswordHasher(workers=1, queue_timeout=10)
+
+        async def burst() -> list[str]:
+            return await asyncio.gather(hasher.hash("first"), hasher.hash("second"))
+
+        assert len(asyncio.run(burst())) == 2
@@ -1,8 +1,12 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from app.db.models import PaymentAllocation, InvoiceStatus, PaymentStatus
-from app.schemas import PaymentAllocationUpdate
+import pytest
+from sqlalchemy import update
+
+from app.db.models import Payment, PaymentAllocation, InvoiceStatus, PaymentStatus
+from app.schemas import AllocationStrategy, PaymentAllocationUpdate
 from app.services import payment_allocation as allocation_service
+from app.validators.allocation import AllocationValidationError
 
 
 class TestPaymentAllocationServiceCRUD:
@@ -302,3 +306,307 @@ class TestUpdateInvoiceStatusFromPayments:
         result = allocation_service.update_invoice_status_from_payments(db_session, invoice)
 
         assert result.status == InvoiceStatus.PAID.value
+
+
+class TestInvoicePaidCents:
+    def test_create_allocation_with_status_update_increments_paid_cents(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000)
+
+        allocation_service.create_allocation_with_status_update(db_session, payment, invoice, 4000)
+        db_session.refresh(invoice)
+
+        assert invoice.paid_cents == 4000
+        assert invoice.status == InvoiceStatus.PARTIALLY_PAID.value
+
+    def test_create_allocation_with_status_update_pending_payment(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000, status=PaymentStatus.PENDING.value)
+
+        allocation_service.create_allocation_with_status_update(db_session, payment, invoice, 4000)
+        db_session.refresh(invoice)
+
+        assert invoice.paid_cents == 0
+        assert invoice.status == InvoiceStatus.PENDING.value
+
+    def test_update_allocation_with_status_update_applies_delta(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000)
+        allocation = allocation_service.create_allocation_with_status_update(db_session, payment, invoice, 4000)
+
+        allocation_service.update_allocation_with_status_update(
+            db_session, allocation, PaymentAllocationUpdate(amount_in_cents=10000)
+        )
+        db_session.refresh(invoice)
+
+        assert invoice.paid_cents == 10000
+        assert invoice.status == InvoiceStatus.PAID.value
+
+    def test_delete_allocation_with_status_update_decrements_paid_cents(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000)
+        first = allocation_service.create_allocation_with_status_update(db_session, payment, invoice, 4000)
+        allocation_service.create_allocation_with_status_update(db_session, payment, invoice, 6000)
+
+        allocation_service.delete_allocation_with_status_update(db_session, first)
+        db_session.refresh(invoice)
+
+        assert invoice.paid_cents == 6000
+        assert invoice.status == InvoiceStatus.PARTIALLY_PAID.value
+
+
+class TestRepairInvoicePaidCents:
+    def test_repair_no_drift(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000)
+        db_helpers.create_allocation(payment, invoice, amount_in_cents=3000)
+
+        assert allocation_service.repair_invoice_paid_cents(db_session) == []
+
+    def test_repair_fixes_drift(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000)
+        # The plain service does not maintain paid_cents.
+        allocation_service.create_allocation(
+            db_session,
+            PaymentAllocation(
+                payment_id=payment.id,
+                invoice_id=invoice.id,
+                amount_in_cents=10000,
+                created_at=datetime.now(),
+            ),
+        )
+
+        drift = allocation_service.repair_invoice_paid_cents(db_session)
+        db_session.refresh(invoice)
+
+        assert drift == [(invoice.id, 0, 10000)]
+        assert invoice.paid_cents == 10000
+        assert invoice.status == InvoiceStatus.PAID.value
+
+    def test_repair_dry_run_does_not_fix(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
+        invoice.paid_cents = 2500
+        db_session.commit()
+
+        drift = allocation_service.repair_invoice_paid_cents(db_session, dry_run=True)
+        db_session.refresh(invoice)
+
+        assert drift == [(invoice.id, 2500, 0)]
+        assert invoice.paid_cents == 2500
+
+
+class TestPaymentAllocatedCents:
+    def test_create_allocation_with_status_update_increments_allocated_cents(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000)
+
+        allocation_service.create_allocation_with_status_update(db_session, payment, invoice, 4000)
+        db_session.refresh(payment)
+
+        assert payment.allocated_cents == 4000
+
+    def test_create_allocation_with_status_update_rejects_overallocation(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
+        payment = db_helpers.create_payment(student, amount_in_cents=5000)
+        allocation_service.create_allocation_with_status_update(db_session, payment, invoice, 4000)
+
+        with pytest.raises(AllocationValidationError):
+            allocation_service.create_allocation_with_status_update(db_session, payment, invoice, 2000)
+
+        db_session.refresh(payment)
+        db_session.refresh(invoice)
+        assert payment.allocated_cents == 4000
+        assert invoice.paid_cents == 4000
+        assert db_session.query(PaymentAllocation).count() == 1
+
+    def test_update_allocation_with_status_update_rejects_overallocation(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
+        payment = db_helpers.create_payment(student, amount_in_cents=5000)
+        allocation = allocation_service.create_allocation_with_status_update(db_session, payment, invoice, 4000)
+
+        with pytest.raises(AllocationValidationError):
+            allocation_service.update_allocation_with_status_update(
+                db_session, allocation, PaymentAllocationUpdate(amount_in_cents=6000)
+            )
+
+        db_session.refresh(allocation)
+        db_session.refresh(payment)
+        assert allocation.amount_in_cents == 4000
+        assert payment.allocated_cents == 4000
+
+    def test_delete_allocation_with_status_update_decrements_allocated_cents(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000)
+        allocation = allocation_service.create_allocation_with_status_update(db_session, payment, invoice, 4000)
+
+        allocation_service.delete_allocation_with_status_update(db_session, allocation)
+        db_session.refresh(payment)
+
+        assert payment.allocated_cents == 0
+
+    def test_repair_payment_allocated_cents_fixes_drift(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000)
+        db_helpers.create_allocation(payment, invoice, amount_in_cents=3000)
+        payment.allocated_cents = 0
+        db_session.commit()
+
+        drift = allocation_service.repair_payment_allocated_cents(db_session)
+        db_session.refresh(payment)
+
+        assert drift == [(payment.id, 0, 3000)]
+        assert payment.allocated_cents == 3000
+
+
+class TestAutoAllocatePayment:
+    def create_open_invoices(self, db_helpers, student):
+        now = datetime.now()
+        return [
+            db_helpers.create_invoice(
+                student, invoice_number="DUE-LATER", amount_in_cents=5000, due_date=now + timedelta(days=30)
+            ),
+            db_helpers.create_invoice(
+                student, invoice_number="DUE-FIRST", amount_in_cents=3000, due_date=now
+            ),
+            db_helpers.create_invoice(
+                student, invoice_number="BIGGEST", amount_in_cents=8000, due_date=now + timedelta(days=60)
+            ),
+        ]
+
+    def test_fifo_pays_earliest_due_first(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        later, first, biggest = self.create_open_invoices(db_helpers, student)
+        payment = db_helpers.create_payment(student, amount_in_cents=6000)
+
+        allocations = allocation_service.auto_allocate_payment(db_session, payment, AllocationStrategy.FIFO)
+
+        assert [(a.invoice_id, a.amount_in_cents) for a in allocations] == [(first.id, 3000), (later.id, 3000)]
+        db_session.expire_all()
+        assert first.paid_cents == 3000
+        assert first.status == InvoiceStatus.PAID.value
+        assert later.paid_cents == 3000
+        assert later.status == InvoiceStatus.PARTIALLY_PAID.value
+        assert biggest.paid_cents == 0
+        assert biggest.status == InvoiceStatus.PENDING.value
+        assert payment.allocated_cents == 6000
+
+    def test_largest_first(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        later, first, biggest = self.create_open_invoices(db_helpers, student)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000)
+
+        allocations = allocation_service.auto_allocate_payment(
+            db_session, payment, AllocationStrategy.LARGEST_FIRST
+        )
+
+        assert [(a.invoice_id, a.amount_in_cents) for a in allocations] == [(biggest.id, 8000), (later.id, 2000)]
+
+    def test_uses_outstanding_amount_and_skips_closed_invoices(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        partly_paid = db_helpers.create_invoice(student, invoice_number="PARTLY", amount_in_cents=5000)
+        db_helpers.create_allocation(db_helpers.create_payment(student, amount_in_cents=2000), partly_paid, 2000)
+        db_helpers.create_invoice(student, invoice_number="DRAFT", status=InvoiceStatus.DRAFT.value)
+        db_helpers.create_invoice(student, invoice_number="CANCELLED", status=InvoiceStatus.CANCELLED.value)
+        db_helpers.create_invoice(student, invoice_number="MXN", currency="MXN")
+        other_student = db_helpers.create_student(school, identifier="ID-002", email="other@example.com")
+        db_helpers.create_invoice(other_student, invoice_number="OTHER")
+        payment = db_helpers.create_payment(student, amount_in_cents=10000)
+
+        allocations = allocation_service.auto_allocate_payment(db_session, payment)
+
+        assert [(a.invoice_id, a.amount_in_cents) for a in allocations] == [(partly_paid.id, 3000)]
+        db_session.expire_all()
+        assert partly_paid.paid_cents == 5000
+        assert payment.allocated_cents == 3000
+
+    def test_only_unallocated_balance_is_used(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        paid_elsewhere = db_helpers.create_invoice(student, invoice_number="ELSEWHERE", amount_in_cents=100000)
+        invoice = db_helpers.create_invoice(student, invoice_number="OPEN", amount_in_cents=100000)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000)
+        db_helpers.create_allocation(payment, paid_elsewhere, 7000)
+
+        allocations = allocation_service.auto_allocate_payment(db_session, payment)
+
+        assert sum(a.amount_in_cents for a in allocations) == 3000
+        db_session.expire_all()
+        assert payment.allocated_cents == 10000
+        assert invoice.paid_cents + paid_elsewhere.paid_cents == 10000
+
+    def test_no_open_invoices_creates_nothing(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000)
+
+        assert allocation_service.auto_allocate_payment(db_session, payment) == []
+        assert db_helpers.count_allocations() == 0
+
+    def test_fully_allocated_payment_rejected(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000)
+        db_helpers.create_invoice(student, invoice_number="INV-002")
+        payment = db_helpers.create_payment(student, amount_in_cents=5000)
+        db_helpers.create_allocation(payment, invoice, 5000)
+
+        with pytest.raises(AllocationValidationError):
+            allocation_service.auto_allocate_payment(db_session, payment)
+
+    def test_pending_payment_rejected(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        db_helpers.create_invoice(student)
+        payment = db_helpers.create_payment(student, status=PaymentStatus.PENDING.value)
+
+        with pytest.raises(AllocationValidationError):
+            allocation_service.auto_allocate_payment(db_session, payment)
+        assert db_helpers.count_allocations() == 0
+
+    def test_payment_failed_after_loading_rejected(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student)
+        payment = db_helpers.create_payment(student)
+        # The payment as a request loaded it, before a concurrent update failed it.
+        db_session.expunge(payment)
+        db_session.execute(
+            update(Payment).where(Payment.id == payment.id).values(status=PaymentStatus.FAILED.value)
+        )
+        db_session.commit()
+
+        with pytest.raises(AllocationValidationError) as exc_info:
+            allocation_service.auto_allocate_payment(db_session, payment)
+
+        assert exc_info.value.reason == "payment_not_completed"
+        assert db_helpers.count_allocations() == 0
+        db_session.refresh(invoice)
+        assert invoice.paid_cents == 0
@@ -1,25 +1,27 @@
-from datetime import datetime
+from app.auth import Principal
+import pytest
 
-from app.db.models import Payment, PaymentStatus, PaymentMethod
-from app.schemas import PaymentUpdate
+from app.db.models import PaymentStatus, PaymentMethod
+from app.schemas import PaymentCreate, PaymentUpdate
 from app.services import payment as payment_service
+from app.validators.payment import PaymentValidationError
+
+ADMIN = Principal(id=1, email="admin@example.com", school_id=None, is_admin=True, token_version=0)
 
 
 class TestPaymentServiceCRUD:
     def test_create_payment(self, db_session, db_helpers):
         school = db_helpers.create_school()
         student = db_helpers.create_student(school)
-        now = datetime.now()
-        payment = Payment(
+        payment_data = PaymentCreate(
             amount_in_cents=10000,
-            status=PaymentStatus.COMPLETED.value,
-            payment_method=PaymentMethod.CARD.value,
+            currency="USD",
+            status=PaymentStatus.COMPLETED,
+            payment_method=PaymentMethod.CARD,
             student_id=student.id,
-            created_at=now,
-            updated_at=now,
         )
 
-        result = payment_service.create_payment(db_session, payment)
+        result = payment_service.create_payment(db_session, payment_data, ADMIN)
 
         assert result.id is not None
         assert result.amount_in_cents == 10000
@@ -104,7 +106,7 @@ class TestPaymentServiceCRUD:
         assert total == 2
         assert len(items) == 2
         for payment in items:
-            assert payment.student.school_id == school1.id
+            assert payment.student_id == student1.id
 
     def test_update_payment(self, db_session, db_helpers):
         school = db_helpers.create_school()
@@ -112,7 +114,7 @@ class TestPaymentServiceCRUD:
         payment = db_helpers.create_payment(student, amount_in_cents=10000, status=PaymentStatus.PENDING.value)
         update_data = PaymentUpdate(status=PaymentStatus.COMPLETED.value)
 
-        result = payment_service.update_payment(db_session, payment, update_data)
+        result = payment_service.update_payment(db_session, payment.id, update_data, ADMIN)
 
         assert result.status == PaymentStatus.COMPLETED.value
         assert result.id == payment.id
@@ -128,7 +130,7 @@ class TestPaymentServiceCRUD:
         )
         update_data = PaymentUpdate(amount_in_cents=15000)
 
-        result = payment_service.update_payment(db_session, payment, update_data)
+        result = payment_service.update_payment(db_session, payment.id, update_data, ADMIN)
 
         assert result.amount_in_cents == 15000
         assert result.status == PaymentStatus.PENDING.value
@@ -140,20 +142,72 @@ class TestPaymentServiceCRUD:
         payment = db_helpers.create_payment(student, payment_method=PaymentMethod.CARD.value)
         update_data = PaymentUpdate(payment_method=PaymentMethod.BANK_TRANSFER.value)
 
-        result = payment_service.update_payment(db_session, payment, update_data)
+        result = payment_service.update_payment(db_session, payment.id, update_data, ADMIN)
 
         assert result.payment_method == PaymentMethod.BANK_TRANSFER.value
 
+    def test_update_allocated_payment_amount_writes_nothing(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000, status=PaymentStatus.COMPLETED.value)
+        db_helpers.create_allocation(payment, db_helpers.create_invoice(student), 4000)
+
+        result = payment_service.update_payment(db_session, payment.id, PaymentUpdate(amount_in_cents=5000), ADMIN)
+
+        assert result is None
+        db_session.expire_all()
+        assert payment.amount_in_cents == 10000
+
+    def test_revert_allocated_completed_payment_writes_nothing(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        payment = db_helpers.create_payment(student, status=PaymentStatus.COMPLETED.value)
+        db_helpers.create_allocation(payment, db_helpers.create_invoice(student), 4000)
+
+        result = payment_service.update_payment(
+            db_session, payment.id, PaymentUpdate(status=PaymentStatus.PENDING), ADMIN
+        )
+
+        assert result is None
+        db_session.expire_all()
+        assert payment.status == PaymentStatus.COMPLETED.value
+
     def test_delete_payment(self, db_session, db_helpers):
         school = db_helpers.create_school()
         student = db_helpers.create_student(school)
         payment = db_helpers.create_payment(student)
         payment_id = payment.id
 
-        payment_service.delete_payment(db_session, payment)
+        assert payment_service.delete_payment(db_session, payment_id, ADMIN) is True
 
         assert payment_service.get_payment_by_id(db_session, payment_id) is None
 
+    def test_delete_payment_of_another_school_deletes_nothing(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        other_school = db_helpers.create_school(name="Other", tax_id="222")
+        payment = db_helpers.create_payment(db_helpers.create_student(school))
+        user = Principal(id=2, email="user@example.com", school_id=other_school.id, is_admin=False, token_version=0)
+
+        assert payment_service.delete_payment(db_session, payment.id, user) is False
+
+        assert payment_service.get_payment_by_id(db_session, payment.id) is not None
+
+    def test_delete_missing_payment(self, db_session):
+        assert payment_service.delete_payment(db_session, 999, ADMIN) is False
+
+    def test_delete_allocated_payment_deletes_nothing(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        payment = db_helpers.create_payment(student, amount_in_cents=10000, status="completed")
+        db_helpers.create_allocation(payment, db_helpers.create_invoice(student), 4000)
+        payment_id = payment.id
+
+        with pytest.raises(PaymentValidationError):
+            payment_service.delete_payment(db_session, payment_id, ADMIN)
+
+        db_session.rollback()
+        assert payment_service.get_payment_by_id(db_session, payment_id) is not None
+
 
 class TestPaymentServiceFiltering:
     def test_get_payments_by_school_excludes_other_schools(self, db_session, db_helpers):
@@ -0,0 +1,69 @@
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.db.query_stats import SERVER_TIMING_HEADER, QueryStats, QueryStatsMiddleware, statement_shape
+from tests.conftest import engine
+
+
+def create_query_app(repeat_threshold: int) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(QueryStatsMiddleware, repeat_threshold=repeat_threshold)
+
+    @app.get("/lookups/{count}")
+    def run_lookups(count: int):
+        with engine.connect() as conn:
+            for value in range(count):
+                conn.execute(text("SELECT :value"), {"value": value})
+        return {}
+
+    return app
+
+
+class TestStatementShape:
+    def test_parameters_collapse(self):
+        assert statement_shape("SELECT * FROM invoice\n  WHERE id = %(id_1)s") == "SELECT * FROM invoice WHERE id = ?"
+        assert statement_shape("SELECT * FROM invoice WHERE id = $1") == "SELECT * FROM invoice WHERE id = ?"
+
+    def test_parameter_lists_collapse(self):
+        statement = "SELECT * FROM student WHERE id IN (%(id_1_1)s, %(id_1_2)s, %(id_1_3)s)"
+
+        assert statement_shape(statement) == "SELECT * FROM student WHERE id IN (?)"
+
+
+class TestQueryStats:
+    def test_most_repeated(self):
+        stats = QueryStats()
+        for _ in range(3):
+            stats.record("SELECT * FROM invoice WHERE id = $1", 0.001)
+        stats.record("SELECT 1", 0.002)
+
+        assert stats.most_repeated() == ("SELECT * FROM invoice WHERE id = ?", 3)
+        assert stats.server_timing() == 'db;dur=5.00;desc="4 statements"'
+
+
+class TestQueryStatsMiddleware:
+    def test_reports_statements_in_server_timing(self):
+        response = TestClient(create_query_app(repeat_threshold=10)).get("/lookups/3")
+
+        assert response.headers[SERVER_TIMING_HEADER].startswith("db;dur=")
+        assert response.headers[SERVER_TIMING_HEADER].endswith('desc="3 statements"')
+
+    def test_repeated_statement_logs_warning(self, caplog):
+        client = TestClient(create_query_app(repeat_threshold=2))
+
+        with caplog.at_level(logging.WARNING, logger="app.db.query_stats"):
+            client.get("/lookups/2")
+            assert caplog.records == []
+            client.get("/lookups/3")
+
+        [record] = caplog.records
+        assert record.getMessage() == "GET /lookups/3 ran the same statement 3 times (3 statements in total): SELECT ?"
+
+    def test_zero_threshold_disables_warning(self, caplog):
+        with caplog.at_level(logging.WARNING, logger="app.db.query_stats"):
+            TestClient(create_query_app(repeat_threshold=0)).get("/lookups/20")
+
+        assert caplog.records == []
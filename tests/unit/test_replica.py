@@ -0,0 +1,102 @@
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.db.replica import (
+    InvalidLSNError,
+    ReplicaLagTracker,
+    WRITE_LSN_HEADER,
+    WriteLSNMiddleware,
+    parse_lsn,
+    replica_has_lsn,
+)
+
+
+class TestParseLSN:
+    def test_parses_hex_parts(self):
+        assert parse_lsn("0/0") == 0
+        assert parse_lsn("16/B374D848") == (0x16 << 32) | 0xB374D848
+
+    def test_orders_by_high_part_first(self):
+        assert parse_lsn("1/0") > parse_lsn("0/FFFFFFFF")
+
+    @pytest.mark.parametrize("value", ["", "garbage", "1/2/3", "G/0", "0/"])
+    def test_rejects_invalid_values(self, value):
+        with pytest.raises(InvalidLSNError) as exc_info:
+            parse_lsn(value)
+        assert exc_info.value.status_code == 400
+
+
+class TestReplicaLagTracker:
+    def test_caught_up_after_observing_replay(self):
+        tracker = ReplicaLagTracker()
+        assert not tracker.caught_up(parse_lsn("0/100"))
+
+        tracker.observe("0/100")
+
+        assert tracker.caught_up(parse_lsn("0/100"))
+        assert not tracker.caught_up(parse_lsn("0/101"))
+
+    def test_replay_position_never_moves_back(self):
+        tracker = ReplicaLagTracker()
+        tracker.observe("0/200")
+        tracker.observe("0/100")
+
+        assert tracker.caught_up(parse_lsn("0/200"))
+
+    def test_primary_has_every_write(self):
+        tracker = ReplicaLagTracker()
+        tracker.observe(None)
+
+        assert tracker.caught_up(parse_lsn("FFFFFFFF/FFFFFFFF"))
+
+
+class TestReplicaHasLSN:
+    def test_no_token_needs_no_query(self):
+        assert replica_has_lsn(None, None)
+
+    def test_primary_session_has_any_lsn(self, db_session, monkeypatch):
+        monkeypatch.setattr("app.db.replica.replica_lag", ReplicaLagTracker())
+
+        assert replica_has_lsn(db_session, parse_lsn("FFFF/0"))
+
+
+def create_write_app() -> FastAPI:
+    async def current_lsn() -> str:
+        return "0/ABC"
+
+    app = FastAPI()
+    app.add_middleware(WriteLSNMiddleware, current_lsn=current_lsn)
+
+    @app.get("/item")
+    async def read_item():
+        return {}
+
+    @app.post("/item", status_code=201)
+    async def create_item():
+        return {}
+
+    @app.put("/item")
+    async def update_item():
+        raise HTTPException(status_code=404)
+
+    return app
+
+
+class TestWriteLSNMiddleware:
+    def test_successful_write_returns_lsn(self):
+        response = TestClient(create_write_app()).post("/item")
+
+        assert response.status_code == 201
+        assert response.headers[WRITE_LSN_HEADER] == "0/ABC"
+
+    def test_read_has_no_lsn(self):
+        response = TestClient(create_write_app()).get("/item")
+
+        assert WRITE_LSN_HEADER not in response.headers
+
+    def test_failed_write_has_no_lsn(self):
+        response = TestClient(create_write_app()).put("/item")
+
+        assert response.status_code == 404
+        assert WRITE_LSN_HEADER not in response.headers
@@ -0,0 +1,264 @@
+import asyncio
+import time
+
+import pytest
+
+from app.cache import (
+    CacheUnavailableError,
+    CachedResult,
+    MemoryBackend,
+    RedisBackend,
+    ReplyError,
+    ResultCache,
+    encode_command,
+    read_reply,
+)
+
+
+class Computation:
+    """A compute callback that counts its calls and returns a fixed version."""
+
+    def __init__(self, version: int = 1, delay: float = 0.0):
+        self.version = version
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self) -> tuple[int, bytes]:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.version, b'{"call": %d}' % self.calls
+
+
+class FailingBackend:
+    async def get(self, key: str) -> bytes | None:
+        raise CacheUnavailableError("down")
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        raise CacheUnavailableError("down")
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeRedis:
+    """Stand-in Redis server for GET, SET with PX, AUTH and SELECT, on a random local port."""
+
+    def __init__(self, password: str | None = None):
+        self.password = password
+        self.data: dict[bytes, tuple[bytes, float]] = {}
+        self.commands: list[list[bytes]] = []
+        self.connections = 0
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}127.0.0.1:{port}/2"
+
+    async def stop(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                command = await read_reply(reader)
+                self.commands.append(command)
+                writer.write(self.reply(command))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    def reply(self, command: list[bytes]) -> bytes:
+        name = command[0].upper()
+        if name == b"AUTH":
+            return b"+OK\r\n" if command[1].decode() == self.password else b"-WRONGPASS invalid password\r\n"
+        if name == b"SELECT":
+            return b"+OK\r\n"
+        if name == b"SET":
+            self.data[command[1]] = (command[2], time.monotonic() + int(command[4]) / 1000)
+            return b"+OK\r\n"
+        if name == b"GET":
+            value, expires = self.data.get(command[1], (None, 0.0))
+            if value is None or expires < time.monotonic():
+                return b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        return b"-ERR unknown command\r\n"
+
+
+class TestMemoryBackend:
+    def test_entries_expire(self):
+        backend = MemoryBackend(max_entries=10)
+
+        async def check() -> tuple:
+            await backend.set("fresh", b"1", 60)
+            await backend.set("expired", b"2", -1)
+            return await backend.get("fresh"), await backend.get("expired")
+
+        assert asyncio.run(check()) == (b"1", None)
+
+    def test_evicts_least_recently_used(self):
+        backend = MemoryBackend(max_entries=2)
+
+        async def check() -> list:
+            await backend.set("a", b"a", 60)
+            await backend.set("b", b"b", 60)
+            await backend.get("a")
+            await backend.set("c", b"c", 60)
+            return [await backend.get(key) for key in ("a", "b", "c")]
+
+        assert asyncio.run(check()) == [b"a", None, b"c"]
+        assert len(backend) == 2
+
+
+class TestResultCache:
+    def test_hit_skips_computation(self):
+        cache = ResultCache("test", MemoryBackend(10), ttl_seconds=60, stale_seconds=60)
+        compute = Computation()
+
+        async def check() -> list[CachedResult]:
+            return [await cache.get_or_compute("key", 1, compute) for _ in range(3)]
+
+        results = asyncio.run(check())
+
+        assert compute.calls == 1
+        assert {result.body for result in results} == {b'{"call": 1}'}
+
+    def test_newer_version_is_a_miss(self):
+        cache = ResultCache("test", MemoryBackend(10), ttl_seconds=60, stale_seconds=60)
+        compute = Computation(version=1)
+
+        async def check() -> CachedResult:
+            await cache.get_or_compute("key", 1, compute)
+            compute.version = 2
+            return await cache.get_or_compute("key", 2, compute)
+
+        result = asyncio.run(check())
+
+        assert compute.calls == 2
+        assert (result.version, result.body) == (2, b'{"call": 2}')
+
+    def test_concurrent_misses_share_one_computation(self):
+        cache = ResultCache("test", MemoryBackend(10), ttl_seconds=60, stale_seconds=60)
+        compute = Computation(delay=0.05)
+
+        async def burst() -> list[CachedResult]:
+            return await asyncio.gather(*(cache.get_or_compute("key", 1, compute) for _ in range(20)))
+
+        results = asyncio.run(burst())
+
+        assert compute.calls == 1
+        assert len({result.body for result in results}) == 1
+
+    def test_stale_entry_served_while_refreshing(self):
+        cache = ResultCache("test", MemoryBackend(10), ttl_seconds=0.05, stale_seconds=60)
+        compute = Computation()
+
+        async def check() -> tuple[CachedResult, CachedResult, CachedResult]:
+            first = await cache.get_or_compute("key", 1, compute)
+            await asyncio.sleep(0.06)
+            stale = await cache.get_or_compute("key", 1, compute)
+            await asyncio.sleep(0.01)
+            refreshed = await cache.get_or_compute("key", 1, compute)
+            return first, stale, refreshed
+
+        first, stale, refreshed = asyncio.run(check())
+
+        assert stale.body == first.body
+        assert refreshed.body == b'{"call": 2}'
+        assert compute.calls == 2
+
+    def test_failed_computation_raises_to_every_waiter(self):
+        cache = ResultCache("test", MemoryBackend(10), ttl_seconds=60, stale_seconds=60)
+
+        async def compute() -> tuple[int, bytes]:
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        async def burst() -> list:
+            return await asyncio.gather(
+                *(cache.get_or_compute("key", 1, compute) for _ in range(3)), return_exceptions=True
+            )
+
+        results = asyncio.run(burst())
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    def test_unavailable_backend_computes(self):
+        cache = ResultCache("test", FailingBackend(), ttl_seconds=60, stale_seconds=60)
+        compute = Computation()
+
+        result = asyncio.run(cache.get_or_compute("key", 1, compute))
+
+        assert result.body == b'{"call": 1}'
+
+
+class TestRedisBackend:
+    def test_encode_command(self):
+        assert encode_command(["GET", b"key"]) == b"*2\r\n$3\r\nGET\r\n$3\r\nkey\r\n"
+
+    def test_set_and_get(self):
+        server = FakeRedis(password="secret")
+
+        async def check() -> tuple:
+            backend = RedisBackend(await server.start())
+            try:
+                await backend.set("key", b"\x00value\r\n", 60)
+                return await backend.get("key"), await backend.get("missing")
+            finally:
+                await backend.close()
+                await server.stop()
+
+        assert asyncio.run(check()) == (b"\x00value\r\n", None)
+        assert server.commands[:2] == [[b"AUTH", b"secret"], [b"SELECT", b"2"]]
+        assert server.connections == 1
+
+    def test_error_reply_raises_and_keeps_connection(self):
+        server = FakeRedis()
+
+        async def check() -> bytes | None:
+            backend = RedisBackend(await server.start())
+            try:
+                with pytest.raises(ReplyError):
+                    await backend.command("FLUSHALL")
+                return await backend.get("key")
+            finally:
+                await backend.close()
+                await server.stop()
+
+        assert asyncio.run(check()) is None
+        assert server.connections == 1
+
+    def test_unreachable_server_raises_unavailable(self):
+        async def check() -> None:
+            server = await asyncio.start_server(lambda reader, writer: None, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            server.close()
+            await server.wait_closed()
+            await RedisBackend(f"redis://127.0.0.1:{port}").get("key")
+
+        with pytest.raises(CacheUnavailableError):
+            asyncio.run(check())
+
+    def test_result_cache_shares_entries_through_redis(self):
+        server = FakeRedis()
+        compute = Computation()
+
+        async def check() -> CachedResult:
+            url = await server.start()
+            first = ResultCache("balance", RedisBackend(url), ttl_seconds=60, stale_seconds=60)
+            second = ResultCache("balance", RedisBackend(url), ttl_seconds=60, stale_seconds=60)
+            try:
+                await first.get_or_compute("school:1", 1, compute)
+                return await second.get_or_compute("school:1", 1, compute)
+            finally:
+                await first.close()
+                await second.close()
+                await server.stop()
+
+        result = asyncio.run(check())
+
+        assert compute.calls == 1
+        assert result.body == b'{"call": 1}'
+        assert b"balance:school:1" in server.data
@@ -1,22 +1,20 @@
 from datetime import datetime
 
-from app.db.models import School, InvoiceStatus, PaymentStatus
-from app.schemas import SchoolUpdate
+from sqlalchemy import event
+
+from app.auth import Principal
+from app.db.models import InvoiceStatus, PaymentStatus
+from app.schemas import BalanceResponse, SchoolCreate, SchoolUpdate
+from app.serialization import FastJSONResponse
 from app.services import school as school_service
+from app.services.balance import bump_balance_versions
 
 
 class TestSchoolServiceCRUD:
     def test_create_school(self, db_session):
-        now = datetime.now()
-        school = School(
-            name="Test School",
-            country="US",
-            tax_id="123456789",
-            created_at=now,
-            updated_at=now,
-        )
+        school_data = SchoolCreate(name="Test School", country="US", tax_id="123456789")
 
-        result = school_service.create_school(db_session, school)
+        result = school_service.create_school(db_session, school_data)
 
         assert result.id is not None
         assert result.name == "Test School"
@@ -80,16 +78,19 @@ class TestSchoolServiceCRUD:
         school = db_helpers.create_school(name="Original Name")
         update_data = SchoolUpdate(name="Updated Name")
 
-        result = school_service.update_school(db_session, school, update_data)
+        result = school_service.update_school(db_session, school.id, update_data)
 
         assert result.name == "Updated Name"
         assert result.id == school.id
 
+    def test_update_school_not_found(self, db_session):
+        assert school_service.update_school(db_session, 9999, SchoolUpdate(name="Nope")) is None
+
     def test_update_school_partial(self, db_session, db_helpers):
         school = db_helpers.create_school(name="Original", country="US", tax_id="111")
         update_data = SchoolUpdate(country="MX")
 
-        result = school_service.update_school(db_session, school, update_data)
+        result = school_service.update_school(db_session, school.id, update_data)
 
         assert result.name == "Original"
         assert result.country == "MX"
@@ -99,10 +100,13 @@ class TestSchoolServiceCRUD:
         school = db_helpers.create_school()
         school_id = school.id
 
-        school_service.delete_school(db_session, school)
+        assert school_service.delete_school(db_session, school_id) is True
 
         assert school_service.get_school_by_id(db_session, school_id) is None
 
+    def test_delete_missing_school(self, db_session):
+        assert school_service.delete_school(db_session, 999) is False
+
 
 class TestSchoolBalanceFunctions:
     def test_get_total_invoiced_for_school_empty(self, db_session, db_helpers):
@@ -290,3 +294,94 @@ class TestSchoolBalance:
         assert result.currency == "COP"
         assert len(result.invoices) == 1
         assert len(result.payments) == 1
+
+    def test_get_school_balance_orders_lists(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        small = db_helpers.create_invoice(student, invoice_number="INV-001", amount_in_cents=1000)
+        large = db_helpers.create_invoice(student, invoice_number="INV-002", amount_in_cents=9000)
+        db_helpers.create_invoice(
+            student, invoice_number="INV-003", amount_in_cents=50000, status=InvoiceStatus.PAID.value
+        )
+
+        result = school_service.get_school_balance(db_session, school.id)
+
+        assert [inv.id for inv in result.invoices] == [large.id, small.id]
+        assert result.invoices[0].created_at == large.created_at
+        assert result.invoices[0].status == InvoiceStatus.PENDING
+
+    def test_get_school_balance_single_statement(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        db_helpers.create_invoice(student)
+        db_helpers.create_payment(student)
+        school_id = school.id
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = db_session.get_bind()
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            school_service.get_school_balance(db_session, school_id)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert len(statements) == 1
+
+    def test_get_versioned_school_balance_json_matches_balance(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        invoice = db_helpers.create_invoice(student, amount_in_cents=10000, description=None)
+        payment = db_helpers.create_payment(student, amount_in_cents=4000)
+        db_helpers.create_allocation(payment, invoice, amount_in_cents=4000)
+
+        version, body = school_service.get_versioned_school_balance(db_session, school.id)
+
+        assert version == 0
+        assert BalanceResponse.model_validate_json(body) == school_service.get_school_balance(db_session, school.id)
+        assert school_service.get_versioned_school_balance(db_session, 999) is None
+
+    def test_get_versioned_school_balance_json_is_balance_response_encoding(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        db_helpers.create_invoice(
+            student,
+            description='Tuition "fall" \u00e9',
+            issue_date=datetime(2030, 1, 1, 10, 0, 0, 120000),
+            due_date=datetime(2030, 2, 1),
+        )
+        db_helpers.create_payment(student)
+
+        _, body = school_service.get_versioned_school_balance(db_session, school.id)
+        balance = school_service.get_school_balance(db_session, school.id)
+
+        assert body == FastJSONResponse(balance.model_dump(mode="json")).body
+        assert b'"issue_date":"2030-01-01T10:00:00.120000","due_date":"2030-02-01T00:00:00"' in body
+
+
+class TestSchoolBalanceVersion:
+    def test_get_school_balance_version_scoped_to_user(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        other = db_helpers.create_school(name="Other School", tax_id="999")
+        principal = Principal(id=1, email="user@example.com", school_id=school.id, is_admin=False, token_version=0)
+
+        assert school_service.get_school_balance_version(db_session, school.id, principal) == 0
+        assert school_service.get_school_balance_version(db_session, other.id, principal) is None
+        assert school_service.get_school_balance_version(db_session, 999, principal) is None
+
+    def test_bump_balance_versions(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        previous_school = db_helpers.create_school(name="Previous School", tax_id="999")
+        student = db_helpers.create_student(school)
+        untouched = db_helpers.create_student(school, identifier="ID-002", email="other@example.com")
+
+        bump_balance_versions(db_session, [student.id, student.id], [previous_school.id])
+        db_session.commit()
+        db_session.expire_all()
+
+        assert student.balance_version == 1
+        assert untouched.balance_version == 0
+        assert school.balance_version == 1
+        assert previous_school.balance_version == 1
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.db.models import InvoiceStatus
+from app.schemas import InvoiceResponse
+from app.serialization import FastJSONResponse, dumps
+
+
+INVOICE = InvoiceResponse(
+    id=1,
+    invoice_number="INV-0001",
+    amount_in_cents=2**53 + 1,
+    currency="USD",
+    status=InvoiceStatus.PENDING,
+    issue_date=datetime(2024, 1, 31, 8, 30),
+    due_date=datetime(2024, 2, 29, 23, 59, 59, 5),
+    description="Matrícula – 1º \"semestre\"\n\t\x01 /\\",
+    student_id=7,
+    created_at=datetime(2024, 1, 31, 8, 30, 0, 123456),
+    updated_at=datetime(2024, 1, 31, 8, 30, 0, 120000),
+)
+
+
+class TestDumps:
+    @pytest.mark.parametrize("content", [
+        jsonable_encoder(INVOICE),
+        {"items": [], "total": None, "has_more": False, "pages": 0, "nested": [[{"a": -1}]]},
+        ["", "😀", "\x7f", 0, -(2**63)],
+    ])
+    def test_matches_json_response(self, content):
+        assert FastJSONResponse(content).body == JSONResponse(content).body
+
+    def test_python_values_match_response_model_output(self):
+        row = INVOICE.model_dump()
+
+        assert dumps(row) == JSONResponse(jsonable_encoder(INVOICE)).body
+
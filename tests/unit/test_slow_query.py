@@ -0,0 +1,151 @@
+import logging
+import time
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.dialects import postgresql
+
+from app.db.models import Invoice, Payment
+from app.db.slow_query import explainable, install_slow_query_log, psycopg2_statement, redact
+from app.serialization import TimedRoute
+from app.services.balance import build_balance_statement
+from tests.conftest import DATABASE_URL
+
+SLOW_SELECT = text("SELECT pg_sleep(0.05), CAST(:email AS text)")
+
+
+@pytest.fixture
+def slow_engine():
+    engine = create_engine(DATABASE_URL)
+    logs = []
+
+    def install(explain: bool = False, explain_interval_seconds: float = 600.0):
+        slow_query_log = install_slow_query_log(engine, 0.02, explain, explain_interval_seconds)
+        logs.append(slow_query_log)
+        return slow_query_log
+
+    yield engine, install
+    for slow_query_log in logs:
+        slow_query_log.close()
+    engine.dispose()
+
+
+def slow_messages(caplog) -> list[str]:
+    return [record.getMessage() for record in caplog.records if record.name == "app.db.slow_query"]
+
+
+def wait_for_plan(caplog, timeout: float = 10.0) -> list[str]:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        plans = [message for message in slow_messages(caplog) if message.startswith("Plan of")]
+        if plans:
+            return plans
+        time.sleep(0.05)
+    return []
+
+
+class TestHelpers:
+    def test_redact_keeps_only_types(self):
+        assert redact({"email_1": "a@example.com", "id_1": 7}, executemany=False) == {"email_1": "str", "id_1": "int"}
+        assert redact(("a@example.com", 7), executemany=False) == ["str", "int"]
+        assert redact([{"id": 1}, {"id": 2}], executemany=True) == "<2 parameter sets>"
+
+    @pytest.mark.parametrize(
+        ("statement", "expected"),
+        [
+            ("SELECT * FROM invoice WHERE id = %(id_1)s", True),
+            ("  select count(*) from payment", True),
+            ("SELECT * FROM payment WHERE id = $1 FOR UPDATE", False),
+            ("SELECT * FROM invoice FOR NO KEY UPDATE SKIP LOCKED", False),
+            ("SELECT pg_try_advisory_xact_lock(%(param_1)s)", False),
+            ("UPDATE invoice SET status = %(status)s", False),
+            ("WITH paid AS (SELECT * FROM invoice WHERE status = $1) SELECT count(*) FROM paid", True),
+            ("WITH deleted AS (DELETE FROM payment RETURNING id) SELECT * FROM deleted", False),
+            ("WITH locked AS (SELECT id FROM payment FOR UPDATE) SELECT * FROM locked", False),
+        ],
+    )
+    def test_explainable(self, statement, expected):
+        assert explainable(statement) is expected
+
+    def test_balance_statement_is_explainable(self):
+        statement = build_balance_statement(select(Invoice), select(Payment), lists_as_text=True)
+        sql = str(statement.compile(dialect=postgresql.psycopg2.dialect()))
+
+        assert sql.startswith("WITH scoped_invoice AS")
+        assert explainable(sql)
+
+    def test_asyncpg_statement_becomes_pyformat(self):
+        sql, parameters = psycopg2_statement("SELECT $1 LIKE '%a' AND $2 = $1", ("x", 3))
+
+        assert sql == "SELECT %(p1)s LIKE '%%a' AND %(p2)s = %(p1)s"
+        assert parameters == {"p1": "x", "p2": 3}
+
+    def test_psycopg2_statement_unchanged(self):
+        assert psycopg2_statement("SELECT %(id)s", {"id": 1}) == ("SELECT %(id)s", {"id": 1})
+
+
+class TestSlowQueryLog:
+    def test_logs_slow_statements_only(self, slow_engine, caplog):
+        engine, install = slow_engine
+        install()
+
+        with caplog.at_level(logging.WARNING, logger="app.db.slow_query"):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                conn.execute(SLOW_SELECT, {"email": "secret@example.com"})
+
+        [message] = slow_messages(caplog)
+        assert message.startswith("Slow statement ")
+        assert "on route unknown: SELECT pg_sleep(0.05), CAST(? AS text) parameters={'email': 'str'}" in message
+        assert "secret@example.com" not in message
+
+    def test_names_the_route(self, slow_engine, caplog):
+        engine, install = slow_engine
+        install()
+        router = APIRouter(route_class=TimedRoute)
+
+        @router.get("/reports/{report_id}")
+        def report(report_id: int):
+            with engine.connect() as conn:
+                conn.execute(SLOW_SELECT, {"email": "secret@example.com"})
+            return {}
+
+        app = FastAPI()
+        app.include_router(router)
+
+        with caplog.at_level(logging.WARNING, logger="app.db.slow_query"):
+            TestClient(app).get("/reports/1")
+
+        [message] = slow_messages(caplog)
+        assert "on route /reports/{report_id}:" in message
+
+    def test_explains_once_per_shape_within_interval(self, slow_engine, caplog):
+        engine, install = slow_engine
+        install(explain=True)
+
+        with caplog.at_level(logging.WARNING, logger="app.db.slow_query"):
+            with engine.connect() as conn:
+                conn.execute(SLOW_SELECT, {"email": "first@example.com"})
+                conn.execute(SLOW_SELECT, {"email": "second@example.com"})
+            plans = wait_for_plan(caplog)
+            time.sleep(0.2)
+
+        slow = [message for message in slow_messages(caplog) if message.startswith("Slow statement")]
+        statement_id = slow[0].split()[2]
+        assert len(slow) == 2
+        assert len(slow_messages(caplog)) == 3
+        assert plans[0].startswith(f"Plan of slow statement {statement_id}:")
+        assert "Execution Time" in plans[0]
+
+    def test_does_not_explain_locking_reads(self, slow_engine, caplog):
+        engine, install = slow_engine
+        slow_query_log = install(explain=True)
+
+        with caplog.at_level(logging.WARNING, logger="app.db.slow_query"):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT pg_sleep(0.05) FROM (SELECT 1) AS one FOR UPDATE"))
+            slow_query_log.executor.submit(lambda: None).result()
+
+        assert [message.split()[0] for message in slow_messages(caplog)] == ["Slow"]
@@ -1,24 +1,24 @@
-from datetime import datetime
+from sqlalchemy import event
 
-from app.db.models import Student, InvoiceStatus, PaymentStatus
-from app.schemas import StudentUpdate
+from app.auth import Principal
+from app.db.models import InvoiceStatus, PaymentStatus
+from app.schemas import StudentCreate, StudentUpdate
 from app.services import student as student_service
 
+ADMIN = Principal(id=1, email="admin@example.com", school_id=None, is_admin=True, token_version=0)
+
 
 class TestStudentServiceCRUD:
     def test_create_student(self, db_session, db_helpers):
         school = db_helpers.create_school()
-        now = datetime.now()
-        student = Student(
+        student_data = StudentCreate(
             identifier="ID-001",
             name="Test Student",
             email="test@example.com",
             school_id=school.id,
-            created_at=now,
-            updated_at=now,
         )
 
-        result = student_service.create_student(db_session, student)
+        result = student_service.create_student(db_session, student_data, ADMIN)
 
         assert result.id is not None
         assert result.identifier == "ID-001"
@@ -103,7 +103,7 @@ class TestStudentServiceCRUD:
         student = db_helpers.create_student(school, name="Original Name")
         update_data = StudentUpdate(name="Updated Name")
 
-        result = student_service.update_student(db_session, student, update_data)
+        result = student_service.update_student(db_session, student.id, update_data, ADMIN)
 
         assert result.name == "Updated Name"
         assert result.id == student.id
@@ -113,21 +113,69 @@ class TestStudentServiceCRUD:
         student = db_helpers.create_student(school, identifier="ID-001", name="Original", email="orig@example.com")
         update_data = StudentUpdate(email="new@example.com")
 
-        result = student_service.update_student(db_session, student, update_data)
+        result = student_service.update_student(db_session, student.id, update_data, ADMIN)
 
         assert result.identifier == "ID-001"
         assert result.name == "Original"
         assert result.email == "new@example.com"
 
+    def test_update_student_of_another_school_writes_nothing(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        other_school = db_helpers.create_school(name="Other", tax_id="222")
+        student = db_helpers.create_student(school, name="Original")
+        user = Principal(id=2, email="user@example.com", school_id=other_school.id, is_admin=False, token_version=0)
+
+        result = student_service.update_student(db_session, student.id, StudentUpdate(name="Changed"), user)
+
+        assert result is None
+        db_session.expire_all()
+        assert student.name == "Original"
+
+    def test_update_student_to_missing_school_writes_nothing(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school, name="Original")
+
+        result = student_service.update_student(
+            db_session, student.id, StudentUpdate(name="Changed", school_id=9999), ADMIN
+        )
+
+        assert result is None
+        db_session.expire_all()
+        assert student.name == "Original"
+
+    def test_move_student_bumps_both_school_balances(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        other_school = db_helpers.create_school(name="Other", tax_id="222")
+        student = db_helpers.create_student(school)
+        versions = (school.balance_version, other_school.balance_version)
+
+        result = student_service.update_student(
+            db_session, student.id, StudentUpdate(school_id=other_school.id), ADMIN
+        )
+
+        assert result.school_id == other_school.id
+        db_session.expire_all()
+        assert (school.balance_version, other_school.balance_version) == (versions[0] + 1, versions[1] + 1)
+
     def test_delete_student(self, db_session, db_helpers):
         school = db_helpers.create_school()
         student = db_helpers.create_student(school)
         student_id = student.id
 
-        student_service.delete_student(db_session, student)
+        assert student_service.delete_student(db_session, student_id, ADMIN) is True
 
         assert student_service.get_student_by_id(db_session, student_id) is None
 
+    def test_delete_student_of_another_school_deletes_nothing(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        other_school = db_helpers.create_school(name="Other", tax_id="222")
+        student = db_helpers.create_student(school)
+        user = Principal(id=2, email="user@example.com", school_id=other_school.id, is_admin=False, token_version=0)
+
+        assert student_service.delete_student(db_session, student.id, user) is False
+
+        assert student_service.get_student_by_id(db_session, student.id) is not None
+
 
 class TestStudentBalanceFunctions:
     def test_get_total_invoiced_for_student_empty(self, db_session, db_helpers):
@@ -325,3 +373,37 @@ class TestStudentBalance:
         assert result.total_invoiced_cents == 10000
         assert result.total_paid_cents == 0
         assert result.total_pending_cents == 10000
+
+    def test_get_student_balance_excludes_other_students(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        other = db_helpers.create_student(school, identifier="ID-002", email="other@example.com")
+        db_helpers.create_invoice(student, invoice_number="INV-001", amount_in_cents=1000)
+        db_helpers.create_invoice(other, invoice_number="INV-002", amount_in_cents=9000)
+        db_helpers.create_payment(other)
+
+        result = student_service.get_student_balance(db_session, student.id)
+
+        assert result.total_invoiced_cents == 1000
+        assert [inv.invoice_number for inv in result.invoices] == ["INV-001"]
+        assert result.payments == []
+
+    def test_get_student_balance_single_statement(self, db_session, db_helpers):
+        school = db_helpers.create_school()
+        student = db_helpers.create_student(school)
+        db_helpers.create_invoice(student)
+        db_helpers.create_payment(student)
+        student_id = student.id
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = db_session.get_bind()
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            student_service.get_student_balance(db_session, student_id)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert len(statements) == 1
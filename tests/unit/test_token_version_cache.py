@@ -0,0 +1,85 @@
+import asyncio
+from contextlib import suppress
+
+from prometheus_client import REGISTRY
+
+from app.auth import TokenVersionCache, token_versions
+from app.db.notifications import listen_for_user_changes, notify_user_changed
+from tests.conftest import TestingSessionLocal
+
+
+def lookups(result: str) -> float:
+    return REGISTRY.get_sample_value("token_version_cache_lookups_total", {"result": result}) or 0.0
+
+
+class TestTokenVersionCache:
+    def test_get_returns_cached_version(self):
+        cache = TokenVersionCache(ttl_seconds=60, max_entries=10)
+        cache.set(1, 3)
+
+        assert cache.get(1) == 3
+        assert cache.get(2) is None
+
+    def test_entries_expire(self):
+        cache = TokenVersionCache(ttl_seconds=-1, max_entries=10)
+        cache.set(1, 3)
+
+        assert cache.get(1) is None
+
+    def test_evicts_least_recently_used(self):
+        cache = TokenVersionCache(ttl_seconds=60, max_entries=2)
+        cache.set(1, 0)
+        cache.set(2, 0)
+        cache.get(1)
+        cache.set(3, 0)
+
+        assert len(cache) == 2
+        assert cache.get(1) == 0
+        assert cache.get(2) is None
+        assert cache.get(3) == 0
+
+    def test_counts_hits_and_misses(self):
+        cache = TokenVersionCache(ttl_seconds=60, max_entries=10)
+        cache.set(1, 0)
+        hits, misses = lookups("hit"), lookups("miss")
+
+        cache.get(1)
+        cache.get(2)
+
+        assert lookups("hit") == hits + 1
+        assert lookups("miss") == misses + 1
+
+
+NOTIFICATION_TIMEOUT_SECONDS = 5.0
+
+
+async def dropped_from_cache(user_id: int) -> None:
+    while token_versions.get(user_id) is not None:
+        await asyncio.sleep(0.01)
+
+
+async def invalidated_by_notification(user_id: int) -> bool:
+    listener = asyncio.create_task(listen_for_user_changes())
+    try:
+        # The listener clears the cache once it is subscribed.
+        token_versions.set(user_id, 0)
+        await asyncio.wait_for(dropped_from_cache(user_id), NOTIFICATION_TIMEOUT_SECONDS)
+        token_versions.set(user_id, 0)
+
+        with TestingSessionLocal() as db:
+            notify_user_changed(db, user_id)
+            db.commit()
+        await asyncio.wait_for(dropped_from_cache(user_id), NOTIFICATION_TIMEOUT_SECONDS)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        listener.cancel()
+        with suppress(asyncio.CancelledError):
+            await listener
+
+
+class TestUserChangedNotifications:
+    def test_notification_invalidates_cached_version(self):
+        assert asyncio.run(invalidated_by_notification(42))
+